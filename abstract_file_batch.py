@@ -18,16 +18,57 @@ import sys
 import os
 import errno
 import argparse
+import inspect
+import time
+import threading
+import signal
 
 import logging
+import multiprocessing
 
 
 if sys.version_info.major == 3:
     import queue
+    string_types = str
 else:
     import Queue as queue
-
-from convert_thread import ConvertThread
+    string_types = basestring
+
+try:
+    from os import scandir
+except ImportError:
+    # Python < 3.5: optional backport
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+from convert_thread import (
+    ConvertThread, BatchConvertThread, withcontext, withretries,
+    acceptsargument
+)
+import convert_process
+import convert_staged
+try:
+    import convert_async
+except (ImportError, SyntaxError):
+    # Python 2
+    convert_async = None
+from manifest import Manifest
+from journal import Journal
+from metrics import Metrics, filemetrics
+from adaptive import ConcurrencyController
+from plan import saveplan, loadplan
+import dedup
+from batching import iterbatches
+import commit
+from shard import parseshard, shardof
+from workqueue import WorkQueue
+from inputlist import iterpaths
+from filters import FileFilter, parsesize, parsetime
+import retry
+from timeouts import Tracker, TIMEOUT_ERROR
+from pools import ThreadPool, ProcessPool
 
 
 
@@ -47,18 +88,185 @@ class AbstractFileBatch(object):
     DEFAULT_OUTPUT_SUFFIX = ""
     # 8 concurrent threads
     DEFAULT_NB_THREADS = 8
+    # Run 'processfile' in threads ('thread') or processes ('process')
+    DEFAULT_EXECUTOR = "thread"
+    # Number of reading and writing threads (staged 'transform' only)
+    DEFAULT_READ_THREADS = 4
+    DEFAULT_WRITE_THREADS = 4
     # Backup existing files
     DEFAULT_NO_BACKUP = False
     # Look in sub directories
     DEFAULT_SUB_DIR = True
+    # Discover files while processing (instead of listing them first)
+    DEFAULT_STREAMING = False
+    # Maximum number of jobs in flight ('None' => 4 per worker)
+    DEFAULT_MAX_PENDING = None
+    # No plan file
+    DEFAULT_PLAN_FILE = None
+    # Process files (not only compute the plan)
+    DEFAULT_PLAN_ONLY = False
+    # Look for input files (plan file only saved)
+    DEFAULT_REUSE_PLAN = False
+    # Fixed number of threads
+    DEFAULT_ADAPTIVE = False
+    # Bounds of the number of threads in adaptive mode
+    DEFAULT_MIN_THREADS = 2
+    DEFAULT_MAX_THREADS = 64
+    # No manifest (=> no incremental mode)
+    DEFAULT_MANIFEST = None
+    # Compare files with size and modification time only
+    DEFAULT_HASH_CONTENT = False
+    # No checkpoint journal
+    DEFAULT_JOURNAL = None
+    # Start from scratch
+    DEFAULT_RESUME = False
+    # No export of the metrics
+    DEFAULT_METRICS_FILE = None
+    # Format of the exported metrics ('json' or 'prometheus')
+    DEFAULT_METRICS_FORMAT = "json"
+    # Process all files (even with identical contents)
+    DEFAULT_DEDUP = False
+    # Outputs of duplicate files ('copy', 'hardlink' or 'reflink')
+    DEFAULT_DEDUP_POLICY = "copy"
+    # Dispatch files in discovery order
+    DEFAULT_SCHEDULE = "input"
+    # Maximum number of files per 'processbatch' call
+    DEFAULT_BATCH_SIZE = 32
+    # Maximum time (s) a file waits for its batch to be full
+    DEFAULT_BATCH_WAIT = 0.5
+    # Only pass the paths of the files to 'processfile'
+    DEFAULT_MAP_INPUT = False
+    # Write outputs to temporary files, renamed when complete
+    DEFAULT_ATOMIC_OUTPUT = True
+    # Rename files processed in place to their backups
+    DEFAULT_BACKUP_STRATEGY = "rename"
+    # Process all files ('INDEX/COUNT' => only the files of a shard)
+    DEFAULT_SHARD = None
+    # Check input files before processing starts
+    DEFAULT_LAZY_CHECKS = False
+    # No shared work queue
+    DEFAULT_WORK_QUEUE = None
+    # Process the files of the work queue (not only populate it)
+    DEFAULT_QUEUE_MODE = "worker"
+    # No maximum processing time per file (s)
+    DEFAULT_TIMEOUT = None
+    # Single attempt per file
+    DEFAULT_RETRIES = 0
+    # Delay (s) before the first retry (doubled for each retry)
+    DEFAULT_RETRY_DELAY = 1.0
+    # No speculative execution of the slowest files
+    DEFAULT_SPECULATE = False
+    # Process all files regardless of errors
+    # (else: stop dispatching files once the budget is exceeded)
+    DEFAULT_MAX_ERRORS = None
+    DEFAULT_MAX_ERROR_RATE = None
 
     # Extensions of input files ('None' => All types)
     DEFAULT_EXTENSIONS = None
+    # Globs/regexes of input files to keep ('None' => All files)
+    DEFAULT_INCLUDE = None
+    DEFAULT_INCLUDE_REGEX = None
+    # Globs/regexes of input files to ignore
+    DEFAULT_EXCLUDE = None
+    DEFAULT_EXCLUDE_REGEX = None
+    # Bounds of the size (eg: '10K', '2G') of input files
+    DEFAULT_MIN_FILE_SIZE = None
+    DEFAULT_MAX_FILE_SIZE = None
+    # Bounds of the modification time (timestamp or date) of input files
+    DEFAULT_NEWER_THAN = None
+    DEFAULT_OLDER_THAN = None
+    # Globs of subdirectories not to look into (eg: ['.git', '__pycache__'])
+    DEFAULT_IGNORE_DIRS = None
     # Extension of output files ('None' => Same as input)
     DEFAULT_OUTPUT_EXTENSION = None
 
+    # Available execution backends
+    # ('async' is used automatically for coroutine 'processfile')
+    EXECUTORS = ("thread", "process", "async")
+
+    # Roles in a shared work queue
+    # - coordinator: populate the queue with the files to process
+    # - worker: process the files of the queue
+    QUEUE_MODES = ("coordinator", "worker")
+
+    # Time (s) between checks of a work queue with no files available
+    # (files leased by other workers)
+    QUEUE_POLL_INTERVAL = 1.0
+
+    # Available dispatch orders
+    # ('largest'/'smallest': by decreasing/increasing 'estimatecost')
+    SCHEDULES = ("input", "largest", "smallest")
+
+    # Minimum size (bytes) of input files memory-mapped in 'mapInput' mode
+    # (smaller files are read)
+    MAP_THRESHOLD = 65536
+
+    # Number of slowest files reported in the metrics summary
+    SLOWEST_FILES = 10
+
+    # Maximum delay (s) between retries
+    RETRY_MAX_DELAY = 60.0
+
+    # Speculative execution: files running for longer than
+    # 'SPECULATE_FACTOR' times the median duration are processed again
+    # by idle threads, once 'SPECULATE_MIN_FILES' files are processed
+    SPECULATE_FACTOR = 3.0
+    SPECULATE_MIN_FILES = 10
+
+    # Minimum number of processed files before checking 'maxErrorRate'
+    ERROR_RATE_MIN_FILES = 20
+
+    # Cancel the run on SIGINT/SIGTERM (files in flight are completed,
+    # a second signal aborts), when running in the main thread
+    HANDLE_SIGNALS = True
+
+    # Keep the results of all files in 'results'
+    # (can be disabled for constant memory on huge batches)
+    KEEP_RESULTS = True
+
+    # State of the batch (not options, see 'fromoptions')
+    STATE_ATTRIBUTES = ("logger", "results", "skipped", "metrics", "plan")
+
+    # Version of 'processfile'
+    # (to change when its output changes, to invalidate manifests)
+    PROCESS_VERSION = "1"
+
 
     def __init__(self, args=None):
+        self.__initialize()
+        self.__parse_arguments(args)
+
+
+    @classmethod
+    def fromoptions(cls, **options):
+        """Create a batch from options, without parsing arguments.
+
+        For use as a library (eg: 'open', 'submit' and 'iterresults').
+        Options are named as the attributes set from the command line
+        ('inputDir', 'numberThreads', 'extensions', ...), including
+        the ones added by 'add_arguments' (initialized in 'init').
+        Values are used as given: lists for the options accepting
+        several values (a single string being a list of one value),
+        numbers for numeric options.
+
+        Returns:
+        AbstractFileBatch: Batch instance, inputs checked
+
+        Raises:
+        TypeError
+            If an option is unknown
+        ValueError
+            If an option is invalid
+        argparse.ArgumentError
+            If options added by 'add_arguments' conflict
+        """
+        batch = cls.__new__(cls)
+        batch.__initialize()
+        batch.__setoptions(options)
+        return batch
+
+
+    def __initialize(self):
         if type(self) is AbstractFileBatch:
             raise TypeError(
                 "Cannot instantiate abstract class '{}'".format(type(self))
@@ -68,19 +276,92 @@ class AbstractFileBatch(object):
 
         self.inputDir = self.DEFAULT_INPUT_DIR
         self.inputFiles = None
+        self.inputList = None
         self.outputDir = self.DEFAULT_OUTPUT_DIR
         self.outputSuffix = self.DEFAULT_OUTPUT_SUFFIX
         self.numberThreads = self.DEFAULT_NB_THREADS
+        self.executor = self.DEFAULT_EXECUTOR
+        self.readThreads = self.DEFAULT_READ_THREADS
+        self.writeThreads = self.DEFAULT_WRITE_THREADS
+        self.maxPending = self.DEFAULT_MAX_PENDING
+        self.adaptive = self.DEFAULT_ADAPTIVE
+        self.planFile = self.DEFAULT_PLAN_FILE
+        self.planOnly = self.DEFAULT_PLAN_ONLY
+        self.reusePlan = self.DEFAULT_REUSE_PLAN
+        self.minThreads = self.DEFAULT_MIN_THREADS
+        self.maxThreads = self.DEFAULT_MAX_THREADS
         self.noBackup = self.DEFAULT_NO_BACKUP
         self.subDir = self.DEFAULT_SUB_DIR
+        self.streaming = self.DEFAULT_STREAMING
+        self.manifest = self.DEFAULT_MANIFEST
+        self.hashContent = self.DEFAULT_HASH_CONTENT
+        self.journal = self.DEFAULT_JOURNAL
+        self.resume = self.DEFAULT_RESUME
+        self.metricsFile = self.DEFAULT_METRICS_FILE
+        self.metricsFormat = self.DEFAULT_METRICS_FORMAT
+        self.dedup = self.DEFAULT_DEDUP
+        self.dedupPolicy = self.DEFAULT_DEDUP_POLICY
+        self.schedule = self.DEFAULT_SCHEDULE
+        self.batchSize = self.DEFAULT_BATCH_SIZE
+        self.batchWait = self.DEFAULT_BATCH_WAIT
+        self.mapInput = self.DEFAULT_MAP_INPUT
+        self.atomicOutput = self.DEFAULT_ATOMIC_OUTPUT
+        self.backupStrategy = self.DEFAULT_BACKUP_STRATEGY
+        self.shard = self.DEFAULT_SHARD
+        self.lazyChecks = self.DEFAULT_LAZY_CHECKS
+        self.workQueue = self.DEFAULT_WORK_QUEUE
+        self.queueMode = self.DEFAULT_QUEUE_MODE
+        self.timeout = self.DEFAULT_TIMEOUT
+        self.retries = self.DEFAULT_RETRIES
+        self.retryDelay = self.DEFAULT_RETRY_DELAY
+        self.speculate = self.DEFAULT_SPECULATE
+        self.maxErrors = self.DEFAULT_MAX_ERRORS
+        self.maxErrorRate = self.DEFAULT_MAX_ERROR_RATE
 
         self.extensions = self.DEFAULT_EXTENSIONS
+        self.include = self.DEFAULT_INCLUDE
+        self.includeRegex = self.DEFAULT_INCLUDE_REGEX
+        self.exclude = self.DEFAULT_EXCLUDE
+        self.excludeRegex = self.DEFAULT_EXCLUDE_REGEX
+        self.minFileSize = self.DEFAULT_MIN_FILE_SIZE
+        self.maxFileSize = self.DEFAULT_MAX_FILE_SIZE
+        self.newerThan = self.DEFAULT_NEWER_THAN
+        self.olderThan = self.DEFAULT_OLDER_THAN
+        self.ignoreDirs = self.DEFAULT_IGNORE_DIRS
         self.outputExtension = self.DEFAULT_OUTPUT_EXTENSION
 
         self.results = []
+        self.skipped = 0
+        self.metrics = Metrics(self.SLOWEST_FILES)
+
+        # (input file, output file) pairs to process
+        self.plan = None
+        # Input directory => output directory
+        self.__outputdirs = {}
+        # Output directories known to exist
+        self.__createddirs = set()
+
+        # Files completed, and backups kept, in the resumed run
+        self.__resumed = None
+        # Suffix of the backup files of the run
+        self.__backupsuffix = None
+        # (index, count) of the shard to process
+        self.__shard = None
+        # Compiled selection rules of input files
+        self.__filter = None
+        # Set to stop dispatching files (see 'cancel')
+        self.__cancelled = threading.Event()
+        self.__cancelreason = None
+        # Workers kept between runs (see 'open')
+        self.__persistent = False
+        self.__threadpool = None
+        self.__processpool = None
+        # Runs of the instance are serialized (see 'iterresults')
+        self.__runlock = threading.RLock()
+        # Called with the result of each file (see 'iterresults')
+        self.__onresult = None
 
         self.init()
-        self.__parse_arguments(args)
 
 
     # TODO: See if needed (?)
@@ -90,8 +371,61 @@ class AbstractFileBatch(object):
     '''
 
 
+    def __getstate__(self):
+        # Loggers cannot be pickled in all Python versions
+        # (instance is shipped to the workers of the 'process' executor)
+        state = self.__dict__.copy()
+        del state["logger"]
+        del state["metrics"]
+        # Not needed by the workers
+        # (input files are passed with the jobs: the lists of files
+        # would be copied to each worker process)
+        for name in (
+            "inputFiles",
+            "results",
+            "plan",
+            "_AbstractFileBatch__resumed",
+            "_AbstractFileBatch__backupsuffix",
+            "_AbstractFileBatch__outputdirs",
+            "_AbstractFileBatch__createddirs",
+            "_AbstractFileBatch__filter",
+            "_AbstractFileBatch__cancelled",
+            "_AbstractFileBatch__threadpool",
+            "_AbstractFileBatch__processpool",
+            "_AbstractFileBatch__runlock",
+            "_AbstractFileBatch__onresult",
+            "_AbstractFileBatch__leases",
+            "_AbstractFileBatch__leasedfiles",
+            "_AbstractFileBatch__signatures"
+        ):
+            state[name] = None
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.metrics = None
+
+
     def __parse_arguments(self, args=None):
         # TODO: check if 'args' is string => split(" ")
+        parser = self.__makeparser()
+
+        # Not using 'parse_args(namespace=self)'
+        # to avoid the risk of injecting undefined attributes in class
+        parsed_args = parser.parse_args(args)
+        options = vars(parsed_args)
+        for option in options:
+            if hasattr(self, option):
+                setattr(self, option, options[option])
+
+        # TODO: handle more cleanly in try/except block (?)
+        self.__checkinputs()
+
+
+    def __makeparser(self):
+        # Parser of the options (also used by 'fromoptions')
 
         # TODO: add 'epilog'?
         parser = argparse.ArgumentParser(
@@ -121,6 +455,18 @@ class AbstractFileBatch(object):
             nargs='*',
             default=self.inputFiles
         )
+        parser.add_argument(
+            "--inputList",
+            "-il",
+            help=(
+                "file listing the input files, one per line or separated"
+                " by NUL characters (eg: 'find -print0'), possibly gzip"
+                " compressed, or '-' for the standard input"
+                " (absolute paths, or relative to 'inputDir')"
+                " (read while processing the files)"
+            ),
+            default=self.inputList
+        )
         parser.add_argument(
             "--outputDir",
             "-od",
@@ -149,6 +495,97 @@ class AbstractFileBatch(object):
             nargs='*',
             default=self.extensions
         )
+        parser.add_argument(
+            "--include",
+            "-inc",
+            help=(
+                "globs of input files to keep, matched against names"
+                " (eg: 'img_*.png') or, if containing '/', against paths"
+                " relative to 'inputDir' ('**' matches subdirectories)"
+                " (default: '{}')".format(self.include)
+            ),
+            nargs='*',
+            default=self.include
+        )
+        parser.add_argument(
+            "--exclude",
+            "-exc",
+            help=(
+                "globs of input files to ignore (same syntax as 'include')"
+                " (default: '{}')".format(self.exclude)
+            ),
+            nargs='*',
+            default=self.exclude
+        )
+        parser.add_argument(
+            "--includeRegex",
+            "-ir",
+            help=(
+                "regexes of input files to keep, searched in paths"
+                " relative to 'inputDir'"
+                " (default: '{}')".format(self.includeRegex)
+            ),
+            nargs='*',
+            default=self.includeRegex
+        )
+        parser.add_argument(
+            "--excludeRegex",
+            "-er",
+            help=(
+                "regexes of input files to ignore"
+                " (default: '{}')".format(self.excludeRegex)
+            ),
+            nargs='*',
+            default=self.excludeRegex
+        )
+        parser.add_argument(
+            "--minFileSize",
+            "-mns",
+            help=(
+                "minimum size of input files (eg: '512', '10K', '1.5G')"
+                " (default: '{}')".format(self.minFileSize)
+            ),
+            default=self.minFileSize
+        )
+        parser.add_argument(
+            "--maxFileSize",
+            "-mxs",
+            help=(
+                "maximum size of input files"
+                " (default: '{}')".format(self.maxFileSize)
+            ),
+            default=self.maxFileSize
+        )
+        parser.add_argument(
+            "--newerThan",
+            "-nw",
+            help=(
+                "only process input files modified after a time"
+                " (timestamp, or local 'YYYY-MM-DD[THH:MM[:SS]]')"
+                " (default: '{}')".format(self.newerThan)
+            ),
+            default=self.newerThan
+        )
+        parser.add_argument(
+            "--olderThan",
+            "-ol",
+            help=(
+                "only process input files modified before a time"
+                " (default: '{}')".format(self.olderThan)
+            ),
+            default=self.olderThan
+        )
+        parser.add_argument(
+            "--ignoreDirs",
+            "-ig",
+            help=(
+                "globs of subdirectories not to look into"
+                " (eg: '.git', 'build/cache')"
+                " (default: '{}')".format(self.ignoreDirs)
+            ),
+            nargs='*',
+            default=self.ignoreDirs
+        )
         parser.add_argument(
             "--outputSuffix",
             "-os",
@@ -162,11 +599,219 @@ class AbstractFileBatch(object):
             "--numberThreads",
             "-nt",
             help=(
-                "number of concurrent threads (1 file per thread)"
+                "number of concurrent threads, processes or tasks"
+                " (1 file per worker)"
                 " (default: '{}')".format(self.numberThreads)
             ),
+            type=int,
             default=self.numberThreads
         )
+        parser.add_argument(
+            "--executor",
+            "-ex",
+            help=(
+                "execution backend: 'thread', 'process' for CPU bound"
+                " 'processfile' implementations, or 'async' for coroutine"
+                " implementations (selected automatically)"
+                " (default: '{}')".format(self.executor)
+            ),
+            choices=self.EXECUTORS,
+            default=self.executor
+        )
+        parser.add_argument(
+            "--readThreads",
+            "-rt",
+            help=(
+                "number of threads reading input files, when 'transform'"
+                " is implemented ('numberThreads' workers run the"
+                " transforms, in threads or processes depending on"
+                " 'executor') (default: '{}')".format(self.readThreads)
+            ),
+            type=int,
+            default=self.readThreads
+        )
+        parser.add_argument(
+            "--writeThreads",
+            "-wt",
+            help=(
+                "number of threads writing output files, when 'transform'"
+                " is implemented (default: '{}')".format(self.writeThreads)
+            ),
+            type=int,
+            default=self.writeThreads
+        )
+        parser.add_argument(
+            "--maxPending",
+            "-mp",
+            help=(
+                "maximum number of files dispatched and not handled yet"
+                " (default: '{}', 4 per worker)".format(self.maxPending)
+            ),
+            type=int,
+            default=self.maxPending
+        )
+        parser.add_argument(
+            "--schedule",
+            "-sc",
+            help=(
+                "order in which files are dispatched: discovery order,"
+                " or by estimated cost ('largest' first reduces the total"
+                " time of batches of mixed sizes)"
+                " (default: '{}')".format(self.schedule)
+            ),
+            choices=self.SCHEDULES,
+            default=self.schedule
+        )
+        parser.add_argument(
+            "--batchSize",
+            "-bs",
+            help=(
+                "maximum number of files per 'processbatch' call"
+                " (if implemented) (default: '{}')".format(self.batchSize)
+            ),
+            type=int,
+            default=self.batchSize
+        )
+        parser.add_argument(
+            "--batchWait",
+            "-bw",
+            help=(
+                "maximum time (s) a file waits for its batch to be full"
+                " (if 'processbatch' is implemented)"
+                " (default: '{}')".format(self.batchWait)
+            ),
+            type=float,
+            default=self.batchWait
+        )
+        parser.add_argument(
+            "--minThreads",
+            "-mnt",
+            help=(
+                "minimum (and initial) number of threads in adaptive mode"
+                " (default: '{}')".format(self.minThreads)
+            ),
+            type=int,
+            default=self.minThreads
+        )
+        parser.add_argument(
+            "--maxThreads",
+            "-mxt",
+            help=(
+                "maximum number of threads in adaptive mode"
+                " (default: '{}')".format(self.maxThreads)
+            ),
+            type=int,
+            default=self.maxThreads
+        )
+
+        parser.add_argument(
+            "--shard",
+            "-sh",
+            help=(
+                "only process the files of a shard, as 'INDEX/COUNT'"
+                " (eg: '2/4'), files being assigned to shards by their"
+                " path relative to 'inputDir' (default: '{}')"
+            ).format(self.shard),
+            default=self.shard
+        )
+
+        parser.add_argument(
+            "--workQueue",
+            "-wq",
+            help=(
+                "work queue file shared by several batch processes"
+                " (see 'queueMode') (default: '{}')".format(self.workQueue)
+            ),
+            default=self.workQueue
+        )
+        parser.add_argument(
+            "--queueMode",
+            "-qm",
+            help=(
+                "role in the work queue: 'coordinator' adds the input files"
+                " to the queue, 'worker' processes the files of the queue"
+                " (default: '{}')".format(self.queueMode)
+            ),
+            choices=self.QUEUE_MODES,
+            default=self.queueMode
+        )
+
+        parser.add_argument(
+            "--manifest",
+            "-mf",
+            help=(
+                "manifest file of processed files (incremental mode:"
+                " unchanged files are skipped)"
+                " (default: '{}')".format(self.manifest)
+            ),
+            default=self.manifest
+        )
+
+        parser.add_argument(
+            "--journal",
+            "-jn",
+            help=(
+                "checkpoint journal file, to be able to resume the batch"
+                " if interrupted (default: '{}')".format(self.journal)
+            ),
+            default=self.journal
+        )
+
+        parser.add_argument(
+            "--metricsFile",
+            "-mt",
+            help=(
+                "file where to export the metrics summary of the run"
+                " (default: '{}')".format(self.metricsFile)
+            ),
+            default=self.metricsFile
+        )
+        parser.add_argument(
+            "--metricsFormat",
+            "-mtf",
+            help=(
+                "format of the exported metrics"
+                " (default: '{}')".format(self.metricsFormat)
+            ),
+            choices=("json", "prometheus"),
+            default=self.metricsFormat
+        )
+
+        parser.add_argument(
+            "--backupStrategy",
+            "-bk",
+            help=(
+                "how files processed in place are backed up:"
+                " 'rename' to a backup, 'hardlink' to a backup (the file"
+                " stays in place until its output is complete), 'copy' to"
+                " a backup (the file stays in place), or 'none'"
+                " (default: '{}')".format(self.backupStrategy)
+            ),
+            choices=commit.BACKUP_STRATEGIES,
+            default=self.backupStrategy
+        )
+
+        parser.add_argument(
+            "--dedupPolicy",
+            "-dp",
+            help=(
+                "how outputs of duplicate files are produced in dedup mode"
+                " ('hardlink' and 'reflink' fall back to 'copy')"
+                " (default: '{}')".format(self.dedupPolicy)
+            ),
+            choices=dedup.POLICIES,
+            default=self.dedupPolicy
+        )
+
+        parser.add_argument(
+            "--planFile",
+            "-pf",
+            help=(
+                "file where to save the plan of output paths"
+                " (see 'reusePlan') (default: '{}')".format(self.planFile)
+            ),
+            default=self.planFile
+        )
 
         # Flags
         parser.add_argument(
@@ -184,25 +829,295 @@ class AbstractFileBatch(object):
             help="look for input files in sub directories",
             action='store_false' if self.subDir else 'store_true'
         )
+        parser.add_argument(
+            "--streaming",
+            "-st",
+            help=(
+                "dispatch input files as they are discovered"
+                " (input files are not listed nor counted beforehand)"
+            ),
+            action='store_false' if self.streaming else 'store_true'
+        )
+        parser.add_argument(
+            "--lazyChecks",
+            "-lc",
+            help=(
+                "check input files in the workers, when processing them"
+                " (failed checks are reported as errors of the files),"
+                " and discover input files while processing them"
+            ),
+            action='store_false' if self.lazyChecks else 'store_true'
+        )
+        parser.add_argument(
+            "--timeout",
+            "-to",
+            help=(
+                "maximum processing time of a file in seconds, after which"
+                " it fails (hung threads are abandoned and replaced, hung"
+                " processes are killed, coroutines are cancelled)"
+                " (default: '{}')".format(self.timeout)
+            ),
+            type=float,
+            default=self.timeout
+        )
+        parser.add_argument(
+            "--retries",
+            "-rr",
+            help=(
+                "maximum number of retries of a file failing with a"
+                " retryable error (see 'isretryable')"
+                " (default: '{}')".format(self.retries)
+            ),
+            type=int,
+            default=self.retries
+        )
+        parser.add_argument(
+            "--retryDelay",
+            "-rd",
+            help=(
+                "delay before the first retry in seconds, doubled for each"
+                " retry (default: '{}')".format(self.retryDelay)
+            ),
+            type=float,
+            default=self.retryDelay
+        )
+        parser.add_argument(
+            "--speculate",
+            "-sp",
+            help=(
+                "process the slowest files a second time with idle"
+                " threads once all files are dispatched, keeping the first"
+                " result ('thread' executor, with 'atomicOutput')"
+            ),
+            action='store_false' if self.speculate else 'store_true'
+        )
+        parser.add_argument(
+            "--maxErrors",
+            "-me",
+            help=(
+                "stop dispatching files once this number of files failed"
+                " (files in flight are completed)"
+                " (default: '{}')".format(self.maxErrors)
+            ),
+            type=int,
+            default=self.maxErrors
+        )
+        parser.add_argument(
+            "--maxErrorRate",
+            "-mer",
+            help=(
+                "stop dispatching files once the ratio of failed files"
+                " exceeds this rate, between 0 and 1 (checked after {}"
+                " files) (default: '{}')"
+            ).format(self.ERROR_RATE_MIN_FILES, self.maxErrorRate),
+            type=float,
+            default=self.maxErrorRate
+        )
+        parser.add_argument(
+            "--planOnly",
+            "-po",
+            help=(
+                "only compute the plan of output paths"
+                " (saved to 'planFile' if specified), without processing"
+            ),
+            action='store_false' if self.planOnly else 'store_true'
+        )
+        parser.add_argument(
+            "--reusePlan",
+            "-rp",
+            help=(
+                "load the plan from 'planFile' if it exists, skipping"
+                " discovery and planning (files added since the plan was"
+                " saved are not processed)"
+            ),
+            action='store_false' if self.reusePlan else 'store_true'
+        )
+        parser.add_argument(
+            "--adaptive",
+            "-ad",
+            help=(
+                "adapt the number of threads to the measured throughput"
+                " (between 'minThreads' and 'maxThreads')"
+            ),
+            action='store_false' if self.adaptive else 'store_true'
+        )
+        parser.add_argument(
+            "--hashContent",
+            "-hc",
+            help=(
+                "record content hashes in the manifest"
+                " (files touched but unchanged are skipped)"
+            ),
+            action='store_false' if self.hashContent else 'store_true'
+        )
+        parser.add_argument(
+            "--resume",
+            "-rs",
+            help=(
+                "resume an interrupted batch from its journal"
+                " (completed files are skipped)"
+            ),
+            action='store_false' if self.resume else 'store_true'
+        )
+        parser.add_argument(
+            "--atomicOutput",
+            "-ao",
+            help=(
+                "write output files to temporary files, renamed to their"
+                " final paths when complete"
+                + (" (disable)" if self.atomicOutput else "")
+            ),
+            action='store_false' if self.atomicOutput else 'store_true'
+        )
+        parser.add_argument(
+            "--mapInput",
+            "-mi",
+            help=(
+                "pass the contents of the input files to 'processfile'"
+                " (memory-mapped if large enough)"
+            ),
+            action='store_false' if self.mapInput else 'store_true'
+        )
+        parser.add_argument(
+            "--dedup",
+            "-dd",
+            help=(
+                "process files with identical contents only once"
+                " (outputs of the others are linked or copied)"
+            ),
+            action='store_false' if self.dedup else 'store_true'
+        )
 
         required_arguments = parser.add_argument_group('required arguments')
 
         # Add derived/implementation script specific arguments
         self.add_arguments(parser, required_arguments)
+        return parser
 
-        # Not using 'parse_args(namespace=self)'
-        # to avoid the risk of injecting undefined attributes in class
-        parsed_args = parser.parse_args(args)
-        options = vars(parsed_args)
-        for option in options:
-            if hasattr(self, option):
-                setattr(self, option, options[option])
 
-        # TODO: handle more cleanly in try/except block (?)
+    def __setoptions(self, options):
+        # Options accepting several values
+        # (parser built as well to detect conflicting options)
+        lists = set(
+            action.dest
+            for action in self.__makeparser()._actions
+            if action.nargs in ("*", "+")
+        )
+
+        for option, value in options.items():
+            # Same rule as for parsed arguments, without injecting
+            # undefined attributes, nor replacing the state of the batch
+            if (
+                option.startswith("_")
+                or option in self.STATE_ATTRIBUTES
+                or not hasattr(self, option)
+                or callable(getattr(self, option))
+            ):
+                raise TypeError("Unknown option '{}'".format(option))
+            if option in lists and isinstance(value, string_types):
+                # Single value (not a list of characters)
+                value = [value]
+            setattr(self, option, value)
+
         self.__checkinputs()
 
 
     def __checkinputs(self):
+        # Execution backend
+        if self.iscoroutineprocess():
+            if self.executor != "async":
+                self.logger.info((
+                    "Coroutine 'processfile': using 'async' executor"
+                    " instead of '{}'"
+                ).format(self.executor))
+                self.executor = "async"
+        elif self.executor == "async":
+            raise ValueError(
+                "'async' executor requires a coroutine 'processfile'"
+            )
+
+        if self.adaptive and self.executor != "thread":
+            self.logger.warning((
+                "Adaptive mode not supported by '{}' executor => Ignoring"
+            ).format(self.executor))
+            self.adaptive = False
+
+        if self.timeout is not None and self.timeout <= 0:
+            raise ValueError("'timeout' must be positive")
+        if self.maxErrors is not None and self.maxErrors < 1:
+            raise ValueError("'maxErrors' must be at least 1")
+        if (
+            self.maxErrorRate is not None
+            and not 0 <= self.maxErrorRate < 1
+        ):
+            raise ValueError("'maxErrorRate' must be between 0 and 1")
+        if self.retries < 0 or self.retryDelay < 0:
+            raise ValueError("'retries' and 'retryDelay' cannot be negative")
+
+        if self.speculate:
+            if self.executor != "thread" or self.isbatchprocess():
+                self.logger.warning((
+                    "Speculative execution only supported by 'thread'"
+                    " executor with 'processfile' => Ignoring"
+                ))
+                self.speculate = False
+            elif not self.atomicOutput:
+                # Copies of a file would write the same output
+                self.logger.warning(
+                    "Speculative execution requires 'atomicOutput'"
+                    " => Ignoring"
+                )
+                self.speculate = False
+
+        if self.isstagedprocess():
+            if self.executor == "async":
+                raise ValueError(
+                    "'async' executor not supported by 'transform'"
+                )
+            if self.readThreads < 1 or self.writeThreads < 1:
+                raise ValueError(
+                    "'readThreads' and 'writeThreads' must be at least 1"
+                )
+            for option, supported in (
+                ("adaptive", False),
+                ("mapInput", False),
+                ("timeout", None),
+                ("speculate", False)
+            ):
+                if getattr(self, option) != supported:
+                    self.logger.warning((
+                        "'{}' not supported by 'transform' => Ignoring"
+                    ).format(option))
+                    setattr(self, option, supported)
+            if self.isbatchprocess():
+                self.logger.warning(
+                    "'processbatch' not used with 'transform' => Ignoring"
+                )
+
+        elif self.isbatchprocess():
+            if self.executor == "async":
+                self.logger.warning(
+                    "'processbatch' not used by 'async' executor => Ignoring"
+                )
+            elif self.batchSize < 1:
+                raise ValueError("'batchSize' must be at least 1")
+
+        if self.backupStrategy == "none" and not self.atomicOutput:
+            raise ValueError(
+                "'none' backup strategy requires 'atomicOutput'"
+            )
+
+        if self.mapInput:
+            if self.isbatchprocess() and self.executor != "async":
+                self.logger.warning(
+                    "'mapInput' not supported by 'processbatch' => Ignoring"
+                )
+                self.mapInput = False
+            elif not acceptsargument(self.processfile, "data"):
+                raise ValueError(
+                    "'mapInput' requires a 'data' argument in 'processfile'"
+                )
+
         # Extensions
         if self.extensions:
             self.extensions = self.__splitvalues(self.extensions)
@@ -213,8 +1128,37 @@ class AbstractFileBatch(object):
         if self.outputExtension:
             self.outputExtension = self.outputExtension.lower()
 
-        # Source directory
-        if self.inputDir:
+        # Selection of input files
+        for name in ("include", "exclude", "ignoreDirs"):
+            if getattr(self, name):
+                setattr(self, name, self.__splitvalues(getattr(self, name)))
+        self.__filter = FileFilter(
+            extensions=self.extensions,
+            include=self.include,
+            exclude=self.exclude,
+            include_regex=self.includeRegex,
+            exclude_regex=self.excludeRegex,
+            min_size=(
+                parsesize(self.minFileSize)
+                if self.minFileSize is not None else None
+            ),
+            max_size=(
+                parsesize(self.maxFileSize)
+                if self.maxFileSize is not None else None
+            ),
+            newer=(
+                parsetime(self.newerThan)
+                if self.newerThan is not None else None
+            ),
+            older=(
+                parsetime(self.olderThan)
+                if self.olderThan is not None else None
+            ),
+            ignored_dirs=self.ignoreDirs
+        )
+
+        # Source directory
+        if self.inputDir:
             self.inputDir = self.inputDir.strip()
         else:
             self.logger.info((
@@ -223,53 +1167,6 @@ class AbstractFileBatch(object):
             self.inputDir = self.DEFAULT_INPUT_DIR
         self.checkpath(self.inputDir)
 
-
-        # Source files
-        if self.inputFiles:
-            self.inputFiles = self.__splitvalues(self.inputFiles)
-
-            inputFiles = []
-            for inputFile in self.inputFiles:
-                inputFile = inputFile.strip()
-
-                if not os.path.isabs(inputFile):
-                    inputFile = os.path.join(self.inputDir, inputFile)
-
-                try:
-                    self.__checkfile(inputFile, extensions=self.extensions)
-                except OSError as e:
-                    self.logger.info(str(e) + " => Ignoring")
-                    continue
-
-                inputFiles.append(inputFile)
-
-            self.inputFiles = inputFiles
-
-        else:
-            self.logger.info((
-                "Using default value for inputFiles:"
-                " all files in '{}' (subdirectories: {})"
-            ).format(self.inputDir, self.subDir))
-
-            inputFiles = []
-            files = self.getfiles(
-                self.inputDir,
-                extensions=self.extensions,
-                recursive=self.subDir
-            )
-            for inputFile in files:
-                inputFile = os.path.join(self.inputDir, inputFile)
-
-                try:
-                    self.__checkfile(inputFile, extensions=self.extensions)
-                except OSError as e:
-                    self.logger.info(str(e) + " => Ignoring")
-                    continue
-
-                inputFiles.append(inputFile)
-
-            self.inputFiles = inputFiles
-
         # Output directory/directories
         if not self.outputDir:
             self.outputDir = self.DEFAULT_OUTPUT_DIR
@@ -309,56 +1206,1173 @@ class AbstractFileBatch(object):
                 "Using separate output directories: {}"
             ).format(self.outputDir))
 
+        if self.shard:
+            self.__shard = parseshard(self.shard)
+            self.logger.info((
+                "Processing shard {} of {}"
+            ).format(*self.__shard))
+
+        # Resume from journal (before looking for files, as
+        # interrupted in place files are restored from their backups)
+        if self.reusePlan and not self.planFile:
+            raise ValueError("'reusePlan' requires a 'planFile'")
+
+        if self.resume:
+            if not self.journal:
+                raise ValueError("'resume' requires a 'journal'")
+            self.__replayjournal()
+
+
+        # Source files
+        if self.__isqueueworker():
+            self.logger.info((
+                "Processing files of work queue '{}'"
+            ).format(self.workQueue))
+
+            # Files leased in 'process'
+            self.inputFiles = None
+
+        elif self.inputList:
+            if self.inputFiles:
+                raise ValueError(
+                    "'inputFiles' and 'inputList' cannot be used together"
+                )
+            self.logger.info((
+                "Streaming input files from '{}'"
+            ).format(self.inputList))
+
+            # Files read in 'process'
+            self.inputFiles = None
+
+        elif self.inputFiles:
+            self.inputFiles = self.__selectfiles(self.inputFiles)
+
+        elif (
+            self.reusePlan
+            and not self.planOnly
+            and os.path.isfile(self.planFile)
+            and self.__loadplan()
+        ):
+            self.inputFiles = [
+                inputFile
+                for inputFile, outputFile in self.plan
+            ]
+
+        elif self.streaming or self.lazyChecks:
+            self.logger.info((
+                "Using default value for inputFiles:"
+                " streaming all files in '{}' (subdirectories: {})"
+            ).format(self.inputDir, self.subDir))
+
+            # Files discovered in 'process'
+            self.inputFiles = None
+
+        else:
+            self.logger.info((
+                "Using default value for inputFiles:"
+                " all files in '{}' (subdirectories: {})"
+            ).format(self.inputDir, self.subDir))
+
+            inputFiles = []
+            files = self.getfiles(
+                self.inputDir,
+                recursive=self.subDir,
+                file_filter=self.__filter
+            )
+            for inputFile in files:
+                inputFile = os.path.join(self.inputDir, inputFile)
+
+                if not self.__inshard(inputFile):
+                    continue
+
+                try:
+                    # (type and selection already checked by 'getfiles')
+                    self.checkfile(inputFile)
+                except OSError as e:
+                    self.logger.info(str(e) + " => Ignoring")
+                    continue
+
+                inputFiles.append(inputFile)
+
+            self.inputFiles = inputFiles
+
         self.checkinputs()
 
 
+    def __selectfiles(self, inputFiles):
+        # Checks of the files given explicitly ('inputFiles')
+        selectedFiles = []
+        for inputFile in self.__splitvalues(inputFiles):
+            inputFile = inputFile.strip()
+
+            if not os.path.isabs(inputFile):
+                inputFile = os.path.join(self.inputDir, inputFile)
+
+            if not self.__inshard(inputFile):
+                continue
+
+            try:
+                if self.lazyChecks:
+                    # Other checks made in the workers
+                    self.__checkextension(inputFile)
+                else:
+                    self.__checkfile(inputFile)
+                selected = self.__isselected(inputFile)
+            except OSError as e:
+                self.logger.info(str(e) + " => Ignoring")
+                continue
+
+            if not selected:
+                self.logger.info((
+                    "'{}' not selected => Ignoring"
+                ).format(inputFile))
+                continue
+
+            selectedFiles.append(inputFile)
+
+        return selectedFiles
+
+
+    def __getplanconfig(self):
+        return {
+            "inputDir": self.inputDir,
+            "outputDir": self.outputDir,
+            "outputExtension": self.outputExtension,
+            "outputSuffix": self.outputSuffix,
+            "extensions": self.extensions,
+            "include": self.include,
+            "exclude": self.exclude,
+            "includeRegex": self.includeRegex,
+            "excludeRegex": self.excludeRegex,
+            "minFileSize": self.minFileSize,
+            "maxFileSize": self.maxFileSize,
+            "newerThan": self.newerThan,
+            "olderThan": self.olderThan,
+            "ignoreDirs": self.ignoreDirs,
+            "subDir": self.subDir,
+            "shard": self.shard
+        }
+
+
+    def __inshard(self, inputFile):
+        if self.__shard is None:
+            return True
+
+        index, count = self.__shard
+        relative_path = os.path.relpath(inputFile, self.inputDir)
+        return shardof(relative_path, count) == index
+
+
+    def __loadplan(self):
+        plan = loadplan(self.planFile, self.__getplanconfig())
+        if plan is None:
+            self.logger.warning((
+                "Plan '{}' computed with different options => Ignoring"
+            ).format(self.planFile))
+            return False
+
+        self.logger.info((
+            "Using plan '{}' ({} file(s))"
+        ).format(self.planFile, len(plan)))
+        if os.path.getmtime(self.inputDir) > os.path.getmtime(self.planFile):
+            # Only the input directory itself is checked
+            self.logger.warning((
+                "Input directory '{}' modified since plan '{}' was saved:"
+                " new files are not processed"
+            ).format(self.inputDir, self.planFile))
+        self.plan = plan
+        return True
+
+
+    def __isqueueworker(self):
+        return bool(self.workQueue) and self.queueMode == "worker"
+
+
+    def __populatequeue(self):
+        if self.plan is None and self.inputFiles is not None:
+            self.plan = self.makeplan()
+
+        self.logger.info((
+            "Populating work queue '{}'"
+        ).format(self.workQueue))
+        work_queue = WorkQueue(self.workQueue)
+        try:
+            added = work_queue.populate(self.__iterplan())
+            counts = work_queue.counts()
+        finally:
+            work_queue.close()
+
+        self.logger.info((
+            "{} file(s) added to the work queue ({})"
+        ).format(
+            added,
+            ", ".join(
+                "{}: {}".format(state, number)
+                for state, number in sorted(counts.items())
+            )
+        ))
+
+
+    def makeplan(self):
+        """Compute the output paths of all the input files.
+
+        Output directories are resolved once per input directory
+        (they are created when the files are dispatched, not by
+        plan-only runs).
+
+        Returns:
+        list of tuple: (input file, output file) pairs
+        """
+        plan = [
+            (inputFile, self.getoutputfile(inputFile))
+            for inputFile in self.__iterinputfiles()
+        ]
+        outputDirs = set(
+            os.path.dirname(outputFile)
+            for inputFile, outputFile in plan
+        )
+        self.logger.info((
+            "Plan: {} file(s), {} output directorie(s)"
+        ).format(len(plan), len(outputDirs)))
+        return plan
+
+
+    def __replayjournal(self):
+        completed = set()
+        backups = set()
+
+        entries = Journal.replay(self.journal)
+        self.logger.info((
+            "Resuming from journal '{}' ({} file(s))"
+        ).format(self.journal, len(entries)))
+
+        for inputFile, entry in entries.items():
+            backup = entry["backup"]
+
+            if entry["state"] == Journal.COMPLETED:
+                completed.add(inputFile)
+                if not backup or not os.path.isfile(backup):
+                    continue
+
+                if self.noBackup:
+                    # Interrupted before deleting the backup
+                    self.logger.warning((
+                        "Deleting file '{}'"
+                    ).format(backup))
+                    os.remove(backup)
+                else:
+                    backups.add(backup)
+
+            elif backup and os.path.isfile(backup):
+                if os.path.exists(inputFile) and (
+                    not entry["backedup"]
+                    or self.__isoriginal(inputFile, backup)
+                ):
+                    # Interrupted while backing up (backup possibly
+                    # incomplete), or before the input was replaced
+                    # (kept in place): the input is the original
+                    self.logger.info((
+                        "Deleting backup '{}' of unprocessed file '{}'"
+                    ).format(backup, inputFile))
+                    os.remove(backup)
+                    continue
+
+                # Interrupted or failed in place: restore the input
+                # (output, if any, is incomplete or invalid)
+                self.logger.info((
+                    "Restoring file '{}' from '{}'"
+                ).format(inputFile, backup))
+                if os.path.exists(inputFile):
+                    os.remove(inputFile)
+                os.rename(backup, inputFile)
+
+        self.__resumed = (completed, backups)
+
+
+    def __isoriginal(self, inputFile, backup):
+        # File kept in place while backed up ('hardlink' and 'copy'
+        # strategies), not replaced by its output yet
+        if os.path.samefile(inputFile, backup):
+            return True
+        if self.backupStrategy != "copy" and not self.workQueue:
+            return False
+        # Copies have the size and modification time of the original
+        stat = os.stat(inputFile)
+        backupStat = os.stat(backup)
+        return (
+            stat.st_size == backupStat.st_size
+            and stat.st_mtime == backupStat.st_mtime
+        )
+
+
     def run(self):
-        if not self.inputFiles:
+        if self.planOnly:
+            if self.plan is None:
+                self.plan = self.makeplan()
+            if self.planFile:
+                self.logger.info((
+                    "Saving plan to '{}'"
+                ).format(self.planFile))
+                saveplan(self.planFile, self.__getplanconfig(), self.plan)
+            return True
+
+        if not self.inputFiles and self.inputFiles is not None:
             self.logger.warning("No files to process")
             return True
 
+        if self.workQueue and not self.__isqueueworker():
+            self.__populatequeue()
+            return True
+
         # TODO: raise+catch exceptions instead of boolean return (?)
         # (idem for 'process' & 'postprocess')
         if not self.preprocess():
             self.logger.error("Error in pre-process! => Aborting")
             return False
 
-        success = self.process()
-        if not success:
-            self.logger.error("Error in process!")
+        success = self.process()
+        if not success:
+            self.logger.error("Error in process!")
+
+        if not self.postprocess(success):
+            self.logger.error("Error in post-process!")
+            return False
+
+        return success
+
+
+    def process(self):
+        if (
+            self.inputFiles is not None
+            and not self.lazyChecks
+            and self.logger.isEnabledFor(logging.INFO)
+        ):
+            self.logger.info((
+                "Files to process:\n{}"
+            ).format("\n".join(self.inputFiles)))
+
+        if self.plan is None and self.inputFiles is not None:
+            # Not in streaming mode: plan all files at once
+            self.plan = self.makeplan()
+            if self.planFile:
+                self.logger.info((
+                    "Saving plan to '{}'"
+                ).format(self.planFile))
+                saveplan(self.planFile, self.__getplanconfig(), self.plan)
+
+        if self.schedule != "input" and self.plan is None:
+            self.logger.warning((
+                "Schedule '{}' not supported in streaming mode => Ignoring"
+            ).format(self.schedule))
+
+        manifest = None
+        if self.manifest:
+            self.logger.info((
+                "Using manifest '{}'"
+            ).format(self.manifest))
+            manifest = Manifest(
+                self.manifest,
+                self.PROCESS_VERSION,
+                self.hashContent
+            )
+
+        journal = None
+        if self.journal:
+            self.logger.info((
+                "Using journal '{}'"
+            ).format(self.journal))
+            journal = Journal(self.journal, append=self.resume)
+
+        work_queue = None
+        if self.__isqueueworker():
+            work_queue = WorkQueue(self.workQueue)
+            self.logger.info((
+                "Using work queue '{}' (worker '{}')"
+            ).format(self.workQueue, work_queue.owner))
+
+        self.__cancelled.clear()
+        self.__cancelreason = None
+        restoresignals = self.__handlesignals()
+        try:
+            errors = self.__process(manifest, journal, work_queue)
+        finally:
+            restoresignals()
+            if manifest:
+                manifest.close()
+            if journal:
+                journal.close()
+            if work_queue:
+                work_queue.close()
+
+        if self.iscancelled():
+            self.logger.warning((
+                "Run cancelled ({}): remaining files not processed"
+            ).format(self.__cancelreason))
+
+        if self.skipped:
+            self.logger.info((
+                "{} unchanged or completed file(s) skipped"
+            ).format(self.skipped))
+        elif not self.metrics.files:
+            self.logger.warning("No files to process")
+
+        summary = self.getsummary()
+        self.logger.info((
+            "{} file(s) processed in {:.3f}s ({:.1f} files/s)"
+        ).format(
+            summary["files"],
+            summary["elapsed"],
+            summary["throughput"]
+        ))
+        if self.metricsFile:
+            self.logger.info((
+                "Exporting metrics to '{}'"
+            ).format(self.metricsFile))
+            self.metrics.export(self.metricsFile, self.metricsFormat)
+
+        return not errors and not self.iscancelled()
+
+
+    def open(self):
+        """Keep the workers between runs (for use as a library).
+
+        The workers of the 'thread' and 'process' executors are started
+        by the next run, and reused by the following runs ('run',
+        'submit', 'iterresults') until 'close': workers are initialized
+        once ('initworker'), and their options are the ones of the first
+        run. Workers of the 'async' executor and of 'transform' stages
+        are still started by each run. Can be used as a context manager.
+
+        Returns:
+        AbstractFileBatch: The instance
+        """
+        if self.executor == "async" or self.isstagedprocess():
+            self.logger.info((
+                "Workers of '{}' executor{} not reused between runs"
+            ).format(
+                self.executor,
+                " with 'transform'" if self.isstagedprocess() else ""
+            ))
+        self.__persistent = True
+        return self
+
+
+    def close(self):
+        """Stop the workers kept by 'open'.
+
+        Waits for the current run, if any. Workers are torn down
+        ('teardownworker').
+        """
+        with self.__runlock:
+            self.__persistent = False
+            threadpool, self.__threadpool = self.__threadpool, None
+            processpool, self.__processpool = self.__processpool, None
+        if threadpool is not None:
+            threadpool.close()
+        if processpool is not None:
+            processpool.close()
+
+
+    def __enter__(self):
+        return self.open()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def submit(self, inputFiles):
+        """Process some files (for use as a library).
+
+        The files are checked and selected as the 'inputFiles' option,
+        then processed as with 'run' (pre-process and post-process
+        included), by the workers kept by 'open' if any. Runs of the
+        instance are serialized: 'submit' waits for the current run.
+
+        Parameters:
+        inputFiles: list of str
+            Paths of the files, relative to 'inputDir' if not absolute
+
+        Returns:
+        bool: True if all the files were processed successfully
+            (their results are in 'results')
+
+        Raises:
+        ValueError
+            If the files are read from 'inputList' or a work queue
+        """
+        with self.__runlock:
+            if self.inputList or self.__isqueueworker():
+                raise ValueError((
+                    "Files cannot be submitted when read from"
+                    " 'inputList' or a work queue"
+                ))
+            self.inputFiles = self.__selectfiles(inputFiles)
+            # Planned in 'process'
+            self.plan = None
+            return self.run()
+
+
+    def iterresults(self, inputFiles=None):
+        """Process files, yielding their results as they complete.
+
+        The run ('run', or 'submit' with 'inputFiles') is executed in
+        a separate thread (signals are not handled). Files skipped by
+        the run (manifest, journal) are not yielded. Stopping the
+        iteration cancels the run: files in flight are completed
+        before the generator is closed.
+
+        Parameters:
+        inputFiles: list of str, optional
+            Files to process, as with 'submit'
+            (default: None, the input files of the batch)
+
+        Yields:
+        tuple: (input file, output file, error), 'error' being None
+            on success
+
+        Raises:
+        Exception
+            Error raised by the run
+        """
+        results = queue.Queue()
+        # Put once the run is over
+        done = object()
+        errors = []
+        # Set when the iteration is stopped
+        stopped = []
+
+        def onresult(result):
+            if stopped:
+                # Cancelled once the run has started
+                self.cancel("iteration stopped")
+            results.put(result)
+
+        def execute():
+            try:
+                with self.__runlock:
+                    if stopped:
+                        return
+                    self.__onresult = onresult
+                    try:
+                        if inputFiles is not None:
+                            self.submit(inputFiles)
+                        else:
+                            self.run()
+                    finally:
+                        self.__onresult = None
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=execute)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            while True:
+                result = results.get()
+                if result is done:
+                    break
+                yield result
+        finally:
+            if thread.is_alive():
+                stopped.append(True)
+                if self.__onresult is onresult:
+                    self.cancel("iteration stopped")
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+
+    def cancel(self, reason="cancelled"):
+        """Stop the current run.
+
+        No more files are dispatched: files in flight are completed
+        and handled (outputs, journal, manifest), then 'run' returns
+        False. Can be called from any thread of the process running
+        the batch (eg: from an application, or from 'processfile' with
+        the 'thread' executor).
+
+        Parameters:
+        reason: str, optional
+            Reason of the cancellation, logged (default: 'cancelled')
+        """
+        if self.__cancelled.is_set():
+            return
+        self.__cancelreason = reason
+        self.__cancelled.set()
+        self.logger.warning((
+            "Cancelling run ({}): completing files in flight"
+        ).format(reason))
+
+
+    def iscancelled(self):
+        """Check if the current run is cancelled.
+
+        Returns:
+        bool: True if 'cancel' was called during the run
+        """
+        return self.__cancelled.is_set()
+
+
+    def __handlesignals(self):
+        """Cancel the run on SIGINT/SIGTERM.
+
+        Returns:
+        callable: Function restoring the previous handlers
+        """
+        previous = {}
+
+        def restore():
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+        if not self.HANDLE_SIGNALS:
+            return restore
+
+        def handler(signum, frame):
+            if self.iscancelled():
+                # Second signal: abort
+                raise KeyboardInterrupt()
+            self.cancel("signal {}".format(signum))
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                previous[signum] = signal.signal(signum, handler)
+            except ValueError:
+                # Not in the main thread
+                break
+        return restore
+
+
+    def __checkerrors(self):
+        # Error budget, checked as results are handled
+        errors = self.metrics.errors
+        if self.maxErrors is not None and errors >= self.maxErrors:
+            self.cancel("{} file(s) failed".format(errors))
+        elif (
+            self.maxErrorRate is not None
+            and self.metrics.files >= self.ERROR_RATE_MIN_FILES
+            and errors > self.maxErrorRate * self.metrics.files
+        ):
+            self.cancel("{} of {} file(s) failed".format(
+                errors,
+                self.metrics.files
+            ))
+
+
+    def __process(self, manifest, journal, work_queue=None):
+        # Backup files of jobs not handled yet
+        temp_files = set()
+        # Backup files of completed jobs, to delete ('noBackup')
+        stale_backups = []
+        self.results = []
+        self.skipped = 0
+        self.__errors = False
+        self.metrics = Metrics(self.SLOWEST_FILES)
+        # Files leased from the work queue: input file => lease,
+        # and file dispatched (backup if in place) => input file
+        self.__leases = {}
+        self.__leasedfiles = {}
+        # Signatures of the inputs when dispatched (manifest)
+        self.__signatures = {}
+        # Unique per run: backups are made with a single operation
+        self.__backupsuffix = ".bak-{}-{}".format(
+            time.strftime("%Y%m%d%H%M%S"),
+            os.getpid()
+        )
+
+        # Generator: jobs are dispatched as soon as they are created
+        # (and as soon as files are discovered in streaming mode)
+        def iterjobs():
+            return self.__iterjobs(
+                self.__iterplan(work_queue),
+                temp_files,
+                manifest,
+                journal,
+                work_queue
+            )
+        jobs = iterjobs()
+
+        def handle(item):
+            result, file_metrics = item
+            self.metrics.add(result, file_metrics)
+            self.__handleresult(
+                result,
+                temp_files,
+                stale_backups,
+                manifest,
+                journal,
+                work_queue
+            )
+            if result[2]:
+                self.__checkerrors()
+            if self.__onresult is not None:
+                self.__onresult(result)
+
+        self.metrics.start()
+        try:
+            if self.dedup and self.plan is not None:
+                jobs, handle = self.__dedup(jobs, handle, temp_files)
+            elif self.dedup:
+                self.logger.warning(
+                    "Dedup mode not supported in streaming mode => Ignoring"
+                )
+            self.__execute(jobs, handle)
+
+            # Files leased by other workers are leased again if they die
+            # (checked once all the files of the worker are handled)
+            while (
+                work_queue
+                and work_queue.remaining()
+                and not self.iscancelled()
+            ):
+                time.sleep(self.QUEUE_POLL_INTERVAL)
+                self.__execute(iterjobs(), handle)
+
+        finally:
+            self.metrics.stop()
+            if stale_backups:
+                self.__removebackups(stale_backups)
+
+        return self.__errors
+
+
+    def __removebackups(self, backups):
+        self.logger.info((
+            "Deleting {} backup file(s)"
+        ).format(len(backups)))
+        for error in commit.removefiles(backups):
+            self.logger.warning((
+                "Backup not deleted: {}"
+            ).format(error))
+
+
+    def __dedup(self, jobs, handle, temp_files):
+        """Dispatch a single job per group of identical input files.
+
+        Files are grouped from the plan, and jobs generated lazily:
+        the first job of a group is dispatched, and the outputs of the
+        other files of the group are produced from its output once its
+        result is handled.
+
+        Returns:
+        tuple: (jobs, handle) to execute
+        """
+        groups = dedup.groupfiles(
+            [inputFile for inputFile, outputFile in self.plan],
+            self.numberThreads
+        )
+        # Input file => index of its group
+        groupof = {}
+        for index, group in enumerate(groups):
+            for inputFile in group:
+                groupof[inputFile] = index
+        if groups:
+            self.logger.info((
+                "Dedup mode: {} duplicate file(s) in {} group(s)"
+            ).format(len(groupof) - len(groups), len(groups)))
+
+        # Group => file dispatched, and file dispatched => group
+        leaders = {}
+        dispatched = {}
+        # File dispatched => jobs of its duplicates (until handled)
+        duplicates = {}
+        # Group => result of its dispatched file
+        handled = {}
+        # Results handled by the dispatching thread, and by the thread
+        # generating the jobs (see 'iterbatches')
+        lock = threading.Lock()
+
+        def link(result, job):
+            file_in, file_out, overwrite = job
+            start = time.time()
+            if result[2]:
+                error = "Duplicate of '{}': {}".format(result[0], result[2])
+            else:
+                error = None
+                try:
+                    dedup.linkfile(
+                        result[1],
+                        file_out,
+                        self.dedupPolicy,
+                        overwrite,
+                        self.atomicOutput
+                    )
+                except (IOError, OSError) as e:
+                    error = str(e)
+
+            duplicate = (file_in, file_out, error)
+            handle((duplicate, filemetrics(
+                duplicate,
+                start,
+                start,
+                time.time(),
+                None,
+                "dedup"
+            )))
+
+        def dedupjobs():
+            for job in jobs:
+                # In place: the job processes the backup of the input
+                inputFile = job[1] if job[0] in temp_files else job[0]
+                group = groupof.get(inputFile)
+                if group is None:
+                    yield job
+                elif group not in leaders:
+                    leaders[group] = job[0]
+                    dispatched[job[0]] = group
+                    duplicates[job[0]] = []
+                    yield job
+                else:
+                    with lock:
+                        if group in handled:
+                            link(handled[group], job)
+                        else:
+                            duplicates[leaders[group]].append(job)
+
+        def deduphandle(item):
+            with lock:
+                handle(item)
+
+                result = item[0]
+                group = dispatched.pop(result[0], None)
+                if group is None:
+                    return
+                handled[group] = result
+                for job in duplicates.pop(result[0]):
+                    link(result, job)
+
+        return (dedupjobs(), deduphandle)
+
+
+    def __execute(self, jobs, handle):
+        if self.isstagedprocess():
+            self.__runstages(jobs, handle)
+            return
+
+        batch = self.isbatchprocess() and self.executor != "async"
+        if batch:
+            # Jobs are lists of jobs, and results lists of results
+            jobs = iterbatches(jobs, self.batchSize, self.batchWait)
+            filehandle = handle
+
+            def handle(items):
+                for item in items:
+                    filehandle(item)
+
+        try:
+            if self.executor == "process":
+                self.__runprocesses(jobs, handle, batch)
+            elif self.executor == "async":
+                convert_async.run(
+                    jobs,
+                    self.processfile,
+                    self.numberThreads,
+                    handle,
+                    self.initworker,
+                    self.__teardownworker,
+                    self.MAP_THRESHOLD if self.mapInput else None,
+                    self.atomicOutput,
+                    self.checkfile if self.lazyChecks else None,
+                    (
+                        self.retries,
+                        self.retryDelay,
+                        self.isretryable,
+                        self.RETRY_MAX_DELAY
+                    ) if self.retries else None,
+                    self.timeout
+                )
+            else:
+                self.__runthreads(jobs, handle, batch)
+        finally:
+            if batch:
+                # Feeder of the batches stopped (see 'iterbatches')
+                jobs.close()
+
+
+    def __teardownworker(self, context):
+        try:
+            self.teardownworker(context)
+        except Exception as e:
+            self.logger.warning((
+                "Error in worker teardown: {}"
+            ).format(e))
+
+
+    def __handleresult(
+        self,
+        result,
+        temp_files,
+        stale_backups,
+        manifest,
+        journal,
+        work_queue=None
+    ):
+        # Executed in the dispatching thread, as results arrive
+        if self.KEEP_RESULTS:
+            self.results.append(result)
+
+        in_file, out_file, status = result
+        # Signature of the input when dispatched (not in place)
+        signature = self.__signatures.pop(in_file, None)
+        if work_queue:
+            work_queue.complete(
+                self.__leasedfiles.pop(in_file, in_file),
+                status
+            )
+        backup = in_file in temp_files
+        temp_files.discard(in_file)
+
+        if status:
+            # Error
+            self.logger.error((
+                "ERROR converting '{}': {}"
+            ).format(in_file, status))
+            self.__errors = True
+            if journal:
+                journal.failed(in_file, status)
+            return
+
+        # Recorded before deleting the backup
+        # (deletion is completed when resuming if interrupted)
+        if journal:
+            journal.completed(in_file)
+
+        if backup:
+            if self.noBackup:
+                # Deleted at the end of the run
+                stale_backups.append(in_file)
+            else:
+                self.logger.info((
+                    "Backup saved to '{}'"
+                ).format(in_file))
+
+        if manifest:
+            # In place: output replaces the original input
+            manifest.update(
+                out_file if backup else in_file,
+                out_file,
+                signature
+            )
+
+        self.logger.info((
+            "'{}' converted to '{}'"
+        ).format(in_file, out_file))
+
+
+    def __iterjobs(
+        self,
+        plan,
+        temp_files,
+        manifest=None,
+        journal=None,
+        work_queue=None
+    ):
+        completed, backups = self.__resumed or (None, None)
+
+        def skip(inputFile, error=None):
+            # Leased files not dispatched
+            if work_queue:
+                work_queue.complete(inputFile, error)
+
+        for inputFile, outputFile in plan:
+            if self.iscancelled():
+                # Checked before backing up the file
+                # (leased files are leased again once their leases expire)
+                break
+
+            # Backup of a previous lease, and number of leases
+            # (files of the work queue)
+            leasedBackup, leases = self.__leases.pop(inputFile, (None, 0))
+
+            if completed and inputFile in completed:
+                self.logger.info((
+                    "File '{}' already completed => Skipping"
+                ).format(inputFile))
+                self.skipped += 1
+                skip(inputFile)
+                continue
+            if backups and inputFile in backups:
+                # Backup of a completed file
+                skip(inputFile)
+                continue
+
+            self.logger.info("Processing file '{}'".format(inputFile))
+            self.logger.info("Output: {}".format(outputFile))
+
+            # Outputs of changed files are known to be outdated
+            overwrite = False
+            if manifest:
+                status = manifest.status(inputFile, outputFile)
+                if status == Manifest.UP_TO_DATE:
+                    self.logger.info((
+                        "File '{}' unchanged => Skipping"
+                    ).format(inputFile))
+                    self.skipped += 1
+                    skip(inputFile)
+                    continue
+                overwrite = status == Manifest.OUTDATED
+
 
-        if not self.postprocess(success):
-            self.logger.error("Error in post-process!")
-            return False
+            if outputFile == inputFile and self.backupStrategy == "none":
+                self.logger.info((
+                    "Overwriting file '{}' (no backup)"
+                ).format(inputFile))
+                if journal:
+                    journal.dispatched(inputFile, inputFile, outputFile)
+                yield (inputFile, outputFile, True)
 
-        return success
+            elif outputFile == inputFile:
+                self.logger.info("Overwriting file '{}'" .format(inputFile))
 
+                if leasedBackup and os.path.isfile(leasedBackup):
+                    # Leased again: the original contents are in the backup
+                    # of the previous lease (the file might already be
+                    # replaced by its output)
+                    self.logger.info((
+                        "Using backup '{}' of previous lease"
+                    ).format(leasedBackup))
+                    backupFile = leasedBackup
+                    if journal:
+                        journal.dispatched(
+                            inputFile,
+                            backupFile,
+                            outputFile,
+                            backupFile
+                        )
+                        journal.backedup(backupFile)
+                else:
+                    try:
+                        backupFile = self.__backup(
+                            inputFile,
+                            outputFile,
+                            journal,
+                            work_queue
+                        )
+                    except OSError as e:
+                        self.logger.error((
+                            "ERROR backing up '{}': {} => Skipping"
+                        ).format(inputFile, e))
+                        self.__errors = True
+                        skip(inputFile, str(e))
+                        continue
+                temp_files.add(backupFile)
+                if work_queue:
+                    self.__leasedfiles[backupFile] = inputFile
+                yield (backupFile, outputFile, True)
 
-    def process(self):
-        self.logger.info((
-            "Files to process:\n{}"
-        ).format("\n".join(self.inputFiles)))
+            else:
+                if leases > 1:
+                    # Leased again: the output might have been committed
+                    # by the worker of the previous lease
+                    overwrite = True
+                if manifest:
+                    # Files changed while processed are outdated
+                    # on the next run
+                    try:
+                        self.__signatures[inputFile] = manifest.signature(
+                            inputFile,
+                            False
+                        )
+                    except OSError:
+                        pass
+                if journal:
+                    journal.dispatched(inputFile, inputFile, outputFile)
+                yield (inputFile, outputFile, overwrite)
+
+
+    def __backup(
+        self,
+        inputFile,
+        outputFile=None,
+        journal=None,
+        work_queue=None
+    ):
+        """Back up a file to be processed in place.
 
-        temp_files = []
+        The backup is recorded in the journal and in the work queue,
+        if any, before being made (and in the journal once complete):
+        a backup made before an interruption is restored when resuming,
+        or processed by the worker leasing the file again.
+        Files of the work queue stay in place until their outputs are
+        committed (their backups are hard links or copies), so that
+        the files of a dead worker can be leased again.
 
-        in_queue = queue.Queue()
-        out_queue = queue.Queue()
+        Returns:
+        str: Path of the backup file
 
-        # Spawn a pool of threads and pass queue instances
-        for i in range(self.numberThreads):
-            thread = ConvertThread(in_queue, out_queue)
-            thread.setDaemon(True)
-            thread.start()
+        Raises:
+        OSError
+            If the backup cannot be made
+        """
+        backupFile = inputFile + self.__backupsuffix
+        strategy = self.backupStrategy
+        # The file stays in place if its output is committed atomically
+        keep = self.atomicOutput
+        if work_queue:
+            keep = True
+            if self.atomicOutput and hasattr(os, "link"):
+                strategy = "hardlink"
+            else:
+                # Output written to the file itself
+                strategy = "copy"
+
+        # Other names only tried if a backup of the run already exists
+        index = 0
+        while True:
+            backupPath = backupFile + (str(index) if index else "")
+            if journal:
+                journal.dispatched(
+                    inputFile,
+                    backupPath,
+                    outputFile,
+                    backupPath
+                )
+            if work_queue:
+                work_queue.setbackup(inputFile, backupPath)
+            try:
+                commit.makebackup(
+                    inputFile,
+                    backupPath,
+                    strategy,
+                    keep
+                )
+                if journal:
+                    journal.backedup(backupPath)
+                return backupPath
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                self.logger.warning((
+                    "WARNING: File '{}' already exists!"
+                ).format(backupPath))
+            index += 1
+
+
+    def getoutputfile(self, inputFile):
+        """Get the output file of an input file.
+
+        The output directory is not created (see 'makeoutputdir').
 
+        Parameters:
+        inputFile: str
+            Path of the input file
 
-        errors = False
-        for inputFile in self.inputFiles:
-            self.logger.info("Processing file '{}'".format(inputFile))
+        Returns:
+        str: Path of the output file
+        """
 
-            #filePath, sep, fileName = inputFile.rpartition("/")
-            filePath = os.path.dirname(inputFile)
-            fileName = os.path.basename(inputFile)
+        #filePath, sep, fileName = inputFile.rpartition("/")
+        filePath = os.path.dirname(inputFile)
+        fileName = os.path.basename(inputFile)
 
+        # Resolved once per input directory
+        outputDir = self.__outputdirs.get(filePath)
+        if outputDir is None:
             if "<IN_PLACE>" in self.outputDir:
                 # Default output directory
                 outputDir = self.outputDir.replace("<IN_PLACE>", filePath)
@@ -370,102 +2384,536 @@ class AbstractFileBatch(object):
                 else:
                     outputDir = self.outputDir
 
-            if not os.path.isdir(outputDir):
-                self.logger.info((
-                    "Creating output directory '{}'"
-                ).format(outputDir))
-                os.makedirs(outputDir)
-
-            # Change extension of fileName if required
-            if self.outputExtension:
-                #last_point_index = fileName.rfind(".")
-                #fileName = fileName[:last_point_index + 1] + self.outputExtension
-                extension = os.path.splitext(fileName)[1]
-                if extension:
-                    fileName = "{}.{}".format(fileName[:-len(extension)], self.outputExtension)
-                else:
-                    fileName += ".{}".format(self.outputExtension)
-
-            # Add suffix to fileName if required
-            if self.outputSuffix:
-                #baseName = fileName.rpartition(".")[0]
-                #if baseName:
-                #    fileName = fileName.replace(baseName, baseName + self.outputSuffix)
-                #else:
-                #    fileName += self.outputSuffix
-                baseName, extension = os.path.splitext(fileName)
-                if extension:
-                    fileName = baseName + self.outputSuffix + extension
-                else:
-                    fileName += self.outputSuffix
+            self.__outputdirs[filePath] = outputDir
 
-            outputFile = os.path.join(outputDir, fileName)
-            self.logger.info("Output: {}".format(outputFile))
+        # Change extension of fileName if required
+        if self.outputExtension:
+            #last_point_index = fileName.rfind(".")
+            #fileName = fileName[:last_point_index + 1] + self.outputExtension
+            extension = os.path.splitext(fileName)[1]
+            if extension:
+                fileName = "{}.{}".format(fileName[:-len(extension)], self.outputExtension)
+            else:
+                fileName += ".{}".format(self.outputExtension)
+
+        # Add suffix to fileName if required
+        if self.outputSuffix:
+            #baseName = fileName.rpartition(".")[0]
+            #if baseName:
+            #    fileName = fileName.replace(baseName, baseName + self.outputSuffix)
+            #else:
+            #    fileName += self.outputSuffix
+            baseName, extension = os.path.splitext(fileName)
+            if extension:
+                fileName = baseName + self.outputSuffix + extension
+            else:
+                fileName += self.outputSuffix
 
+        return os.path.join(outputDir, fileName)
 
-            if outputFile == inputFile:
-                self.logger.info("Overwriting file '{}'" .format(inputFile))
 
-                backupFile = inputFile + ".bak"
+    def makeoutputdir(self, outputDir):
+        """Create an output directory if it doesn't exist.
+
+        Each directory is only checked once.
+
+        Parameters:
+        outputDir: str
+            Path of the directory
+        """
+        if outputDir in self.__createddirs:
+            return
+
+        if not os.path.isdir(outputDir):
+            self.logger.info((
+                "Creating output directory '{}'"
+            ).format(outputDir))
+            os.makedirs(outputDir)
+        self.__createddirs.add(outputDir)
+
+
+    def __iterplan(self, work_queue=None):
+        if work_queue:
+            for inputFile, outputFile in self.__iterqueue(work_queue):
+                yield (inputFile, outputFile)
+            return
+
+        if self.plan is None:
+            # Streaming mode
+            for inputFile in self.__iterinputfiles():
+                outputFile = self.getoutputfile(inputFile)
+                self.makeoutputdir(os.path.dirname(outputFile))
+                yield (inputFile, outputFile)
+            return
+
+        plan = self.plan
+        if self.schedule != "input":
+            plan = self.__scheduleplan(plan)
+
+        for inputFile, outputFile in plan:
+            # Created as the files are dispatched
+            self.makeoutputdir(os.path.dirname(outputFile))
+            yield (inputFile, outputFile)
+
+
+    def __iterqueue(self, work_queue):
+        # Leases are renewed while files are processed
+        work_queue.startheartbeat()
+
+        while True:
+            # Few files leased at a time, for other workers to get some
+            jobs = work_queue.lease(self.numberThreads)
+            if not jobs:
+                return
+
+            for inputFile, outputFile, backup, leases in jobs:
+                # Used when the file is dispatched
+                self.__leases[inputFile] = (backup, leases)
+                # Queue populated by another process:
+                # directories might not exist
+                self.makeoutputdir(os.path.dirname(outputFile))
+                yield (inputFile, outputFile)
+
+
+    def __iterinputlist(self):
+        # Same checks as 'inputFiles', made as the files are read
+        for inputFile in iterpaths(self.inputList):
+            if not os.path.isabs(inputFile):
+                inputFile = os.path.join(self.inputDir, inputFile)
+
+            if not self.__inshard(inputFile):
+                continue
+
+            try:
+                self.__checkextension(inputFile)
+                if not self.lazyChecks:
+                    self.__checkfile(inputFile)
+                if not self.__isselected(inputFile):
+                    continue
+            except (OSError, ValueError) as e:
+                self.logger.info(str(e) + " => Ignoring")
+                continue
+
+            yield inputFile
+
+
+    def __scheduleplan(self, plan):
+        costs = {}
+        for inputFile, outputFile in plan:
+            try:
+                costs[inputFile] = self.estimatecost(inputFile)
+            except OSError as e:
+                self.logger.info(str(e) + " => Dispatching last")
+                costs[inputFile] = None
+
+        largest = self.schedule == "largest"
+        self.logger.info((
+            "Dispatching {} file(s) {} first"
+        ).format(len(plan), self.schedule))
+
+        # Stable: files of equal cost stay in discovery order
+        # (files of unknown cost are dispatched last)
+        return sorted(
+            plan,
+            key=lambda pair: (
+                costs[pair[0]] is None,
+                -(costs[pair[0]] or 0) if largest else costs[pair[0]]
+            )
+        )
+
+
+    def __iterinputfiles(self):
+        if self.inputFiles is not None:
+            for inputFile in self.inputFiles:
+                yield inputFile
+            return
+
+        if self.inputList:
+            for inputFile in self.__iterinputlist():
+                yield inputFile
+            return
+
+        # Streaming mode: files are checked as they are discovered
+        # (type and selection are already checked by 'iterfiles')
+        for inputFile in self.iterfiles(
+            self.inputDir,
+            recursive=self.subDir,
+            file_filter=self.__filter
+        ):
+            inputFile = os.path.join(self.inputDir, inputFile)
+
+            if not self.__inshard(inputFile):
+                continue
+
+            if self.lazyChecks:
+                # Checked in the workers
+                yield inputFile
+                continue
+
+            try:
+                self.checkfile(inputFile)
+            except OSError as e:
+                self.logger.info(str(e) + " => Ignoring")
+                continue
+
+            yield inputFile
+
+
+    def __dispatch(
+        self,
+        jobs,
+        submit,
+        out_queue,
+        handle,
+        tick=None,
+        number_workers=None
+    ):
+        """Submit jobs while handling results as they arrive.
+
+        At most 'maxPending' jobs are in flight (submitted but not handled):
+        the jobs generator is blocked until workers catch up.
+        If specified, 'tick' is called regularly (at least every second).
+        """
+        if number_workers is None:
+            number_workers = self.maxThreads if tick else self.numberThreads
+        max_pending = self.maxPending or 4 * number_workers
+
+        def get():
+            if not tick:
+                return out_queue.get()
+            while True:
                 try:
-                    os.rename(inputFile, backupFile)
-                except Exception as e:
-                    self.logger.warning((
-                        "WARNING: File '{}' already exists!"
-                    ).format(backupFile))
-                    index = 1
-                    while True:
-                        try:
-                            os.rename(inputFile, backupFile + str(index))
-                            backupFile += str(index)
-                            break
-                        except Exception as e:
-                            self.logger.warning((
-                                "WARNING: File '{}' already exists!"
-                            ).format(backupFile + str(index)))
-                        index += 1
-
-                in_queue.put((self, self.processfile, backupFile, outputFile, True))
-                temp_files.append(backupFile)
+                    return out_queue.get(timeout=1.0)
+                except queue.Empty:
+                    tick()
 
-            else:
-                in_queue.put((self, self.processfile, inputFile, outputFile, False))
+        pending = 0
+        for job in jobs:
+            while pending >= max_pending:
+                handle(get())
+                pending -= 1
+
+            submit(job)
+            pending += 1
+
+            # Handle already available results
+            while True:
+                try:
+                    result = out_queue.get_nowait()
+                except queue.Empty:
+                    break
+                handle(result)
+                pending -= 1
+
+            if tick:
+                tick()
+
+        while pending:
+            handle(get())
+            pending -= 1
+
+            if tick:
+                tick()
+
+
+    def __runthreads(self, jobs, handle, batch=False):
+        pool = self.__threadpool
+        if pool is None:
+            # Files being processed (timeouts and speculative execution)
+            tracker = None
+            if self.timeout or self.speculate:
+                tracker = Tracker()
+            pool = ThreadPool(
+                BatchConvertThread if batch else ConvertThread,
+                tracker
+            )
+            if self.__persistent:
+                # Reused by the next runs (see 'open')
+                self.__threadpool = pool
+        elif pool.tracker is not None:
+            pool.tracker.reset()
+        in_queue = pool.in_queue
+        out_queue = pool.out_queue
+        tracker = pool.tracker
+
+        ticks = []
+        if self.adaptive:
+            controller = ConcurrencyController(
+                self.minThreads,
+                self.maxThreads
+            )
+            pool.resize(controller.concurrency)
 
+            def adaptivetick():
+                if pool.size != pool.target:
+                    # Threads stopping after their current jobs
+                    controller.restart()
+                    return
 
-        in_queue.join()
+                concurrency = controller.update(in_queue.qsize())
+                if concurrency == pool.target:
+                    return
 
-        self.results = []
-        for i in range(out_queue.qsize()):
-            self.results.append(out_queue.get())
+                self.logger.info((
+                    "Adaptive mode: {} => {} threads"
+                ).format(pool.target, concurrency))
+                pool.resize(concurrency)
 
+            def adaptivehandle(item):
+                controller.completed()
+                handle(item)
 
-        for result in self.results:
-            in_file, out_file, status = result
-            if status:
-                # Error
-                self.logger.error((
-                    "ERROR converting '{}': {}"
-                ).format(in_file, status))
-                errors = True
+            ticks.append(adaptivetick)
 
+        else:
+            pool.resize(self.numberThreads)
+
+        def expire():
+            for thread, job, start, report in tracker.expire(self.timeout):
+                self.logger.warning((
+                    "'{}' timed out => Abandoning thread '{}'"
+                ).format(
+                    job[2] if not batch else [item[0] for item in job[2]],
+                    thread.name
+                ))
+                if report:
+                    out_queue.put(self.__timeoutresults(
+                        job,
+                        start,
+                        thread.name,
+                        batch
+                    ))
+                # Hung threads cannot be stopped: replaced
+                pool.replace(thread)
+
+        # Set once all the jobs are submitted
+        submitted = [False]
+
+        def speculate():
+            if not submitted[0]:
+                return
+            for job in tracker.stragglers(
+                self.SPECULATE_FACTOR,
+                self.SPECULATE_MIN_FILES,
+                pool.size
+            ):
+                self.logger.info((
+                    "'{}' straggling => Processing a copy"
+                ).format(job[2]))
+                # Overwriting: the first copy might commit its output
+                in_queue.put(job[:4] + (True, time.time()))
+
+        if self.timeout:
+            ticks.append(expire)
+        if self.speculate:
+            ticks.append(speculate)
+
+        tick = None
+        if ticks:
+            def tick():
+                for function in ticks:
+                    function()
+
+        def iterjobs():
+            for job in jobs:
+                yield job
+            submitted[0] = True
+
+        def submit(job):
+            if batch:
+                in_queue.put((self, self.processbatch, job, time.time()))
+                return
+
+            file_in, file_out, overwrite = job
+            in_queue.put((
+                self,
+                self.processfile,
+                file_in,
+                file_out,
+                overwrite,
+                time.time()
+            ))
+
+        aborted = True
+        try:
+            if not self.adaptive:
+                self.__dispatch(
+                    iterjobs(),
+                    submit,
+                    out_queue,
+                    handle,
+                    tick,
+                    number_workers=self.numberThreads
+                )
             else:
-                if in_file in temp_files:
-                    if self.noBackup:
-                        self.logger.warning((
-                            "Deleting file '{}'"
-                        ).format(in_file))
-                        os.remove(in_file)
-                    else:
-                        self.logger.info((
-                            "Backup saved to '{}'"
-                        ).format(in_file))
-
+                self.__dispatch(
+                    iterjobs(),
+                    submit,
+                    out_queue,
+                    adaptivehandle,
+                    tick
+                )
+
+                best_rate, best_concurrency = controller.best
                 self.logger.info((
-                    "'{}' converted to '{}'"
-                ).format(in_file, out_file))
+                    "Adaptive mode: converged on {} threads"
+                    " (best throughput: {} threads, {:.1f} files/s)"
+                ).format(pool.size, best_concurrency, best_rate))
+                self.numberThreads = best_concurrency
+            aborted = False
+
+        finally:
+            if aborted or pool is not self.__threadpool:
+                # Drain the pool (not reused if aborted: results of its
+                # files in flight would be handled by the next run)
+                pool.resize(0)
+                if pool is self.__threadpool:
+                    self.__threadpool = None
+
+        # Slower copies of files: not waited for
+        # (their outputs are discarded in 'atomicOutput' mode)
+        if self.speculate:
+            tracker.release()
+
+        # Wait for the workers teardown
+        if pool is not self.__threadpool:
+            pool.join(expire if self.timeout else None)
+
+
+    def __timeoutresults(self, job, start, worker, batch=False):
+        # Results of a timed out job, as returned by the workers
+        error = TIMEOUT_ERROR.format(self.timeout)
+        items = []
+        for file_job in (job[2] if batch else [job[2:5]]):
+            result = (file_job[0], file_job[1], error)
+            items.append((result, filemetrics(
+                result,
+                job[-1],
+                start,
+                time.time(),
+                None,
+                worker
+            )))
+        return items if batch else items[0]
+
+
+    def __runprocesses(self, jobs, handle, batch=False):
+        out_queue = queue.Queue()
+
+        pool = self.__processpool
+        if pool is None:
+            pool = ProcessPool(self.numberThreads, self, bool(self.timeout))
+            if self.__persistent:
+                # Reused by the next runs (see 'open')
+                self.__processpool = pool
+
+        def expired(item):
+            self.logger.warning((
+                "'{}' timed out => Restarting worker process"
+            ).format(
+                item[0][0] if not batch
+                else [result[0] for result, metrics in item]
+            ))
+            out_queue.put(item)
+        pool.onexpired = expired
+
+        def submit(job):
+            kwargs = {}
+            if sys.version_info.major == 3:
+                # Errors not caught by 'convertfile' (eg: pickling errors)
+                def error_callback(e):
+                    items = []
+                    for file_job in (job if batch else [job]):
+                        result = (file_job[0], file_job[1], str(e))
+                        items.append(
+                            (result, filemetrics(result, 0, 0, 0, None, None))
+                        )
+                    out_queue.put(items if batch else items[0])
+                kwargs["error_callback"] = error_callback
+
+            if batch:
+                pool.apply_async(
+                    convert_process.convertmany,
+                    ((job, time.time()),),
+                    callback=out_queue.put,
+                    **kwargs
+                )
+                return
+
+            pool.apply_async(
+                convert_process.convert,
+                (job + (time.time(),),),
+                callback=out_queue.put,
+                **kwargs
+            )
+
+        aborted = True
+        try:
+            self.__dispatch(jobs, submit, out_queue, handle)
+            aborted = False
+        finally:
+            pool.onexpired = None
+            if aborted or pool is not self.__processpool:
+                # Not reused if aborted (tasks in flight)
+                pool.close(terminate=aborted)
+                if pool is self.__processpool:
+                    self.__processpool = None
+
+
+    def __runstages(self, jobs, handle):
+        out_queue = queue.Queue()
+
+        pool = None
+        if self.executor == "process":
+            # Transforms in processes, reads and writes in threads
+            pool = multiprocessing.Pool(
+                self.numberThreads,
+                initializer=convert_process.initworker,
+                initargs=(self,)
+            )
 
+        def writefile(file_in, file_out, data):
+            self.writefile(data, file_out)
+        write = writefile
+        if self.atomicOutput:
+            write = commit.withcommit(writefile)
+
+        pipeline = convert_staged.Pipeline(
+            self.readfile,
+            self.transform,
+            write,
+            out_queue,
+            self.readThreads,
+            self.numberThreads,
+            self.writeThreads,
+            pool,
+            self.initworker,
+            self.__teardownworker,
+            self.checkfile if self.lazyChecks else None,
+            (lambda process: withretries(self, process))
+            if self.retries else None
+        )
 
-        return not errors
+        def submit(job):
+            pipeline.submit(*job)
+
+        try:
+            self.__dispatch(
+                jobs,
+                submit,
+                out_queue,
+                handle,
+                number_workers=(
+                    self.readThreads
+                    + self.numberThreads
+                    + self.writeThreads
+                )
+            )
+        except BaseException:
+            # Files in flight not waited for
+            pipeline.terminate()
+            raise
+        pipeline.close()
 
 
 
@@ -476,7 +2924,9 @@ class AbstractFileBatch(object):
         starting_path,
         extensions=None,
         recursive=True,
-        ignored_subdirectories=None
+        ignored_subdirectories=None,
+        file_filter=None,
+        _relative_dir=""
     ):
         """Get the list of files contained in a directory.
 
@@ -492,7 +2942,10 @@ class AbstractFileBatch(object):
         recursive: bool, optional
             Look in subdirectories (default: True)
         ignored_subdirectories: list of str, optional
-            Subdirectories to ignore (default: None)
+            Globs of subdirectories to ignore (default: None)
+        file_filter: FileFilter, optional
+            Selection rules, replacing 'extensions' and
+            'ignored_subdirectories' (default: None)
 
         Returns:
         list of str: Found files
@@ -501,20 +2954,31 @@ class AbstractFileBatch(object):
         if not os.path.isdir(starting_path):
             return []
 
+        if file_filter is None:
+            file_filter = FileFilter(
+                extensions=extensions,
+                ignored_dirs=ignored_subdirectories
+            )
+
         # Get input files
         files = []
         for item in os.listdir(starting_path):
             full_path = os.path.join(starting_path, item)
+            relative_path = os.path.join(_relative_dir, item)
 
             if os.path.isfile(full_path):
-                if extensions:
-                    # Check if file of 1 of the specified file extensions
-                    for extension in extensions:
-                        file_extension = os.path.splitext(item)[1]
-                        if file_extension.lower() == "." + extension.lower():
-                            break
-                    else:
-                        continue
+                if not file_filter.matchname(relative_path):
+                    continue
+
+                if commit.istemp(item):
+                    # Output of an interrupted commit
+                    continue
+
+                if (
+                    file_filter.needsstat
+                    and not file_filter.matchstat(os.stat(full_path))
+                ):
+                    continue
 
                 # Keep file
                 #files.append(full_path)
@@ -523,17 +2987,15 @@ class AbstractFileBatch(object):
             elif os.path.isdir(full_path):
                 if recursive:
                     # Skipping specified subdirectories
-                    if (
-                        ignored_subdirectories
-                        and item in ignored_subdirectories
-                    ):
+                    # (before looking into them)
+                    if not file_filter.matchdir(relative_path):
                         continue
 
                     sub_files = cls.getfiles(
                         full_path,
-                        extensions,
-                        recursive,
-                        ignored_subdirectories
+                        recursive=recursive,
+                        file_filter=file_filter,
+                        _relative_dir=relative_path
                     )
                     #files += sub_files
                     for sub_file in sub_files:
@@ -542,6 +3004,171 @@ class AbstractFileBatch(object):
         return files
 
 
+    def getsummary(self):
+        """Get the metrics summary of the last run.
+
+        Returns:
+        dict: Summary, with:
+            - files, errors: numbers of processed and failed files
+            - elapsed: run time (s)
+            - throughput: processed files per second
+            - input_bytes, output_bytes, input_bytes_per_second
+            - cpu_time: total CPU time spent in 'processfile' (s)
+            - latency, queue_wait: per file processing and waiting times
+              (mean, max and percentiles)
+            - workers: files, busy time and utilization of each worker
+            - slowest: slowest files ('SLOWEST_FILES' at most)
+        """
+        return self.metrics.summary()
+
+
+    def iscoroutineprocess(self):
+        """Check if 'processfile' is a coroutine function.
+
+        Returns:
+        bool: True if 'processfile' is defined with 'async def'
+        """
+        return (
+            convert_async is not None
+            and inspect.iscoroutinefunction(self.processfile)
+        )
+
+
+    def isstagedprocess(self):
+        """Check if 'transform' is overridden.
+
+        Returns:
+        bool: True if files are read, transformed and written by
+            separate workers
+        """
+        method = type(self).transform
+        base = AbstractFileBatch.transform
+        # Unbound methods (Python 2)
+        return (
+            getattr(method, "__func__", method)
+            is not getattr(base, "__func__", base)
+        )
+
+
+    def isbatchprocess(self):
+        """Check if 'processbatch' is overridden.
+
+        Returns:
+        bool: True if files are processed in batches
+        """
+        method = type(self).processbatch
+        base = AbstractFileBatch.processbatch
+        # Unbound methods (Python 2)
+        return (
+            getattr(method, "__func__", method)
+            is not getattr(base, "__func__", base)
+        )
+
+
+    @classmethod
+    def iterfiles(
+        cls,
+        starting_path,
+        extensions=None,
+        recursive=True,
+        ignored_subdirectories=None,
+        file_filter=None
+    ):
+        """Iterate over the files contained in a directory.
+
+        Generator version of 'getfiles', yielding the files as they are
+        found. Entry types are taken from 'os.scandir' (no additional
+        'stat' call per entry when the platform provides them).
+        Each directory is listed before its files are yielded, so files
+        created in it while iterating (outputs, backups) are not returned.
+
+        Parameters:
+        starting_path: str
+            Directory to look into
+        extensions: list of str, optional
+            List of file extensions (default: None)
+        recursive: bool, optional
+            Look in subdirectories (default: True)
+        ignored_subdirectories: list of str, optional
+            Globs of subdirectories to ignore (default: None)
+        file_filter: FileFilter, optional
+            Selection rules, replacing 'extensions' and
+            'ignored_subdirectories' (default: None)
+
+        Yields:
+        str: Found file, relative to 'starting_path'
+        """
+
+        if file_filter is None:
+            file_filter = FileFilter(
+                extensions=extensions,
+                ignored_dirs=ignored_subdirectories
+            )
+
+        if scandir is None:
+            for item in cls.getfiles(
+                starting_path,
+                recursive=recursive,
+                file_filter=file_filter
+            ):
+                yield item
+            return
+
+        if not os.path.isdir(starting_path):
+            return
+
+        # Stack of (relative path, full path) directories to visit
+        directories = [("", starting_path)]
+        while directories:
+            relative_dir, full_dir = directories.pop()
+
+            try:
+                entries = list(scandir(full_dir))
+            except OSError as e:
+                cls.__logwarning("{} => Ignoring".format(e))
+                continue
+
+            sub_directories = []
+            for entry in entries:
+                try:
+                    relative_path = os.path.join(relative_dir, entry.name)
+                    if entry.is_file():
+                        if not file_filter.matchname(relative_path):
+                            continue
+
+                        if commit.istemp(entry.name):
+                            # Output of an interrupted commit
+                            continue
+
+                        if (
+                            file_filter.needsstat
+                            and not file_filter.matchstat(entry.stat())
+                        ):
+                            continue
+
+                        # Keep file
+                        yield relative_path
+
+                    elif recursive and entry.is_dir():
+                        # Skipping specified subdirectories
+                        # (before looking into them)
+                        if not file_filter.matchdir(relative_path):
+                            continue
+
+                        sub_directories.append((relative_path, entry.path))
+
+                except OSError as e:
+                    cls.__logwarning("{} => Ignoring".format(e))
+
+            # Reversed to visit subdirectories in listing order
+            directories.extend(reversed(sub_directories))
+
+
+    @classmethod
+    def __logwarning(cls, message):
+        logging.getLogger(cls.__name__).warning(message)
+
+
     @staticmethod
     def checkpath(path, check_existence=True):
         """Check the validity of a path.
@@ -573,14 +3200,12 @@ class AbstractFileBatch(object):
             )
 
 
-    def __checkfile(self, file_path, extensions=None):
+    def __checkfile(self, file_path):
         """Check the validity of a file.
 
         Parameters:
         file_path: str
             Full path of the file
-        extensions: list of str, optional
-            List of file extensions (default: None)
 
         Raises:
         FileNotFoundError
@@ -594,21 +3219,45 @@ class AbstractFileBatch(object):
                 errno.ENOENT, os.strerror(errno.ENOENT), file_path
             )
 
-        if extensions:
-            # Check if file is of 1 of the specified extensions
-            for extension in extensions:
-                file_extension = os.path.splitext(file_path)[1]
-                if file_extension.lower() == "." + extension.lower():
-                    break
-            else:
-                #TODO: type of exception?
-                raise ValueError((
-                    "Invalid extension for '{}' (supported extensions: {})"
-                ).format(file_path, extensions))
-
+        self.__checkextension(file_path)
         self.checkfile(file_path)
 
 
+    def __checkextension(self, file_path):
+        """Check the extension of a file.
+
+        Raises:
+        ValueError
+            If the file extension is not amongst expected ones
+        """
+
+        extensions = self.__filter.extensions
+        if (
+            extensions is not None
+            and os.path.splitext(file_path)[1].lower() not in extensions
+        ):
+            #TODO: type of exception?
+            raise ValueError((
+                "Invalid extension for '{}' (supported extensions: {})"
+            ).format(file_path, self.extensions))
+
+
+    def __isselected(self, file_path):
+        """Check a file not found in the input directory
+        against the selection rules.
+
+        Raises:
+        OSError
+            If the file cannot be accessed (size and time bounds)
+        """
+
+        relative_path = os.path.relpath(file_path, self.inputDir)
+        if relative_path.startswith(os.pardir):
+            # Outside of the input directory
+            relative_path = os.path.abspath(file_path)
+        return self.__filter.match(relative_path, file_path)
+
+
     @staticmethod
     def __splitvalues(values):
         # To handle both ',' and ';'|':' depending on OS
@@ -651,6 +3300,10 @@ class AbstractFileBatch(object):
         The function can be overridden if specific operations/checks
         are desired on the files.
 
+        In 'lazyChecks' mode, the function is called in the workers,
+        with the path of the file being processed (backup file if
+        processed in place), and a failed check is an error of the file.
+
         Parameters:
         file_path: str
             Full path of the file
@@ -661,6 +3314,48 @@ class AbstractFileBatch(object):
         pass
 
 
+    def isretryable(self, error):
+        """Check if a file failing with an error can be retried.
+
+        Used if 'retries' is set. Can be overridden to classify the
+        errors of specific libraries (eg: errors of a busy service).
+        Files can also request a retry by raising 'retry.RetryableError'.
+
+        Parameters:
+        error: Exception
+            Error raised while processing the file
+
+        Returns:
+        bool: True if the file is to process again (default: for
+            'RetryableError', timeouts of sockets, and 'OSError' of
+            transient conditions, eg: locked or busy files, refused
+            connections)
+        """
+        return retry.isretryable(error)
+
+
+    def estimatecost(self, file_path):
+        """Estimate the cost of processing a file.
+
+        Used to order the dispatch of the files with the 'largest' and
+        'smallest' schedules. Returns the size of the file by default.
+        Can be overridden if the processing time is not proportional
+        to the file size.
+
+        Parameters:
+        file_path: str
+            Full path of the file
+
+        Returns:
+        float: Cost of the file (in any unit)
+
+        Raises:
+        OSError
+            If the cost cannot be estimated (the file is dispatched last)
+        """
+        return os.path.getsize(file_path)
+
+
     def preprocess(self):
         """Executed before starting the main process.
 
@@ -702,9 +3397,140 @@ class AbstractFileBatch(object):
         pass
 
 
+    def initworker(self):
+        """Executed once in each worker, before its first file.
+
+        Workers are threads, processes or concurrency slots of the
+        'async' executor, depending on the executor.
+        Can be overridden to load resources reused for all the files
+        of a worker (eg: parsers, compiled templates, connections).
+        If it fails (raises), the files of the worker fail.
+
+        Returns:
+        object: Context of the worker, passed to 'processfile' and
+            'processbatch' if they have a 'context' argument
+        """
+        return None
+
+
+    def teardownworker(self, context):
+        """Executed once in each initialized worker, when it stops.
+
+        Can be overridden to release the resources of the worker.
+
+        Parameters:
+        context: object
+            Context of the worker, as returned by 'initworker'
+        """
+        pass
+
+
     def processfile(self, srcFilePath, destFilePath):
         """Core process executed on each file.
 
-        Must be overridden.
+        Must be overridden, unless 'transform' is (staged execution).
+        Can be overridden by a coroutine ('async def'), in which case
+        files are processed concurrently on an event loop, with at most
+        'numberThreads' files processed at the same time.
+        If the method has a 'context' argument, it is passed the context
+        of the worker (as returned by 'initworker').
+        In 'mapInput' mode, the method must have a 'data' argument, passed
+        a read-only view of the contents of the input file: 'memoryview'
+        of a memory mapping for files of at least 'MAP_THRESHOLD' bytes,
+        else 'bytes'. The view is closed when the method returns
+        (slices still referenced remain valid).
+        """
+        raise NotImplementedError("Method not implemented!")
+
+
+    def processbatch(self, pairs, context=None):
+        """Core process executed on a batch of files.
+
+        Can be overridden instead of 'processfile' to process several
+        files per call (eg: to share a setup cost), in which case it is
+        called with at most 'batchSize' files, waiting at most
+        'batchWait' seconds for a batch to be full.
+        Not used by the 'async' executor.
+
+        Parameters:
+        pairs: list of tuple
+            (srcFilePath, destFilePath) of each file
+        context: object, optional
+            Context of the worker, if the method has this argument
+            (as returned by 'initworker')
+
+        Returns:
+        list: Error of each file (None on success),
+            or None if all files succeeded
+        An exception fails all the files of the batch.
+        """
+        processfile = withcontext(self.processfile, context)
+        errors = []
+        for srcFilePath, destFilePath in pairs:
+            try:
+                processfile(srcFilePath, destFilePath)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+
+    def readfile(self, srcFilePath):
+        """Read an input file (staged execution).
+
+        Used, with 'writefile', if 'transform' is overridden.
+        Called in one of 'readThreads' threads.
+        Can be overridden to parse the file while reading it
+        (eg: images, documents), returning any object 'transform' accepts.
+
+        Parameters:
+        srcFilePath: str
+            Path of the input file
+
+        Returns:
+        object: Data of the file (default: its contents, as bytes)
+        """
+        with open(srcFilePath, "rb") as infile:
+            return infile.read()
+
+
+    def transform(self, data, srcFilePath):
+        """Core process executed on the data of each file (staged execution).
+
+        Can be overridden instead of 'processfile' to separate the I/O
+        from the computation: files are read by 'readThreads' threads
+        ('readfile'), transformed by 'numberThreads' threads or processes
+        ('executor'), and written by 'writeThreads' threads ('writefile'),
+        the stages being connected by bounded queues.
+        With the 'process' executor, the data and the transformed data
+        are pickled to and from the worker processes.
+        If the method has a 'context' argument, it is passed the context
+        of the worker (as returned by 'initworker').
+
+        Parameters:
+        data: object
+            Data of the file, as returned by 'readfile'
+        srcFilePath: str
+            Path of the input file
+
+        Returns:
+        object: Data to write, passed to 'writefile'
         """
         raise NotImplementedError("Method not implemented!")
+
+
+    def writefile(self, data, destFilePath):
+        """Write an output file (staged execution).
+
+        Called in one of 'writeThreads' threads.
+        Can be overridden to serialize the transformed data.
+
+        Parameters:
+        data: object
+            Transformed data, as returned by 'transform'
+        destFilePath: str
+            Path of the output file (temporary file in 'atomicOutput'
+            mode, renamed when written)
+        """
+        with open(destFilePath, "wb") as outfile:
+            outfile.write(data)
@@ -0,0 +1,111 @@
+"""adaptive.py
+
+    Concurrency controller of the adaptive worker pool.
+"""
+
+import time
+
+
+class ConcurrencyController(object):
+    """Hill climbing controller of the number of workers.
+
+        The completion rate is measured over intervals. Concurrency is
+        changed in one direction as long as the rate improves, and the
+        direction is reversed when the rate drops. Concurrency is not
+        increased when no work is waiting (the workers are not the
+        bottleneck).
+    """
+
+    # Minimum duration of a measurement interval (s)
+    INTERVAL = 1.0
+    # Minimum number of completions per worker in an interval
+    MIN_COMPLETIONS = 2
+    # Relative rate change considered significant
+    TOLERANCE = 0.05
+    # Relative concurrency change per step
+    STEP = 0.5
+
+
+    def __init__(self, minimum, maximum):
+        """
+        Parameters:
+        minimum: int
+            Minimum number of workers (initial number)
+        maximum: int
+            Maximum number of workers
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+
+        self.concurrency = self.minimum
+        self.direction = 1
+
+        # Best (rate, concurrency) observed
+        self.best = (0.0, self.concurrency)
+
+        self._previous_rate = None
+        self._start = time.time()
+        self._completed = 0
+
+
+    def restart(self):
+        """Start a new measurement interval.
+
+        Used while the number of workers changes (completions are
+        only measured at the current concurrency).
+        """
+        self._start = time.time()
+        self._completed = 0
+
+
+    def completed(self, count=1):
+        """Record completed files."""
+        self._completed += count
+
+
+    def update(self, backlog):
+        """Re-evaluate the concurrency at the end of an interval.
+
+        Parameters:
+        backlog: int
+            Number of jobs waiting for a worker
+
+        Returns:
+        int: Number of workers to run
+        """
+        elapsed = time.time() - self._start
+        if (
+            elapsed < self.INTERVAL
+            or self._completed < self.MIN_COMPLETIONS * self.concurrency
+            and elapsed < 10 * self.INTERVAL
+        ):
+            return self.concurrency
+
+        rate = self._completed / elapsed
+        self._start = time.time()
+        self._completed = 0
+
+        if rate > self.best[0]:
+            self.best = (rate, self.concurrency)
+
+        previous_rate = self._previous_rate
+        self._previous_rate = rate
+
+        if previous_rate is not None:
+            if rate < previous_rate * (1 - self.TOLERANCE):
+                # Last change was counterproductive
+                self.direction = -self.direction
+            elif rate < previous_rate * (1 + self.TOLERANCE):
+                # No significant change: hold
+                return self.concurrency
+
+        if self.direction > 0 and not backlog:
+            # Workers are waiting for work
+            return self.concurrency
+
+        step = max(1, int(self.concurrency * self.STEP))
+        self.concurrency = min(
+            self.maximum,
+            max(self.minimum, self.concurrency + self.direction * step)
+        )
+        return self.concurrency
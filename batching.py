@@ -0,0 +1,125 @@
+"""batching.py
+
+    Grouping of jobs into batches, for 'processbatch' implementations.
+"""
+
+import sys
+import time
+import threading
+
+if sys.version_info.major == 3:
+    import queue
+else:
+    import Queue as queue
+
+
+# End of jobs
+_END = object()
+
+# Monotonic clock if available (Python 3)
+_now = getattr(time, "monotonic", time.time)
+
+# Interval of the checks of the stop of the consumer by the feeder (s)
+STOP_POLL_INTERVAL = 0.1
+# Maximum wait for the feeder once the consumer stopped (s)
+# (a feeder blocked reading jobs, eg: lists read from pipes, is left)
+JOIN_TIMEOUT = 5.0
+
+
+def iterbatches(jobs, size, wait=None):
+    """Group jobs into batches.
+
+    A batch is yielded when it is full, or when 'wait' seconds have
+    passed since its first job was received (jobs arriving slowly,
+    eg: in streaming mode). Jobs are then pulled from a separate thread
+    (the feeder), stopped and joined when the batches are closed: it
+    stops pulling jobs, and closes 'jobs'.
+
+    Parameters:
+    jobs: iterable
+        Jobs to group
+    size: int
+        Maximum number of jobs per batch
+    wait: float, optional
+        Maximum time (s) a job waits for its batch to be full
+        (default: None, no limit)
+
+    Yields:
+    list: Batch of jobs
+    """
+    size = max(1, size)
+
+    if not wait:
+        batch = []
+        for job in jobs:
+            batch.append(job)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    # Bounded: jobs are not pulled far ahead of dispatching
+    feed = queue.Queue(size)
+    errors = []
+    # Set when the consumer stops
+    stop = threading.Event()
+
+    def put(item):
+        # Not blocked on a full queue once the consumer stopped
+        while not stop.is_set():
+            try:
+                feed.put(item, timeout=STOP_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def pull():
+        try:
+            for job in jobs:
+                if not put(job):
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(_END)
+            close = getattr(jobs, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=pull)
+    thread.daemon = True
+    thread.start()
+
+    try:
+        done = False
+        while not done:
+            job = feed.get()
+            if job is _END:
+                break
+
+            batch = [job]
+            deadline = _now() + wait
+            while len(batch) < size:
+                timeout = deadline - _now()
+                if timeout <= 0:
+                    break
+                try:
+                    job = feed.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if job is _END:
+                    done = True
+                    break
+                batch.append(job)
+
+            yield batch
+
+    finally:
+        stop.set()
+        thread.join(JOIN_TIMEOUT)
+
+    if errors:
+        raise errors[0]
@@ -0,0 +1,92 @@
+"""checks.py
+
+    Checks of input files run in the workers ('lazyChecks' mode).
+"""
+
+import os
+import errno
+
+
+def checkinput(file_path, checkfile):
+    """Check an input file before processing it.
+
+    Parameters:
+    file_path: str
+        Path of the file
+    checkfile: callable
+        Additional check, called as 'checkfile(file_path)'
+
+    Raises:
+    OSError
+        If the file does not exist (or is not a file),
+        or raised by 'checkfile'
+    """
+    if not os.path.isfile(file_path):
+        raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), file_path)
+    checkfile(file_path)
+
+
+def withchecks(process, checkfile):
+    """Check the input file before calling a process function.
+
+    A failed check is reported as the error of the file.
+
+    Parameters:
+    process: callable
+        Function called as 'process(file_in, file_out)'
+    checkfile: callable
+        Additional check, called as 'checkfile(file_in)'
+
+    Returns:
+    callable: Function called as 'function(file_in, file_out)'
+    """
+    def processchecked(file_in, file_out, **kwargs):
+        checkinput(file_in, checkfile)
+        return process(file_in, file_out, **kwargs)
+    return processchecked
+
+
+def withchecksbatch(process, checkfile):
+    """Batch version of 'withchecks'.
+
+    Only the files passing the checks are passed to 'process'.
+
+    Parameters:
+    process: callable
+        Function called as 'process(pairs)', returning the list of errors
+        of the (file_in, file_out) pairs, or None
+    checkfile: callable
+        Additional check, called as 'checkfile(file_in)'
+
+    Returns:
+    callable: Function called as 'function(pairs)'
+    """
+    def processchecked(pairs, **kwargs):
+        errors = [None] * len(pairs)
+        checked = []
+        for index, (file_in, file_out) in enumerate(pairs):
+            try:
+                checkinput(file_in, checkfile)
+                checked.append(index)
+            except Exception as e:
+                errors[index] = str(e)
+
+        if not checked:
+            return errors
+
+        batch_errors = process(
+            [pairs[index] for index in checked],
+            **kwargs
+        )
+        if batch_errors is None:
+            return errors
+
+        batch_errors = list(batch_errors)
+        if len(batch_errors) != len(checked):
+            # Reported as an error of the batch
+            return batch_errors
+
+        for index, error in zip(checked, batch_errors):
+            errors[index] = error
+        return errors
+    return processchecked
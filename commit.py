@@ -0,0 +1,234 @@
+"""commit.py
+
+    Atomic commit of output files, and backups of files processed in place.
+"""
+
+import os
+import uuid
+import errno
+import shutil
+
+
+# Prefix of temporary output files (ignored when looking for input files)
+TEMP_PREFIX = ".~tmp-"
+
+# Ways of backing up files processed in place
+# - rename: the file is renamed to its backup
+# - hardlink: the backup is a hard link to the file
+#   (the file stays in place until its output is committed)
+# - copy: the backup is a copy of the file (the file stays in place)
+# - none: no backup (the file is replaced by its output)
+BACKUP_STRATEGIES = ("rename", "hardlink", "copy", "none")
+
+
+def temppath(file_path):
+    """Get a temporary path to write a file to, before committing it.
+
+    The temporary file is in the same directory (same file system),
+    and has the same extension.
+
+    Parameters:
+    file_path: str
+        Final path of the file
+
+    Returns:
+    str: Temporary path
+    """
+    directory, name = os.path.split(file_path)
+    return os.path.join(
+        directory,
+        "{}{}-{}".format(TEMP_PREFIX, uuid.uuid4().hex[:12], name)
+    )
+
+
+def istemp(file_name):
+    """Check if a file name is a temporary file name."""
+    return os.path.basename(file_name).startswith(TEMP_PREFIX)
+
+
+def replacefile(source, target):
+    """Rename a file, replacing the target if it exists.
+
+    Atomic, except on Windows with Python 2.
+    """
+    if hasattr(os, "replace"):
+        os.replace(source, target)
+        return
+
+    # Python 2
+    if os.name == "nt" and os.path.exists(target):
+        os.remove(target)
+    os.rename(source, target)
+
+
+def discard(file_path):
+    """Remove a file if it exists."""
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+def withcommit(process, guard=None):
+    """Commit the output of a process function atomically.
+
+    The output is written to a temporary path, and renamed to its final
+    path if the process succeeds (else it is removed).
+    Nothing is committed if no output was written.
+
+    Parameters:
+    process: callable
+        Function called as 'process(file_in, file_out)'
+    guard: callable, optional
+        Called as 'guard(commit)' to commit the output, returning False
+        if it was not committed (attempt abandoned): the output is then
+        removed (default: None, always committed)
+
+    Returns:
+    callable: Function called as 'function(file_in, file_out)'
+    """
+    def processcommit(file_in, file_out, **kwargs):
+        temp = temppath(file_out)
+        try:
+            result = process(file_in, temp, **kwargs)
+        except Exception:
+            discard(temp)
+            raise
+
+        if os.path.exists(temp):
+            commitguarded(lambda: replacefile(temp, file_out), guard, [temp])
+        return result
+    return processcommit
+
+
+def commitguarded(function, guard, temps):
+    # Remove the temporary outputs if not committed
+    if guard is None:
+        function()
+    elif not guard(function):
+        for temp in temps:
+            discard(temp)
+
+
+def withcommitbatch(process, guard=None):
+    """Batch version of 'withcommit'.
+
+    Parameters:
+    process: callable
+        Function called as 'process(pairs)', returning the list of errors
+        of the (file_in, file_out) pairs, or None
+    guard: callable, optional
+        Called as 'guard(commit)' to commit the outputs (see 'withcommit')
+
+    Returns:
+    callable: Function called as 'function(pairs)'
+    """
+    def processcommit(pairs, **kwargs):
+        temps = [temppath(file_out) for file_in, file_out in pairs]
+        try:
+            errors = process(
+                [
+                    (file_in, temp)
+                    for (file_in, file_out), temp in zip(pairs, temps)
+                ],
+                **kwargs
+            )
+        except Exception:
+            for temp in temps:
+                discard(temp)
+            raise
+
+        errors = [None] * len(pairs) if errors is None else list(errors)
+        if len(errors) != len(pairs):
+            # Reported as an error of the batch
+            for temp in temps:
+                discard(temp)
+            return errors
+
+        def commitall():
+            for index, (file_in, file_out) in enumerate(pairs):
+                temp = temps[index]
+                if errors[index]:
+                    discard(temp)
+                    continue
+                try:
+                    if os.path.exists(temp):
+                        replacefile(temp, file_out)
+                except OSError as e:
+                    discard(temp)
+                    errors[index] = str(e)
+
+        commitguarded(commitall, guard, temps)
+        return errors
+    return processcommit
+
+
+def makebackup(file_path, backup_path, strategy="rename", keep=False):
+    """Back up a file to be processed in place.
+
+    Parameters:
+    file_path: str
+        Path of the file
+    backup_path: str
+        Path of the backup
+    strategy: str, optional
+        'rename', 'hardlink' or 'copy' (default: 'rename')
+    keep: bool, optional
+        Keep the file in place ('hardlink' strategy, requires the output
+        to be committed atomically) (default: False, always kept by
+        'copy')
+
+    Raises:
+    OSError
+        If the backup cannot be made
+        (eg: backup already existing, except for 'rename' on POSIX)
+    """
+    if strategy == "copy":
+        # Copied to a temporary path: the backup only exists once complete
+        temp = temppath(backup_path)
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        try:
+            with os.fdopen(fd, "wb") as backup, open(file_path, "rb") as f:
+                shutil.copyfileobj(f, backup)
+                backup.flush()
+                os.fsync(backup.fileno())
+            shutil.copystat(file_path, temp)
+            if hasattr(os, "link"):
+                # Fails if the backup exists
+                os.link(temp, backup_path)
+            elif os.path.exists(backup_path):
+                raise OSError(errno.EEXIST, "File exists", backup_path)
+            else:
+                os.rename(temp, backup_path)
+        finally:
+            discard(temp)
+        return
+
+    if strategy == "hardlink" and hasattr(os, "link"):
+        # Fails if the backup exists
+        os.link(file_path, backup_path)
+        if not keep:
+            os.remove(file_path)
+        return
+
+    os.rename(file_path, backup_path)
+
+
+def removefiles(file_paths):
+    """Remove files.
+
+    Parameters:
+    file_paths: iterable of str
+        Paths of the files
+
+    Returns:
+    list of OSError: Errors of the files that could not be removed
+    """
+    errors = []
+    for file_path in file_paths:
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            if os.path.exists(file_path):
+                errors.append(e)
+    return errors
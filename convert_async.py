@@ -0,0 +1,259 @@
+"""convert_async.py
+
+    'async' execution backend, for coroutine 'processfile' implementations.
+    (Python 3 only)
+"""
+
+import os
+import time
+import asyncio
+
+from metrics import filemetrics
+from convert_thread import withcontext, failing
+from inputdata import openinput
+from commit import temppath, replacefile, discard
+from checks import checkinput
+from retry import backoffdelay
+from timeouts import TIMEOUT_ERROR
+
+
+async def convertfile(process, file_in, file_out, overwrite):
+    """Coroutine version of 'convert_thread.convertfile'."""
+
+    error = None
+    try:
+        if overwrite or not os.path.isfile(file_out):
+            await process(file_in, file_out)
+
+        else:
+            error = (
+                "File not converted:"
+                " file already exists and overwrite is set to False."
+            )
+
+    except Exception as e:
+        error = str(e)
+
+    return (file_in, file_out, error)
+
+
+def withinput(process, threshold=0):
+    """Coroutine version of 'inputdata.withinput'."""
+
+    async def processinput(file_in, file_out, **kwargs):
+        with openinput(file_in, threshold) as data:
+            return await process(file_in, file_out, data=data, **kwargs)
+    return processinput
+
+
+def withcommit(process):
+    """Coroutine version of 'commit.withcommit'."""
+
+    async def processcommit(file_in, file_out, **kwargs):
+        temp = temppath(file_out)
+        try:
+            result = await process(file_in, temp, **kwargs)
+        except BaseException:
+            # Including cancellations (timeouts)
+            discard(temp)
+            raise
+
+        if os.path.exists(temp):
+            replacefile(temp, file_out)
+        return result
+    return processcommit
+
+
+def withretry(process, retries, delay, classify, max_delay=60.0):
+    """Coroutine version of 'retry.withretry'."""
+
+    async def processretried(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await process(*args, **kwargs)
+            except Exception as e:
+                if attempt >= retries or not classify(e):
+                    raise
+                attempt += 1
+                await asyncio.sleep(backoffdelay(attempt, delay, max_delay))
+    return processretried
+
+
+def withchecks(process, checkfile):
+    """Coroutine version of 'checks.withchecks'."""
+
+    async def processchecked(file_in, file_out, **kwargs):
+        checkinput(file_in, checkfile)
+        return await process(file_in, file_out, **kwargs)
+    return processchecked
+
+
+async def _run(
+    jobs,
+    process,
+    concurrency,
+    handle,
+    init,
+    teardown,
+    map_threshold,
+    atomic,
+    checkfile,
+    retry,
+    timeout
+):
+    semaphore = asyncio.Semaphore(concurrency)
+    # Free concurrency slots (used as worker identifiers)
+    slots = list(range(concurrency))
+    # Slot => (context, process function with context)
+    # (slots are initialized on their first job)
+    workers = {}
+    tasks = set()
+    exceptions = []
+
+    def slotprocess(slot):
+        if slot in workers:
+            return workers[slot][1]
+
+        context = None
+        if init is not None:
+            try:
+                context = init()
+            except Exception as e:
+                return failing(e)
+
+        slot_process = withcontext(process, context)
+        if atomic:
+            slot_process = withcommit(slot_process)
+        if map_threshold is not None:
+            slot_process = withinput(slot_process, map_threshold)
+        if retry is not None:
+            slot_process = withretry(slot_process, *retry)
+        if checkfile is not None:
+            slot_process = withchecks(slot_process, checkfile)
+        workers[slot] = (context, slot_process)
+        return slot_process
+
+    async def convert(job, submitted):
+        slot = slots.pop()
+        try:
+            start = time.time()
+            if timeout:
+                # The conversion is cancelled on timeout
+                try:
+                    result = await asyncio.wait_for(
+                        convertfile(slotprocess(slot), *job),
+                        timeout
+                    )
+                except asyncio.TimeoutError:
+                    result = (job[0], job[1], TIMEOUT_ERROR.format(timeout))
+            else:
+                result = await convertfile(slotprocess(slot), *job)
+            # CPU time not measurable (tasks share the thread)
+            metrics = filemetrics(
+                result,
+                submitted,
+                start,
+                time.time(),
+                None,
+                "async-{}".format(slot)
+            )
+            handle((result, metrics))
+        finally:
+            slots.append(slot)
+            semaphore.release()
+
+    def done(task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            exceptions.append(task.exception())
+
+    for job in jobs:
+        await semaphore.acquire()
+        if exceptions:
+            semaphore.release()
+            break
+
+        task = asyncio.ensure_future(convert(job, time.time()))
+        tasks.add(task)
+        task.add_done_callback(done)
+
+    try:
+        if tasks:
+            await asyncio.wait(list(tasks))
+    finally:
+        if init is not None and teardown is not None:
+            for context, slot_process in workers.values():
+                teardown(context)
+
+    if exceptions:
+        raise exceptions[0]
+
+
+def run(
+    jobs,
+    process,
+    concurrency,
+    handle,
+    init=None,
+    teardown=None,
+    map_threshold=None,
+    atomic=False,
+    checkfile=None,
+    retry=None,
+    timeout=None
+):
+    """Run the conversions on a new event loop.
+
+    Parameters:
+    jobs: iterable
+        Jobs to process, as (file_in, file_out, overwrite)
+    process: coroutine function
+        Function called as 'await process(file_in, file_out)'
+    concurrency: int
+        Maximum number of concurrent conversions
+    handle: callable
+        Called with each (result, metrics) as it is available
+        (from the event loop thread)
+    init: callable, optional
+        Called once per concurrency slot, before its first conversion,
+        returning the context passed to 'process' if it accepts one
+        (default: None)
+    teardown: callable, optional
+        Called with the context of each initialized slot at the end
+        (default: None)
+    map_threshold: int, optional
+        Pass the contents of the input files to 'process' (as 'data'),
+        memory-mapping files of at least 'map_threshold' bytes
+        (default: None, contents not passed)
+    atomic: bool, optional
+        Commit the outputs atomically (see 'commit.withcommit')
+        (default: False)
+    checkfile: callable, optional
+        Check the input files before processing them
+        (see 'checks.withchecks') (default: None, not checked)
+    retry: tuple, optional
+        Retry the conversions failing with a retryable error, with
+        (retries, delay, classify, max_delay) (see 'retry.withretry')
+        (default: None, not retried)
+    timeout: float, optional
+        Maximum duration of a conversion (s), cancelled after it
+        (default: None, no timeout)
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(_run(
+            jobs,
+            process,
+            concurrency,
+            handle,
+            init,
+            teardown,
+            map_threshold,
+            atomic,
+            checkfile,
+            retry,
+            timeout
+        ))
+    finally:
+        loop.close()
@@ -0,0 +1,203 @@
+"""convert_process.py
+
+    Worker side of the 'process' execution backend.
+"""
+
+import os
+import time
+import signal
+from multiprocessing.util import Finalize
+
+from convert_thread import (
+    convertfile, convertbatch, bindworker, withcontext, withretries, failing
+)
+from metrics import timed, timedbatch, thread_time, filemetrics
+from timeouts import Watchdog, TIMEOUT_ERROR
+
+
+# Batch instance of the current worker process
+# (shipped once per worker by 'initworker')
+_class_instance = None
+# 'processfile', 'processbatch' and 'transform' of the worker,
+# with its context
+_processfile = None
+_processbatch = None
+_transform = None
+# Timeouts of the files of the worker ('timeout')
+_watchdog = None
+# Queue of the results of the timed out files
+_expired = None
+
+
+def initworker(class_instance, expired=None):
+    """Pool initializer: keep the batch instance for the worker lifetime.
+
+    The worker is initialized with the 'initworker' hook of the instance,
+    and its 'teardownworker' hook is called when the process exits.
+    If the initialization fails, all the files of the worker fail.
+
+    Parameters:
+    class_instance: AbstractFileBatch
+        Batch instance whose 'processfile' will be called
+    expired: multiprocessing.Queue, optional
+        Queue where to put the results of the files processed for longer
+        than 'timeout', before the worker exits (hung files cannot be
+        interrupted) (default: None, no timeout)
+    """
+    global _class_instance, _processfile, _processbatch, _transform
+    global _watchdog, _expired
+    _class_instance = class_instance
+
+    if class_instance.HANDLE_SIGNALS:
+        # Interruptions (Ctrl+C sent to all the processes) are handled
+        # by the dispatching process, which completes files in flight
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # Handler inherited from the dispatching process (forked):
+        # the pool terminates its workers with SIGTERM
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    if expired is not None and class_instance.timeout:
+        _expired = expired
+        _watchdog = Watchdog(class_instance.timeout, _expire)
+
+    try:
+        context = class_instance.initworker()
+    except Exception as e:
+        # Not raised: the pool would keep restarting the worker
+        _processfile = _processbatch = _transform = failing(e)
+        return
+
+    _processfile = bindworker(
+        class_instance,
+        class_instance.processfile,
+        context
+    )
+    _processbatch = bindworker(
+        class_instance,
+        class_instance.processbatch,
+        context,
+        batch=True
+    )
+    _transform = withcontext(class_instance.transform, context)
+    if class_instance.retries:
+        _transform = withretries(class_instance, _transform)
+    # Called when the worker exits (pool closed)
+    Finalize(None, _teardownworker, args=(context,), exitpriority=10)
+
+
+def _teardownworker(context):
+    try:
+        _class_instance.teardownworker(context)
+    except Exception as e:
+        _class_instance.logger.warning((
+            "Error in worker teardown: {}"
+        ).format(e))
+
+
+def _expire(task):
+    # Called by the watchdog: the worker is hung
+    items, submitted, start, batch = task
+    results = []
+    for file_in, file_out, overwrite in items:
+        result = (
+            file_in,
+            file_out,
+            TIMEOUT_ERROR.format(_class_instance.timeout)
+        )
+        results.append((result, filemetrics(
+            result,
+            submitted,
+            start,
+            time.time(),
+            None,
+            "process-{}".format(os.getpid())
+        )))
+    _expired.put(results if batch else results[0])
+
+    # Flushed before exiting (the pool starts a new worker)
+    _expired.close()
+    _expired.join_thread()
+    os._exit(1)
+
+
+def _watch(items, submitted, batch=False):
+    if _watchdog is not None:
+        _watchdog.start(
+            (items, submitted, time.time(), batch),
+            _class_instance.timeout * len(items)
+        )
+
+
+def _unwatch():
+    if _watchdog is not None:
+        _watchdog.finish()
+
+
+def convert(job):
+    """Convert a single file in the worker process.
+
+    Parameters:
+    job: tuple
+        (file_in, file_out, overwrite, submitted)
+
+    Returns:
+    tuple: (result, metrics), 'result' as returned by 'convertfile'
+    """
+    file_in, file_out, overwrite, submitted = job
+    _watch([(file_in, file_out, overwrite)], submitted)
+    try:
+        return timed(
+            lambda: convertfile(_processfile, file_in, file_out, overwrite),
+            submitted,
+            "process-{}".format(os.getpid())
+        )
+    finally:
+        _unwatch()
+
+
+def convertmany(job):
+    """Convert a batch of files in the worker process.
+
+    Parameters:
+    job: tuple
+        (jobs, submitted), 'jobs' being a list of
+        (file_in, file_out, overwrite)
+
+    Returns:
+    list of tuple: (result, metrics) of each file
+    """
+    jobs, submitted = job
+    _watch(jobs, submitted, batch=True)
+    try:
+        return timedbatch(
+            lambda: convertbatch(_processbatch, jobs),
+            submitted,
+            "process-{}".format(os.getpid())
+        )
+    finally:
+        _unwatch()
+
+
+def transformdata(job):
+    """Transform the data of a file in the worker process
+    (staged execution, see 'convert_staged').
+
+    Parameters:
+    job: tuple
+        (data, file_in)
+
+    Returns:
+    tuple: (data, error, cpu, worker), 'error' being None on success
+    """
+    data, file_in = job
+    cpu_start = thread_time() if thread_time else None
+
+    error = None
+    try:
+        data = _transform(data, file_in)
+    except Exception as e:
+        data = None
+        error = str(e)
+
+    cpu = thread_time() - cpu_start if cpu_start is not None else None
+    return (data, error, cpu, "process-{}".format(os.getpid()))
@@ -0,0 +1,339 @@
+"""convert_staged.py
+
+    Staged execution backend: files are read, transformed and written
+    by separate pools of workers ('readfile', 'transform', 'writefile').
+"""
+
+import os
+import sys
+import time
+import threading
+
+if sys.version_info.major == 3:
+    import queue
+else:
+    import Queue as queue
+
+from metrics import filemetrics, thread_time
+from convert_thread import withcontext, failing
+from checks import checkinput
+import convert_process
+
+
+# Size of the queue of a stage, per worker of the stage
+QUEUE_FACTOR = 2
+
+
+class _File(object):
+    """State of a file going through the stages."""
+
+    __slots__ = (
+        "file_in", "file_out", "submitted", "start", "cpu", "worker"
+    )
+
+    def __init__(self, file_in, file_out, submitted):
+        self.file_in = file_in
+        self.file_out = file_out
+        self.submitted = submitted
+        self.start = time.time()
+        self.cpu = None
+        self.worker = None
+
+
+class Pipeline(object):
+    """Read, transform and write stages connected by bounded queues.
+
+        Each stage has its own workers: threads for reading and writing
+        (I/O bound), and threads or the processes of a pool for the
+        transforms (CPU bound), so that disks and cores are busy at the
+        same time. A full queue blocks the previous stage: at most a few
+        files per worker are held in memory between two stages.
+        Results are put in 'out_queue' as (result, metrics) once the file
+        is written, or as soon as one of its stages fails.
+    """
+
+    def __init__(
+        self,
+        read,
+        transform,
+        write,
+        out_queue,
+        read_workers,
+        transform_workers,
+        write_workers,
+        pool=None,
+        init=None,
+        teardown=None,
+        checkfile=None,
+        retry=None
+    ):
+        """Start the workers of the stages.
+
+        Parameters:
+        read: callable
+            Called as 'read(file_in)', returning the data of the file
+        transform: callable
+            Called as 'transform(data, file_in)', returning the data
+            to write (not used with a 'pool')
+        write: callable
+            Called as 'write(file_in, file_out, data=data)'
+        out_queue: Queue
+            Queue of the (result, metrics) of the files
+        read_workers, transform_workers, write_workers: int
+            Number of workers of each stage
+        pool: multiprocessing.Pool, optional
+            Pool initialized with 'convert_process.initworker', running
+            the transforms (default: None, threads)
+        init: callable, optional
+            Called once per transform thread, before its first transform,
+            returning the context passed to 'transform' if it accepts one
+            (default: None)
+        teardown: callable, optional
+            Called with the context of each initialized transform thread
+            when it stops (default: None)
+        checkfile: callable, optional
+            Check the input files before reading them
+            (see 'checks.checkinput') (default: None, not checked)
+        retry: callable, optional
+            Called as 'retry(function)', returning 'function' retried
+            on retryable errors, applied to the functions of the stages
+            run in threads (default: None, not retried)
+        """
+        self.read = retry(read) if retry else read
+        self.transform = transform
+        self.write = retry(write) if retry else write
+        self.retry = retry
+        self.out_queue = out_queue
+        self.pool = pool
+        self.init = init
+        self.teardown = teardown
+        self.checkfile = checkfile
+
+        self._read_queue = queue.Queue()
+        self._transform_queue = queue.Queue(
+            QUEUE_FACTOR * transform_workers
+        )
+        self._write_queue = queue.Queue(QUEUE_FACTOR * write_workers)
+        # Files in the pool (queued or transformed)
+        self._pool_slots = threading.BoundedSemaphore(
+            (QUEUE_FACTOR + 1) * transform_workers
+        )
+
+        self._readers = self._start(self._reader, read_workers, "read")
+        self._transformers = []
+        if pool is None:
+            self._transformers = self._start(
+                self._transformer,
+                transform_workers,
+                "transform"
+            )
+        self._writers = self._start(self._writer, write_workers, "write")
+
+
+    def _start(self, target, number, name):
+        threads = []
+        for index in range(number):
+            thread = threading.Thread(
+                target=target,
+                name="{}-{}".format(name, index + 1)
+            )
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        return threads
+
+
+    def submit(self, file_in, file_out, overwrite):
+        """Queue a file to process.
+
+        Parameters:
+        file_in: str
+            Path of the input file
+        file_out: str
+            Path of the output file
+        overwrite: bool
+            Overwrite the output file if it already exists
+        """
+        self._read_queue.put((file_in, file_out, overwrite, time.time()))
+
+
+    def close(self):
+        """Process the queued files and stop the workers.
+
+        Stages are stopped in order, once the previous one is done.
+        The pool, if any, is closed.
+        """
+        self._stop(self._read_queue, self._readers)
+        if self.pool is not None:
+            # All results delivered (to the writers) once joined
+            self.pool.close()
+            self.pool.join()
+        self._stop(self._transform_queue, self._transformers)
+        self._stop(self._write_queue, self._writers)
+
+
+    def terminate(self):
+        """Stop the workers without processing the queued files.
+
+        The pool, if any, is terminated. Threads processing a file
+        complete it in the background.
+        """
+        for stage_queue in (
+            self._read_queue,
+            self._transform_queue,
+            self._write_queue
+        ):
+            while True:
+                try:
+                    stage_queue.get_nowait()
+                except queue.Empty:
+                    break
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+        for stage_queue, threads in (
+            (self._read_queue, self._readers),
+            (self._transform_queue, self._transformers),
+            (self._write_queue, self._writers)
+        ):
+            for thread in threads:
+                try:
+                    stage_queue.put_nowait(None)
+                except queue.Full:
+                    break
+
+
+    def _stop(self, stage_queue, threads):
+        # Stop requests (handled after queued files)
+        for thread in threads:
+            stage_queue.put(None)
+        for thread in threads:
+            thread.join()
+
+
+    def _done(self, state, error=None):
+        result = (state.file_in, state.file_out, error)
+        self.out_queue.put((result, filemetrics(
+            result,
+            state.submitted,
+            state.start,
+            time.time(),
+            state.cpu,
+            state.worker
+        )))
+
+
+    def _reader(self):
+        while True:
+            job = self._read_queue.get()
+            if job is None:
+                break
+
+            file_in, file_out, overwrite, submitted = job
+            state = _File(file_in, file_out, submitted)
+            # Replaced by the transforming worker
+            state.worker = threading.current_thread().name
+            try:
+                if not overwrite and os.path.isfile(file_out):
+                    self._done(state, (
+                        "File not converted:"
+                        " file already exists and overwrite is set to False."
+                    ))
+                    continue
+                if self.checkfile is not None:
+                    checkinput(file_in, self.checkfile)
+                data = self.read(file_in)
+            except Exception as e:
+                self._done(state, str(e))
+                continue
+
+            if self.pool is None:
+                self._transform_queue.put((state, data))
+            else:
+                self._pooltransform(state, data)
+
+
+    def _pooltransform(self, state, data):
+        self._pool_slots.acquire()
+
+        def callback(transformed):
+            self._pool_slots.release()
+            data, error, state.cpu, state.worker = transformed
+            if error:
+                self._done(state, error)
+            else:
+                self._write_queue.put((state, data))
+
+        kwargs = {}
+        if sys.version_info.major == 3:
+            # Errors not caught by the worker (eg: pickling errors)
+            def error_callback(e):
+                self._pool_slots.release()
+                self._done(state, str(e))
+            kwargs["error_callback"] = error_callback
+
+        self.pool.apply_async(
+            convert_process.transformdata,
+            ((data, state.file_in),),
+            callback=callback,
+            **kwargs
+        )
+
+
+    def _transformer(self):
+        # Initialized on the first file
+        initialized = False
+        context = None
+        transform = None
+
+        try:
+            while True:
+                item = self._transform_queue.get()
+                if item is None:
+                    break
+
+                if transform is None:
+                    try:
+                        if self.init is not None:
+                            context = self.init()
+                        initialized = True
+                        transform = withcontext(self.transform, context)
+                        if self.retry:
+                            transform = self.retry(transform)
+                    except Exception as e:
+                        transform = failing(e)
+
+                state, data = item
+                state.worker = threading.current_thread().name
+                cpu_start = thread_time() if thread_time else None
+                try:
+                    data = transform(data, state.file_in)
+                    error = None
+                except Exception as e:
+                    error = str(e)
+                if cpu_start is not None:
+                    state.cpu = thread_time() - cpu_start
+
+                if error:
+                    self._done(state, error)
+                else:
+                    self._write_queue.put((state, data))
+
+        finally:
+            if initialized and self.teardown is not None:
+                self.teardown(context)
+
+
+    def _writer(self):
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                break
+
+            state, data = item
+            try:
+                self.write(state.file_in, state.file_out, data=data)
+                error = None
+            except Exception as e:
+                error = str(e)
+            self._done(state, error)
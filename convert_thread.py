@@ -5,37 +5,371 @@
 import sys
 import threading
 import os
+import inspect
+import functools
+
+if sys.version_info.major == 3:
+    from queue import Empty
+else:
+    from Queue import Empty
+
+from metrics import timed, timedbatch
+from inputdata import withinput
+from commit import withcommit, withcommitbatch
+from checks import withchecks, withchecksbatch
+from retry import withretry
+
+
+def acceptsargument(process, name):
+    """Check if a function has an argument.
+
+    Parameters:
+    process: callable
+        Function to check
+    name: str
+        Name of the argument
+
+    Returns:
+    bool: True if 'process' has an argument 'name'
+    """
+    if hasattr(inspect, "signature"):
+        try:
+            return name in inspect.signature(process).parameters
+        except (TypeError, ValueError):
+            return False
+
+    # Python 2
+    try:
+        return name in inspect.getargspec(process).args
+    except TypeError:
+        return False
+
+
+def withcontext(process, context):
+    """Pass a worker context to a process function, if it accepts one.
+
+    Parameters:
+    process: callable
+        'processfile' or 'processbatch' method
+    context: object
+        Worker context, as returned by 'initworker'
+
+    Returns:
+    callable: 'process', with its 'context' argument bound if it has one
+    """
+    if acceptsargument(process, "context"):
+        return functools.partial(process, context=context)
+    return process
+
+
+def bindworker(class_instance, process, context, batch=False, guard=None):
+    """Get the 'processfile' (or 'processbatch') function of a worker.
+
+    Parameters:
+    class_instance: AbstractFileBatch
+        Batch instance
+    process: callable
+        'processfile' (or 'processbatch') method
+    context: object
+        Worker context, as returned by 'initworker'
+    batch: bool, optional
+        'process' is 'processbatch' (default: False)
+    guard: callable, optional
+        Guard of the commits of the outputs ('atomicOutput' mode),
+        see 'commit.withcommit' (default: None)
+
+    Returns:
+    callable: 'process', with the worker context bound,
+        outputs committed atomically ('atomicOutput' mode),
+        the input contents passed ('mapInput' mode),
+        retried on retryable errors ('retries')
+        and the input files checked first ('lazyChecks' mode)
+    """
+    process = withcontext(process, context)
+    if class_instance.atomicOutput:
+        if batch:
+            process = withcommitbatch(process, guard)
+        else:
+            process = withcommit(process, guard)
+    if class_instance.mapInput and not batch:
+        process = withinput(process, class_instance.MAP_THRESHOLD)
+    if class_instance.retries:
+        process = withretries(class_instance, process)
+    if class_instance.lazyChecks:
+        if batch:
+            process = withchecksbatch(process, class_instance.checkfile)
+        else:
+            process = withchecks(process, class_instance.checkfile)
+    return process
+
+
+def withretries(class_instance, process):
+    """Retry a function of a worker on retryable errors.
+
+    Parameters:
+    class_instance: AbstractFileBatch
+        Batch instance ('retries', 'retryDelay' and 'isretryable')
+    process: callable
+        Function to retry
+
+    Returns:
+    callable: 'process', retried (see 'retry.withretry')
+    """
+    return withretry(
+        process,
+        class_instance.retries,
+        class_instance.retryDelay,
+        class_instance.isretryable,
+        class_instance.RETRY_MAX_DELAY
+    )
+
+
+def failing(error):
+    """Get a process function failing with an error.
+
+    Used in place of the process function of a worker whose
+    initialization failed.
+    """
+    def process(*args, **kwargs):
+        raise error
+    return process
+
+
+def convertfile(process, file_in, file_out, overwrite):
+    """Convert a single file.
+
+    Shared by all the execution backends so that they report results
+    in the same way.
+
+    Parameters:
+    process: callable
+        Function called as 'process(file_in, file_out)'
+    file_in: str
+        Path of the input file
+    file_out: str
+        Path of the output file
+    overwrite: bool
+        Overwrite the output file if it already exists
+
+    Returns:
+    tuple: (file_in, file_out, error), 'error' being None on success
+    """
+
+    error = None
+    try:
+        if overwrite or not os.path.isfile(file_out):
+            process(file_in, file_out)
+
+        else:
+            error = (
+                "File not converted:"
+                " file already exists and overwrite is set to False."
+            )
+
+    except Exception as e:
+        error = str(e)
+
+    return (file_in, file_out, error)
+
+
+def convertbatch(process, jobs):
+    """Convert a batch of files with a single call.
+
+    Parameters:
+    process: callable
+        Function called as 'process(pairs)', with the list of
+        (file_in, file_out) pairs to convert, and returning the list
+        of their errors (None on success), or None if all succeeded
+    jobs: list of tuple
+        Jobs to convert, as (file_in, file_out, overwrite)
+
+    Returns:
+    list of tuple: (file_in, file_out, error) of each job
+    """
+
+    errors = [None] * len(jobs)
+    pairs = []
+    indices = []
+    for index, (file_in, file_out, overwrite) in enumerate(jobs):
+        if overwrite or not os.path.isfile(file_out):
+            pairs.append((file_in, file_out))
+            indices.append(index)
+        else:
+            errors[index] = (
+                "File not converted:"
+                " file already exists and overwrite is set to False."
+            )
+
+    if pairs:
+        try:
+            batch_errors = process(pairs)
+            if batch_errors is None:
+                batch_errors = [None] * len(pairs)
+            else:
+                batch_errors = list(batch_errors)
+                if len(batch_errors) != len(pairs):
+                    raise ValueError((
+                        "{} errors returned for {} files"
+                    ).format(len(batch_errors), len(pairs)))
+
+        except Exception as e:
+            batch_errors = [str(e)] * len(pairs)
+
+        for index, error in zip(indices, batch_errors):
+            errors[index] = str(error) if error else None
+
+    return [
+        (file_in, file_out, error)
+        for (file_in, file_out, overwrite), error in zip(jobs, errors)
+    ]
 
 
 class ConvertThread(threading.Thread):
 
-    def __init__(self, queue, out_queue):
+    # Interval of the checks of stop requests by idle threads (s)
+    STOP_POLL_INTERVAL = 0.5
+
+    def __init__(self, queue, out_queue, tracker=None, stopping=None):
         threading.Thread.__init__(self)
         self.queue = queue
         self.out_queue = out_queue
+        # Timeouts and speculative execution (see 'timeouts.Tracker')
+        self.tracker = tracker
+        # Set by 'tracker' when timed out (the thread is replaced)
+        self.abandoned = False
+        # Called as 'stopping(thread)' before taking a job: True if the
+        # thread is to stop (see 'pools.ThreadPool.resize')
+        self.stopping = stopping
+        # Set by 'stopping' when the thread stops
+        self.stopped = False
         return
 
 
     def run(self):
-        while True:
-            class_instance, process, file_in, file_out, overwrite = \
-                self.queue.get()
-
-            error = None
-            try:
-                if overwrite or not os.path.isfile(file_out):
-                    process(file_in, file_out)
-
-                else:
-                    error = (
-                        "File not converted:"
-                        " file already exists and overwrite is set to False."
+        # Batch instance, once the worker is initialized
+        # (on its first job: workers of an adaptive pool might get none)
+        class_instance = None
+        context = None
+        # (process function, process function with context)
+        bound = (None, None)
+
+        try:
+            while True:
+                if self.stopping is not None and self.stopping(self):
+                    # Pool shrunk: stopped before taking another job
+                    break
+
+                try:
+                    job = self.queue.get(
+                        timeout=self.STOP_POLL_INTERVAL
+                        if self.stopping is not None else None
+                    )
+                except Empty:
+                    continue
+                if job is None:
+                    # Stop request
+                    self.queue.task_done()
+                    break
+
+                if (
+                    self.tracker is not None
+                    and not self.tracker.start(self, job, self.key(job))
+                ):
+                    # Copy of a file already reported
+                    self.queue.task_done()
+                    continue
+
+                process = bound[1]
+                if class_instance is None:
+                    try:
+                        context = job[0].initworker()
+                        class_instance = job[0]
+                    except Exception as e:
+                        process = failing(e)
+
+                if class_instance is not None and job[1] != bound[0]:
+                    bound = (
+                        job[1],
+                        self.bind(class_instance, job[1], context)
                     )
+                    process = bound[1]
 
-            except Exception as e:
-                error = str(e)
+                result = self.convert(job, process)
+                self.queue.task_done()
 
-            self.out_queue.put((file_in, file_out, error))
-            self.queue.task_done()
+                if self.tracker is not None and not self.tracker.finish(self):
+                    if self.abandoned:
+                        # Timed out: result already reported
+                        break
+                    # Slower copy of a file
+                    continue
+                self.out_queue.put(result)
+
+        finally:
+            if class_instance is not None:
+                try:
+                    class_instance.teardownworker(context)
+                except Exception as e:
+                    class_instance.logger.warning((
+                        "Error in worker teardown: {}"
+                    ).format(e))
 
         return
+
+
+    def bind(self, class_instance, process, context):
+        return bindworker(class_instance, process, context, guard=self.guard)
+
+
+    def guard(self, commit):
+        # Outputs of abandoned attempts are not committed
+        if self.tracker is None:
+            commit()
+            return True
+        return self.tracker.commit(self, commit)
+
+
+    def key(self, job):
+        # Identifier of the file of a job (copies of a job share it)
+        return job[2]
+
+
+    def convert(self, job, process):
+        class_instance, unbound, file_in, file_out, overwrite, \
+            submitted = job
+
+        # (result, metrics)
+        return timed(
+            lambda: convertfile(process, file_in, file_out, overwrite),
+            submitted,
+            self.name
+        )
+
+
+class BatchConvertThread(ConvertThread):
+    """Thread converting batches of files with 'processbatch'."""
+
+    def bind(self, class_instance, process, context):
+        return bindworker(
+            class_instance,
+            process,
+            context,
+            batch=True,
+            guard=self.guard
+        )
+
+
+    def key(self, job):
+        # Batches are not copied
+        return None
+
+
+    def convert(self, job, process):
+        class_instance, unbound, jobs, submitted = job
+
+        # List of (result, metrics)
+        return timedbatch(
+            lambda: convertbatch(process, jobs),
+            submitted,
+            self.name
+        )
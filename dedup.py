@@ -0,0 +1,154 @@
+"""dedup.py
+
+    Content deduplication of input files.
+"""
+
+import os
+import errno
+import shutil
+from multiprocessing.pool import ThreadPool
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+import commit
+from manifest import Manifest
+
+
+# Ways of producing the outputs of duplicate files
+POLICIES = ("copy", "hardlink", "reflink")
+
+# 'ioctl' request cloning a file (Linux: Btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def groupfiles(files, workers=1):
+    """Group files with identical contents.
+
+    Only files sharing their size with another file are hashed
+    (in parallel, on 'workers' threads).
+    Files that cannot be read are not grouped.
+
+    Parameters:
+    files: list of str
+        Paths of the files
+    workers: int, optional
+        Number of hashing threads (default: 1)
+
+    Returns:
+    list of list of str: Groups of at least 2 identical files,
+        in the order of 'files'
+    """
+    by_size = {}
+    for file_path in files:
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            continue
+        by_size.setdefault(size, []).append(file_path)
+
+    candidates = [
+        file_path
+        for same_size in by_size.values()
+        if len(same_size) > 1
+        for file_path in same_size
+    ]
+    if not candidates:
+        return []
+
+    pool = ThreadPool(max(1, min(workers, len(candidates))))
+    try:
+        hashes = pool.map(_hashfile, candidates)
+    finally:
+        pool.close()
+        pool.join()
+
+    by_content = {}
+    for file_path, content_hash in zip(candidates, hashes):
+        if content_hash is None:
+            continue
+        key = (os.path.getsize(file_path), content_hash)
+        by_content.setdefault(key, []).append(file_path)
+
+    order = dict((file_path, index) for index, file_path in enumerate(files))
+    groups = [
+        sorted(group, key=order.get)
+        for group in by_content.values()
+        if len(group) > 1
+    ]
+    groups.sort(key=lambda group: order[group[0]])
+    return groups
+
+
+def _hashfile(file_path):
+    try:
+        return Manifest.hashfile(file_path)
+    except (IOError, OSError):
+        return None
+
+
+def linkfile(source, target, policy="copy", overwrite=False, atomic=False):
+    """Produce a file identical to another one.
+
+    'hardlink' and 'reflink' fall back to a copy when not supported
+    (eg: different file systems).
+
+    Parameters:
+    source: str
+        Path of the existing file
+    target: str
+        Path of the file to produce
+    policy: str, optional
+        'copy', 'hardlink' or 'reflink' (copy on write clone)
+        (default: 'copy')
+    overwrite: bool, optional
+        Replace the target if it already exists (default: False)
+    atomic: bool, optional
+        Produce the file at a temporary path, renamed to the target
+        (see 'commit.withcommit') (default: False)
+
+    Raises:
+    OSError
+        If the target exists and 'overwrite' is False,
+        or if the file cannot be produced
+    """
+    if os.path.exists(target):
+        if not overwrite:
+            raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), target)
+        if not atomic:
+            os.remove(target)
+
+    if not atomic:
+        _linkfile(source, target, policy)
+        return
+
+    temp = commit.temppath(target)
+    try:
+        _linkfile(source, temp, policy)
+        commit.replacefile(temp, target)
+    except Exception:
+        commit.discard(temp)
+        raise
+
+
+def _linkfile(source, target, policy):
+    if policy == "hardlink" and hasattr(os, "link"):
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+
+    elif policy == "reflink" and fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(target, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copymode(source, target)
+            return
+        except (IOError, OSError):
+            pass
+
+    shutil.copyfile(source, target)
@@ -0,0 +1,392 @@
+"""benchmark.py
+
+    Benchmark of the Abstract File Batch framework (Python 3).
+
+    Generates a synthetic tree of files, then measures:
+    - discovery ('getfiles', 'iterfiles')
+    - argument parsing and input checks (instance creation)
+    - processing, with no-op and CPU bound 'processfile' implementations,
+      for each number of workers and execution backend
+    Results are printed, and can be saved as JSON to compare runs.
+
+    Example:
+    python extras/benchmark.py --files 10000 --numberThreads 1 4 16 \\
+        --executors thread process --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from abstract_file_batch import AbstractFileBatch
+
+
+class NoOpBatch(AbstractFileBatch):
+    """Does nothing: measures the framework overhead."""
+
+    def processfile(self, srcFilePath, destFilePath):
+        pass
+
+
+class CopyBatch(AbstractFileBatch):
+    """Copies each file: measures I/O bound processing."""
+
+    def processfile(self, srcFilePath, destFilePath):
+        shutil.copyfile(srcFilePath, destFilePath)
+
+
+class CpuBatch(AbstractFileBatch):
+    """Hashes each file repeatedly in pure Python: CPU bound processing."""
+
+    # Number of rounds per file
+    ROUNDS = 2000
+
+    def processfile(self, srcFilePath, destFilePath):
+        with open(srcFilePath, "rb") as infile:
+            data = infile.read(4096)
+        value = 0
+        for i in range(self.ROUNDS):
+            for byte in data[:64]:
+                value = (value * 31 + byte) & 0xFFFFFFFF
+        with open(destFilePath, "w") as outfile:
+            outfile.write(str(value))
+
+
+class AsyncNoOpBatch(AbstractFileBatch):
+    """Coroutine doing nothing: measures the 'async' backend overhead."""
+
+    async def processfile(self, srcFilePath, destFilePath):
+        pass
+
+
+# Workload => (batch class, coroutine batch class or None)
+WORKLOADS = {
+    "noop": (NoOpBatch, AsyncNoOpBatch),
+    "copy": (CopyBatch, None),
+    "cpu": (CpuBatch, None),
+}
+
+
+def generatetree(root, files, depth, fanout, min_size, max_size,
+                 distribution="uniform", seed=0):
+    """Generate a synthetic tree of files.
+
+    Files are spread evenly over the directories of a tree of the given
+    depth and fan-out (directories at all levels contain files).
+
+    Parameters:
+    root: str
+        Root directory of the tree (created)
+    files: int
+        Number of files
+    depth: int
+        Depth of the tree (0 => all files in 'root')
+    fanout: int
+        Number of subdirectories per directory
+    min_size, max_size: int
+        Bounds of the file sizes (in bytes)
+    distribution: str, optional
+        Size distribution: 'uniform' or 'lognormal' (default: 'uniform')
+    seed: int, optional
+        Random seed (default: 0)
+
+    Returns:
+    int: Total size of the files (in bytes)
+    """
+    rng = random.Random(seed)
+
+    directories = [root]
+    level = [root]
+    for i in range(depth):
+        level = [
+            os.path.join(directory, "dir{}".format(j))
+            for directory in level
+            for j in range(fanout)
+        ]
+        directories.extend(level)
+    for directory in directories:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    total_size = 0
+    block = os.urandom(65536)
+    for i in range(files):
+        if distribution == "lognormal":
+            # Median at a tenth of the range, long tail
+            size = rng.lognormvariate(0, 1.5) * (max_size - min_size) / 10
+            size = min(max_size, min_size + int(size))
+        else:
+            size = rng.randint(min_size, max_size)
+
+        directory = directories[i % len(directories)]
+        file_path = os.path.join(directory, "file{}.dat".format(i))
+        with open(file_path, "wb") as outfile:
+            remaining = size
+            while remaining > 0:
+                outfile.write(block[:min(remaining, len(block))])
+                remaining -= len(block)
+        total_size += size
+
+    return total_size
+
+
+def timeit(function, repeat=1):
+    """Get the best time of several calls of a function.
+
+    Returns:
+    tuple: (best time in seconds, result of the last call)
+    """
+    best = None
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return (best, result)
+
+
+def benchdiscovery(input_dir, repeat):
+    results = []
+
+    elapsed, files = timeit(
+        lambda: AbstractFileBatch.getfiles(input_dir),
+        repeat
+    )
+    results.append({
+        "benchmark": "getfiles",
+        "files": len(files),
+        "seconds": elapsed,
+        "files_per_second": len(files) / elapsed if elapsed else None
+    })
+
+    elapsed, files = timeit(
+        lambda: list(AbstractFileBatch.iterfiles(input_dir)),
+        repeat
+    )
+    results.append({
+        "benchmark": "iterfiles",
+        "files": len(files),
+        "seconds": elapsed,
+        "files_per_second": len(files) / elapsed if elapsed else None
+    })
+
+    # Argument parsing, discovery and '__checkinputs'
+    elapsed, batch = timeit(
+        lambda: NoOpBatch(["--inputDir", input_dir]),
+        repeat
+    )
+    results.append({
+        "benchmark": "checkinputs",
+        "files": len(batch.inputFiles),
+        "seconds": elapsed,
+        "files_per_second": len(batch.inputFiles) / elapsed
+        if elapsed else None
+    })
+
+    return results
+
+
+def benchprocess(input_dir, work_dir, workload, executor, number_threads,
+                 repeat, streaming=False):
+    batch_class, async_class = WORKLOADS[workload]
+    if executor == "async":
+        if async_class is None:
+            return None
+        batch_class = async_class
+
+    best = None
+    for i in range(repeat):
+        output_dir = tempfile.mkdtemp(dir=work_dir)
+        arguments = [
+            "--inputDir", input_dir,
+            "--outputDir", output_dir,
+            "--numberThreads", str(number_threads),
+            "--executor", executor,
+        ]
+        if streaming:
+            arguments.append("--streaming")
+
+        start = time.perf_counter()
+        batch = batch_class(arguments)
+        setup = time.perf_counter() - start
+        success = batch.run()
+        total = time.perf_counter() - start
+        summary = batch.getsummary()
+
+        shutil.rmtree(output_dir)
+
+        if best is None or total < best["seconds"]:
+            best = {
+                "benchmark": "process",
+                "workload": workload,
+                "executor": executor,
+                "numberThreads": number_threads,
+                "streaming": streaming,
+                "success": success,
+                "files": summary["files"],
+                "setup_seconds": setup,
+                "seconds": total,
+                "files_per_second": summary["files"] / total
+                if total else None,
+                "latency": summary["latency"],
+                "queue_wait": summary["queue_wait"],
+            }
+
+    return best
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument(
+        "--files", type=int, default=2000,
+        help="number of files (default: 2000)"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=2,
+        help="depth of the tree (default: 2)"
+    )
+    parser.add_argument(
+        "--fanout", type=int, default=4,
+        help="subdirectories per directory (default: 4)"
+    )
+    parser.add_argument(
+        "--minSize", type=int, default=0,
+        help="minimum file size in bytes (default: 0)"
+    )
+    parser.add_argument(
+        "--maxSize", type=int, default=16384,
+        help="maximum file size in bytes (default: 16384)"
+    )
+    parser.add_argument(
+        "--distribution", choices=("uniform", "lognormal"),
+        default="uniform",
+        help="file size distribution (default: 'uniform')"
+    )
+    parser.add_argument(
+        "--workloads", nargs="*", choices=sorted(WORKLOADS),
+        default=["noop", "cpu"],
+        help="processfile implementations (default: noop cpu)"
+    )
+    parser.add_argument(
+        "--numberThreads", nargs="*", type=int, default=[1, 4, 8],
+        help="numbers of workers (default: 1 4 8)"
+    )
+    parser.add_argument(
+        "--executors", nargs="*", choices=AbstractFileBatch.EXECUTORS,
+        default=["thread", "process"],
+        help="execution backends (default: thread process)"
+    )
+    parser.add_argument(
+        "--streaming", action="store_true",
+        help="also benchmark the streaming discovery mode"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="repetitions, best time is kept (default: 3)"
+    )
+    parser.add_argument(
+        "--workDir",
+        help="directory where to generate the tree (default: temporary)"
+    )
+    parser.add_argument(
+        "--output",
+        help="JSON file where to save the results"
+    )
+    options = parser.parse_args(args)
+
+    work_dir = tempfile.mkdtemp(dir=options.workDir)
+    input_dir = os.path.join(work_dir, "input")
+    try:
+        total_size = generatetree(
+            input_dir,
+            options.files,
+            options.depth,
+            options.fanout,
+            options.minSize,
+            options.maxSize,
+            options.distribution
+        )
+
+        results = benchdiscovery(input_dir, options.repeat)
+        for result in results:
+            print("{benchmark:<12} {files:>8} files {seconds:>9.4f}s".format(
+                **result
+            ))
+
+        for workload in options.workloads:
+            for executor in options.executors:
+                for number_threads in options.numberThreads:
+                    for streaming in (
+                        (False, True) if options.streaming else (False,)
+                    ):
+                        result = benchprocess(
+                            input_dir,
+                            work_dir,
+                            workload,
+                            executor,
+                            number_threads,
+                            options.repeat,
+                            streaming
+                        )
+                        if result is None:
+                            continue
+                        results.append(result)
+                        print((
+                            "process {workload:<5} {executor:<8}"
+                            " x{numberThreads:<3}"
+                            "{stream} {files:>8} files {seconds:>9.4f}s"
+                            " {files_per_second:>10.1f} files/s"
+                        ).format(
+                            stream=" streaming" if streaming else "",
+                            **result
+                        ))
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "config": {
+            "files": options.files,
+            "depth": options.depth,
+            "fanout": options.fanout,
+            "minSize": options.minSize,
+            "maxSize": options.maxSize,
+            "distribution": options.distribution,
+            "total_size": total_size,
+            "repeat": options.repeat,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    if options.output:
+        with open(options.output, "w") as outfile:
+            json.dump(report, outfile, indent=2, sort_keys=True)
+
+    return report
+
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.ERROR)
+
+    main()
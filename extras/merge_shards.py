@@ -0,0 +1,109 @@
+"""merge_shards.py
+
+    Merge the reports of the shards of a batch ('--shard' option).
+
+    Metrics summaries (exported with '--metricsFile' in JSON format)
+    are merged into a single summary, and journals ('--journal') into
+    the list of files completed, failed or not finished by any shard.
+
+    Example:
+    python extras/merge_shards.py --metrics metrics-*.json \\
+        --journals journal-*.jsonl --output merged.json
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from shard import mergesummaries, loadsummary
+from journal import Journal
+
+
+def mergejournals(paths):
+    """Merge the journals of the shards of a batch.
+
+    Parameters:
+    paths: list of str
+        Paths of the journals
+
+    Returns:
+    dict: Input files per state ('completed', 'failed', 'dispatched')
+    """
+    states = {}
+    for path in paths:
+        for input_file, entry in Journal.replay(path).items():
+            state = entry["state"]
+            # Completed by any shard (eg: after a re-run)
+            if states.get(input_file) != Journal.COMPLETED:
+                states[input_file] = state
+
+    files = {
+        Journal.COMPLETED: [],
+        Journal.FAILED: [],
+        Journal.DISPATCHED: []
+    }
+    for input_file, state in sorted(states.items()):
+        files[state].append(input_file)
+    return files
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument(
+        "--metrics", nargs="*", default=[],
+        help="metrics summaries of the shards (JSON)"
+    )
+    parser.add_argument(
+        "--journals", nargs="*", default=[],
+        help="journals of the shards"
+    )
+    parser.add_argument(
+        "--output",
+        help="file where to save the merged report (JSON)"
+    )
+    options = parser.parse_args(args)
+
+    report = {}
+    if options.metrics:
+        report["summary"] = mergesummaries(
+            [loadsummary(path) for path in options.metrics],
+            names=[
+                os.path.splitext(os.path.basename(path))[0]
+                for path in options.metrics
+            ]
+        )
+        summary = report["summary"]
+        print((
+            "{shards} shard(s): {files} file(s), {errors} error(s)"
+            " in {elapsed:.3f}s ({throughput:.1f} files/s)"
+        ).format(**summary))
+
+    if options.journals:
+        report["files"] = mergejournals(options.journals)
+        files = report["files"]
+        print((
+            "{} completed, {} failed, {} not finished file(s)"
+        ).format(
+            len(files[Journal.COMPLETED]),
+            len(files[Journal.FAILED]),
+            len(files[Journal.DISPATCHED])
+        ))
+        for input_file in files[Journal.FAILED]:
+            print("failed: {}".format(input_file))
+
+    if options.output:
+        with open(options.output, "w") as outfile:
+            json.dump(report, outfile, indent=2, sort_keys=True)
+
+    return report
+
+
+
+if __name__ == "__main__":
+
+    main()
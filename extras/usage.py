@@ -62,7 +62,11 @@ class FileBatchExample(AbstractFileBatch):
 
     def preprocess(self):
         # Example test to cancel the process before it starts
-        if len(self.inputFiles) > self.maxNumber:
+        # ('inputFiles' is None in streaming mode: files not listed yet)
+        if (
+            self.inputFiles is not None
+            and len(self.inputFiles) > self.maxNumber
+        ):
             self.logger.info(
                 "Too many files ({}).".format(len(self.inputFiles))
             )
@@ -0,0 +1,368 @@
+"""filters.py
+
+    Selection of input files: extensions, include/exclude rules,
+    size and modification time bounds, and ignored directories.
+"""
+
+import os
+import re
+import time
+import datetime
+
+
+# Multiples of size units
+SIZE_UNITS = {
+    "": 1,
+    "k": 1024,
+    "m": 1024 ** 2,
+    "g": 1024 ** 3,
+    "t": 1024 ** 4
+}
+
+# Accepted date formats of time bounds (local time)
+TIME_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%dT%H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S"
+)
+
+
+class FileFilter(object):
+    """Compiled selection rules of input files.
+
+        Rules are compiled once: extensions into a set, glob rules into
+        a single regex per kind (include, exclude, ignored directories),
+        and each regex rule on its own (inline flags and backreferences
+        are supported). Rules are matched against paths relative
+        to the input directory, with '/' separators:
+        - globs without '/' match the name of the file (or directory),
+          globs with '/' match the whole relative path
+          ('*' and '?' do not match '/', '**' does)
+        - regexes match anywhere in the relative path ('re.search')
+        Size and time bounds require a 'stat' of the file, only made
+        when bounds are set.
+    """
+
+    def __init__(
+        self,
+        extensions=None,
+        include=None,
+        exclude=None,
+        include_regex=None,
+        exclude_regex=None,
+        min_size=None,
+        max_size=None,
+        newer=None,
+        older=None,
+        ignored_dirs=None
+    ):
+        """Compile selection rules.
+
+        Parameters:
+        extensions: list of str, optional
+            Extensions of the files, without '.' (default: None, all)
+        include: list of str, optional
+            Globs of the files to keep (default: None, all)
+        exclude: list of str, optional
+            Globs of the files to ignore (default: None)
+        include_regex: list of str, optional
+            Regexes of the files to keep (default: None, all)
+        exclude_regex: list of str, optional
+            Regexes of the files to ignore (default: None)
+        min_size, max_size: int, optional
+            Bounds of the size of the files, in bytes (default: None)
+        newer, older: float, optional
+            Bounds of the modification time of the files, as timestamps
+            (default: None)
+        ignored_dirs: list of str, optional
+            Globs of the directories not to look into (default: None)
+
+        Raises:
+        ValueError
+            If a regex is invalid
+        """
+        self.extensions = None
+        if extensions:
+            self.extensions = frozenset(
+                "." + extension.lower().lstrip(".")
+                for extension in extensions
+            )
+
+        self._include = _compile(include, include_regex)
+        self._exclude = _compile(exclude, exclude_regex)
+        self._ignored_dirs = _compile(ignored_dirs)
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.newer = newer
+        self.older = older
+        self.needsstat = any(
+            bound is not None
+            for bound in (min_size, max_size, newer, older)
+        )
+
+        # Relative paths are only needed by path rules
+        self._matchpaths = (
+            self._include is not None or self._exclude is not None
+        )
+
+
+    def matchname(self, relative_path):
+        """Check the path of a file against the extensions and path rules.
+
+        Parameters:
+        relative_path: str
+            Path of the file, relative to the input directory
+
+        Returns:
+        bool: True if the file is selected
+        """
+        if (
+            self.extensions is not None
+            and os.path.splitext(relative_path)[1].lower()
+            not in self.extensions
+        ):
+            return False
+
+        if not self._matchpaths:
+            return True
+
+        relative_path = _normpath(relative_path)
+        if self._include is not None and not self._include.match(relative_path):
+            return False
+        if self._exclude is not None and self._exclude.match(relative_path):
+            return False
+        return True
+
+
+    def matchstat(self, stat_result):
+        """Check a file against the size and time bounds.
+
+        Parameters:
+        stat_result: os.stat_result
+            Status of the file
+
+        Returns:
+        bool: True if the file is selected
+        """
+        size = stat_result.st_size
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+
+        mtime = stat_result.st_mtime
+        if self.newer is not None and mtime < self.newer:
+            return False
+        if self.older is not None and mtime > self.older:
+            return False
+        return True
+
+
+    def matchdir(self, relative_path):
+        """Check if a directory should be looked into.
+
+        Parameters:
+        relative_path: str
+            Path of the directory, relative to the input directory
+
+        Returns:
+        bool: False if the directory is ignored
+        """
+        if self._ignored_dirs is None:
+            return True
+        return not self._ignored_dirs.match(_normpath(relative_path))
+
+
+    def matchparents(self, relative_path):
+        """Check if a file is in an ignored directory.
+
+        Used for files not found by walking directories (lists of files).
+
+        Parameters:
+        relative_path: str
+            Path of the file, relative to the input directory
+
+        Returns:
+        bool: False if one of the directories of the file is ignored
+        """
+        if self._ignored_dirs is None:
+            return True
+
+        parts = _normpath(relative_path).split("/")[:-1]
+        for index in range(len(parts)):
+            if not self.matchdir("/".join(parts[:index + 1])):
+                return False
+        return True
+
+
+    def match(self, relative_path, full_path=None):
+        """Check a file against all the rules.
+
+        Parameters:
+        relative_path: str
+            Path of the file, relative to the input directory
+        full_path: str, optional
+            Path of the file, for the size and time bounds
+            (default: None, 'relative_path')
+
+        Returns:
+        bool: True if the file is selected
+
+        Raises:
+        OSError
+            If the file cannot be accessed (size and time bounds only)
+        """
+        if not (
+            self.matchname(relative_path)
+            and self.matchparents(relative_path)
+        ):
+            return False
+        if self.needsstat:
+            return self.matchstat(os.stat(full_path or relative_path))
+        return True
+
+
+
+def parsesize(value):
+    """Parse a size.
+
+    Parameters:
+    value: str
+        Number of bytes, possibly with a unit ('K', 'M', 'G', 'T',
+        multiples of 1024), eg: '512', '10K', '1.5GB'
+
+    Returns:
+    int: Size in bytes
+
+    Raises:
+    ValueError
+        If the size is invalid
+    """
+    match = re.match(
+        r"^\s*(\d+(?:\.\d*)?)\s*([kmgt]?)(?:i?b)?\s*$",
+        str(value),
+        re.IGNORECASE
+    )
+    if match is None:
+        raise ValueError("Invalid size '{}'".format(value))
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.lower()])
+
+
+def parsetime(value):
+    """Parse a time bound.
+
+    Parameters:
+    value: str
+        Timestamp (seconds since the epoch), or local date and time
+        ('YYYY-MM-DD', 'YYYY-MM-DDTHH:MM[:SS]')
+
+    Returns:
+    float: Timestamp
+
+    Raises:
+    ValueError
+        If the time is invalid
+    """
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    for time_format in TIME_FORMATS:
+        try:
+            date = datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+        return time.mktime(date.timetuple())
+
+    raise ValueError((
+        "Invalid time '{}' (expected a timestamp or 'YYYY-MM-DD[THH:MM:SS]')"
+    ).format(value))
+
+
+def _normpath(path):
+    if os.sep != "/":
+        path = path.replace(os.sep, "/")
+    return path
+
+
+def _compile(globs=None, regexes=None):
+    # Rules matching a path if any of them matches
+    globs = [glob for glob in globs or () if glob]
+    regexes = [regex for regex in regexes or () if regex]
+    if not globs and not regexes:
+        return None
+
+    patterns = []
+    for regex in regexes:
+        # Compiled separately (inline flags and group numbers of each)
+        try:
+            patterns.append(re.compile(regex))
+        except re.error as e:
+            raise ValueError("Invalid regex '{}' ({})".format(regex, e))
+    return _Rules(globs, patterns)
+
+
+class _Rules(object):
+    # Globs translated into a single regex ('match' semantics),
+    # regexes matched anywhere in the path ('search' semantics)
+
+    def __init__(self, globs, regexes):
+        self.globs = None
+        if globs:
+            self.globs = re.compile("|".join(
+                "(?:{})".format(_translateglob(glob)) for glob in globs
+            ))
+        self.regexes = regexes
+
+
+    def match(self, path):
+        if self.globs is not None and self.globs.match(path):
+            return True
+        return any(regex.search(path) for regex in self.regexes)
+
+
+def _translateglob(glob):
+    glob = _normpath(glob).strip("/")
+    pattern = []
+    index = 0
+    while index < len(glob):
+        char = glob[index]
+        if glob.startswith("**/", index):
+            # Any number of directories (including none)
+            pattern.append("(?:.*/)?")
+            index += 3
+            continue
+        elif glob.startswith("**", index):
+            pattern.append(".*")
+            index += 2
+            continue
+        elif char == "*":
+            pattern.append("[^/]*")
+        elif char == "?":
+            pattern.append("[^/]")
+        elif char == "[":
+            end = glob.find("]", index + 2)
+            if end < 0:
+                pattern.append(re.escape(char))
+            else:
+                chars = glob[index + 1:end].replace("\\", "\\\\")
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                pattern.append("[{}]".format(chars))
+                index = end + 1
+                continue
+        else:
+            pattern.append(re.escape(char))
+        index += 1
+
+    pattern = "".join(pattern)
+    if "/" not in glob:
+        # Name of the file, in any directory
+        pattern = "(?:.*/)?" + pattern
+    return pattern + r"\Z"
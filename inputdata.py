@@ -0,0 +1,76 @@
+"""inputdata.py
+
+    Delivery of the contents of input files to 'processfile'.
+"""
+
+import os
+import mmap
+import contextlib
+
+
+@contextlib.contextmanager
+def openinput(file_path, threshold=0):
+    """Open a read-only view of the contents of a file.
+
+    Files of at least 'threshold' bytes are memory-mapped (no copy),
+    smaller ones are read. Empty files (that cannot be mapped) are read.
+    The view is only valid in the 'with' block.
+
+    Parameters:
+    file_path: str
+        Path of the file
+    threshold: int, optional
+        Minimum size (bytes) of mapped files (default: 0)
+
+    Yields:
+    memoryview or bytes: Contents of the file
+        ('mmap' object for mapped files in Python 2)
+    """
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size or size < threshold:
+            mapped = None
+            data = f.read()
+        else:
+            # The mapping stays valid after closing the file
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapped is None:
+        yield data
+        return
+
+    try:
+        view = memoryview(mapped)
+    except TypeError:
+        # Python 2: no buffer protocol on 'mmap'
+        view = None
+
+    try:
+        yield mapped if view is None else view
+    finally:
+        if view is not None:
+            view.release()
+        try:
+            mapped.close()
+        except BufferError:
+            # Slices of the view still referenced
+            # (unmapped when they are garbage collected)
+            pass
+
+
+def withinput(process, threshold=0):
+    """Pass the contents of the input file to a process function.
+
+    Parameters:
+    process: callable
+        Function called as 'process(file_in, file_out, data=data)'
+    threshold: int, optional
+        Minimum size (bytes) of mapped files (default: 0)
+
+    Returns:
+    callable: Function called as 'function(file_in, file_out)'
+    """
+    def processinput(file_in, file_out, **kwargs):
+        with openinput(file_in, threshold) as data:
+            return process(file_in, file_out, data=data, **kwargs)
+    return processinput
@@ -0,0 +1,103 @@
+"""inputlist.py
+
+    Streaming of lists of input files (files or standard input).
+"""
+
+import os
+import sys
+import io
+import zlib
+
+
+# Size of blocks read from lists
+BLOCK_SIZE = 1048576
+
+# First bytes of gzip files
+GZIP_MAGIC = b"\x1f\x8b"
+# Window size of gzip streams ('zlib.decompressobj')
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def iterpaths(source):
+    """Iterate over the paths of a list of files.
+
+    Paths are separated by new lines, or by NUL characters if the list
+    contains any in its first block (eg: 'find -print0' output).
+    Lists can be gzip compressed. Empty paths are ignored.
+    Paths are yielded as soon as they are read (lists written by
+    another process, eg: 'find ... | tool --inputList -').
+
+    Parameters:
+    source: str
+        Path of the list file, or '-' for the standard input
+
+    Yields:
+    str: Path
+    """
+    if source == "-":
+        stream = io.open(sys.stdin.fileno(), "rb", closefd=False)
+    else:
+        stream = io.open(source, "rb")
+
+    try:
+        blocks = _iterblocks(stream)
+        if stream.peek(len(GZIP_MAGIC))[:len(GZIP_MAGIC)] == GZIP_MAGIC:
+            blocks = _decompress(blocks)
+
+        separator = None
+        remainder = b""
+        for block in blocks:
+            if separator is None:
+                separator = b"\0" if b"\0" in block else b"\n"
+
+            lines = (remainder + block).split(separator)
+            remainder = lines.pop()
+            for line in lines:
+                path = _decode(line, separator)
+                if path:
+                    yield path
+
+        path = _decode(remainder, separator)
+        if path:
+            yield path
+
+    finally:
+        stream.close()
+
+
+def _iterblocks(stream):
+    # Data as soon as available (pipes: a producer still writing paths)
+    while True:
+        block = stream.read1(BLOCK_SIZE)
+        if not block:
+            return
+        yield block
+
+
+def _decompress(blocks):
+    # Gzip members decompressed incrementally
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    for block in blocks:
+        while block:
+            data = decompressor.decompress(block)
+            if data:
+                yield data
+            block = decompressor.unused_data
+            if block:
+                # Next member
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def _decode(line, separator):
+    if separator != b"\0":
+        # Windows line endings
+        line = line.rstrip(b"\r")
+    if not line:
+        return None
+    if sys.version_info.major == 3:
+        return os.fsdecode(line)
+    return line
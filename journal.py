@@ -0,0 +1,160 @@
+"""journal.py
+
+    Append-only checkpoint journal, used to resume interrupted batches.
+"""
+
+import os
+import json
+import threading
+
+
+class Journal(object):
+    """Append-only journal of the state of the files of a batch.
+
+        Each file is recorded when dispatched (with its backup path if
+        processed in place), when its backup is made, then when completed
+        or failed.
+        Records are written as JSON lines and flushed immediately,
+        so that a killed process loses at most the record being written.
+    """
+
+    # File states
+    DISPATCHED = "dispatched"
+    BACKED_UP = "backedup"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    # Number of records before syncing to disk
+    SYNC_INTERVAL = 100
+
+
+    def __init__(self, path, append=False):
+        """Open a journal.
+
+        Parameters:
+        path: str
+            Path of the journal file
+        append: bool, optional
+            Append to the existing journal, else start a new one
+            (default: False)
+        """
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._file = open(path, "a" if append else "w")
+
+
+    def close(self):
+        """Sync and close the journal."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            self._file.close()
+            self._file = None
+
+
+    def dispatched(self, input_file, file_in, file_out, backup=None):
+        """Record a dispatched file.
+
+        Parameters:
+        input_file: str
+            Path of the original input file
+        file_in: str
+            Path of the file actually processed (backup if in place)
+        file_out: str
+            Path of the output file
+        backup: str, optional
+            Path of the backup file, if processed in place (default: None)
+        """
+        self._write({
+            "state": self.DISPATCHED,
+            "input": input_file,
+            "file": file_in,
+            "output": file_out,
+            "backup": backup
+        })
+
+
+    def backedup(self, file_in):
+        """Record the backup of a dispatched file as complete.
+
+        Parameters:
+        file_in: str
+            Path of the backup file (file actually processed)
+        """
+        self._write({"state": self.BACKED_UP, "file": file_in})
+
+
+    def completed(self, file_in):
+        """Record a successfully processed file."""
+        self._write({"state": self.COMPLETED, "file": file_in})
+
+
+    def failed(self, file_in, error):
+        """Record a failed file."""
+        self._write({"state": self.FAILED, "file": file_in, "error": error})
+
+
+    def _write(self, record):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.SYNC_INTERVAL:
+                self._sync()
+
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+
+    @classmethod
+    def replay(cls, path):
+        """Read a journal.
+
+        Incomplete records (interrupted writes) are ignored.
+
+        Parameters:
+        path: str
+            Path of the journal file
+
+        Returns:
+        dict: Last known state of each original input file,
+            as {input_file: {"state", "output", "backup", "backedup"}},
+            'backedup' being True once the backup is complete
+        """
+        entries = {}
+        if not os.path.isfile(path):
+            return entries
+
+        # Processed file => original input file
+        inputs = {}
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                state = record.get("state")
+                if state == cls.DISPATCHED:
+                    inputs[record["file"]] = record["input"]
+                    entries[record["input"]] = {
+                        "state": state,
+                        "output": record["output"],
+                        "backup": record["backup"],
+                        "backedup": False
+                    }
+
+                elif state == cls.BACKED_UP and record["file"] in inputs:
+                    entries[inputs[record["file"]]]["backedup"] = True
+
+                elif record.get("file") in inputs:
+                    entries[inputs[record["file"]]]["state"] = state
+
+        return entries
@@ -0,0 +1,249 @@
+"""manifest.py
+
+    Persistent record of processed files, used by the incremental mode.
+"""
+
+import os
+import sys
+import threading
+import hashlib
+import sqlite3
+
+if sys.version_info.major == 3:
+    import queue
+else:
+    import Queue as queue
+
+
+class Manifest(object):
+    """Manifest of processed files, stored in a SQLite database.
+
+        For each input file, the manifest records its size, modification
+        time and (optionally) content hash, as well as the output path and
+        the version of the process that generated it.
+        An input file whose entry still matches is up to date.
+        Content hashes of processed files are computed by background
+        threads, not to delay the thread recording them.
+    """
+
+    # File status
+    UNKNOWN = 0
+    OUTDATED = 1
+    UP_TO_DATE = 2
+
+    # Number of updates before committing to disk
+    COMMIT_INTERVAL = 1000
+    # Size of blocks read when hashing file contents
+    HASH_BLOCK_SIZE = 1048576
+    # Number of threads hashing the contents of processed files
+    HASH_THREADS = 2
+
+
+    def __init__(self, path, version, hash_content=False):
+        """Open (or create) a manifest.
+
+        Parameters:
+        path: str
+            Path of the manifest file
+        version: str
+            Version of the process (entries of other versions are outdated)
+        hash_content: bool, optional
+            Record and compare content hashes (default: False)
+        """
+        self.path = path
+        self.version = str(version)
+        self.hash_content = hash_content
+
+        # Accessed from the dispatching and result handling threads
+        self._lock = threading.Lock()
+        self._pending = 0
+        # Files to hash before recording them (see 'update')
+        self._hashes = queue.Queue()
+        self._hashers = []
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " input TEXT PRIMARY KEY,"
+            " size INTEGER,"
+            " mtime REAL,"
+            " hash TEXT,"
+            " output TEXT,"
+            " version TEXT"
+            ")"
+        )
+        self._connection.commit()
+
+
+    def close(self):
+        """Commit pending updates and close the manifest.
+
+        Waits for the content hashes being computed.
+        """
+        for hasher in self._hashers:
+            self._hashes.put(None)
+        for hasher in self._hashers:
+            hasher.join()
+        self._hashers = []
+
+        with self._lock:
+            if self._connection is None:
+                return
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+
+    def signature(self, file_path, with_hash=None):
+        """Get the signature of a file.
+
+        Parameters:
+        file_path: str
+            Path of the file
+        with_hash: bool, optional
+            Compute the content hash (default: 'hash_content')
+
+        Returns:
+        tuple: (size, mtime, hash), 'hash' being None if not computed
+        """
+        if with_hash is None:
+            with_hash = self.hash_content
+
+        stat = os.stat(file_path)
+        content_hash = self.hashfile(file_path) if with_hash else None
+        return (stat.st_size, stat.st_mtime, content_hash)
+
+
+    @classmethod
+    def hashfile(cls, file_path):
+        """Get the SHA-1 hash of the content of a file."""
+        sha = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            while True:
+                block = f.read(cls.HASH_BLOCK_SIZE)
+                if not block:
+                    break
+                sha.update(block)
+        return sha.hexdigest()
+
+
+    def status(self, input_path, output_path):
+        """Check if an input file is unchanged since it was processed.
+
+        Size and modification time are compared first. If they differ
+        and content hashes are enabled, the content hash is compared
+        (and the entry refreshed if the content is unchanged).
+
+        Parameters:
+        input_path: str
+            Path of the input file
+        output_path: str
+            Path of the output file
+
+        Returns:
+        int: UNKNOWN if the file was not processed to 'output_path',
+            OUTDATED if it changed since (or if the process version
+            changed or the output is missing), else UP_TO_DATE
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime, hash, output, version"
+                " FROM files WHERE input = ?",
+                (os.path.abspath(input_path),)
+            ).fetchone()
+
+        if row is None or row[3] != os.path.abspath(output_path):
+            return self.UNKNOWN
+
+        if row[4] != self.version or not os.path.isfile(output_path):
+            return self.OUTDATED
+
+        size, mtime, content_hash = self.signature(input_path, False)
+        if size == row[0] and mtime == row[1]:
+            return self.UP_TO_DATE
+
+        if not (self.hash_content and row[2] and size == row[0]):
+            return self.OUTDATED
+
+        content_hash = self.hashfile(input_path)
+        if content_hash != row[2]:
+            return self.OUTDATED
+
+        # Touched but unchanged
+        self.update(input_path, output_path, (size, mtime, content_hash))
+        return self.UP_TO_DATE
+
+
+    def update(self, input_path, output_path, signature=None):
+        """Record a processed file.
+
+        Parameters:
+        input_path: str
+            Path of the input file
+        output_path: str
+            Path of the output file
+        signature: tuple, optional
+            Signature of the input file, when it was processed (default:
+            computed from the file). If content hashes are enabled and
+            'signature' has none, the file is hashed by a background
+            thread, and only recorded if its size and modification time
+            still match (else it changed since it was processed).
+        """
+        if signature is None:
+            signature = self.signature(input_path, False)
+
+        if self.hash_content and signature[2] is None:
+            if not self._hashers:
+                self._starthashers()
+            self._hashes.put((input_path, output_path, signature))
+            return
+
+        self._record(input_path, output_path, signature)
+
+
+    def _starthashers(self):
+        for index in range(self.HASH_THREADS):
+            hasher = threading.Thread(target=self._hash)
+            hasher.daemon = True
+            hasher.start()
+            self._hashers.append(hasher)
+
+
+    def _hash(self):
+        while True:
+            item = self._hashes.get()
+            if item is None:
+                break
+
+            input_path, output_path, signature = item
+            try:
+                content_hash = self.hashfile(input_path)
+                size, mtime, unused = self.signature(input_path, False)
+            except (IOError, OSError):
+                continue
+            if (size, mtime) != tuple(signature[:2]):
+                # Changed since processed: outdated on the next run
+                continue
+            self._record(input_path, output_path, (size, mtime, content_hash))
+
+
+    def _record(self, input_path, output_path, signature):
+        size, mtime, content_hash = signature
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO files"
+                " (input, size, mtime, hash, output, version)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    os.path.abspath(input_path),
+                    size,
+                    mtime,
+                    content_hash,
+                    os.path.abspath(output_path),
+                    self.version
+                )
+            )
+            self._pending += 1
+            if self._pending >= self.COMMIT_INTERVAL:
+                self._connection.commit()
+                self._pending = 0
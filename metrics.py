@@ -0,0 +1,363 @@
+"""metrics.py
+
+    Per-file timing and throughput instrumentation.
+"""
+
+import os
+import time
+import json
+import heapq
+import threading
+from array import array
+from collections import namedtuple
+
+
+# Metrics of a single file
+# - worker: identifier of the worker that processed the file
+# - queue_wait: time between dispatch and start of processing (s)
+# - wall: processing wall time (s)
+# - cpu: processing CPU time (s), None if not measurable
+# - input_bytes, output_bytes: file sizes, None if not available
+FileMetrics = namedtuple(
+    "FileMetrics",
+    "worker queue_wait wall cpu input_bytes output_bytes"
+)
+
+
+if hasattr(time, "thread_time"):
+    thread_time = time.thread_time
+else:
+    # Python < 3.7
+    thread_time = None
+
+
+def getsize(file_path):
+    """Get the size of a file, or None if not available."""
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return None
+
+
+def timed(convert, submitted, worker, measure_cpu=True):
+    """Call a conversion function and measure it.
+
+    Parameters:
+    convert: callable
+        Function without arguments returning (file_in, file_out, error)
+    submitted: float
+        Time ('time.time') at which the file was dispatched
+    worker: str
+        Identifier of the worker
+    measure_cpu: bool, optional
+        Measure the CPU time of the calling thread (default: True)
+
+    Returns:
+    tuple: (result, FileMetrics)
+    """
+    measure_cpu = measure_cpu and thread_time is not None
+
+    start = time.time()
+    cpu_start = thread_time() if measure_cpu else None
+
+    result = convert()
+
+    cpu = thread_time() - cpu_start if measure_cpu else None
+    end = time.time()
+
+    return (result, filemetrics(result, submitted, start, end, cpu, worker))
+
+
+def timedbatch(convert, submitted, worker, measure_cpu=True):
+    """Call a batch conversion function and measure it.
+
+    The wall and CPU times of the batch are split evenly between its files.
+
+    Parameters:
+    convert: callable
+        Function without arguments returning a list of
+        (file_in, file_out, error)
+    submitted: float
+        Time ('time.time') at which the batch was dispatched
+    worker: str
+        Identifier of the worker
+    measure_cpu: bool, optional
+        Measure the CPU time of the calling thread (default: True)
+
+    Returns:
+    list of tuple: (result, FileMetrics) of each file
+    """
+    measure_cpu = measure_cpu and thread_time is not None
+
+    start = time.time()
+    cpu_start = thread_time() if measure_cpu else None
+
+    results = convert()
+
+    cpu = thread_time() - cpu_start if measure_cpu else None
+    end = time.time()
+
+    count = max(1, len(results))
+    wall = (end - start) / count
+    if cpu is not None:
+        cpu /= count
+
+    return [
+        (
+            result,
+            filemetrics(result, submitted, start, start + wall, cpu, worker)
+        )
+        for result in results
+    ]
+
+
+def filemetrics(result, submitted, start, end, cpu, worker):
+    """Build the metrics of a processed file."""
+    file_in, file_out, error = result
+    return FileMetrics(
+        worker,
+        max(0.0, start - submitted) if submitted else 0.0,
+        end - start,
+        cpu,
+        getsize(file_in),
+        None if error else getsize(file_out)
+    )
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Get percentiles (nearest rank) of a list of values.
+
+    Returns:
+    dict: {"p<point>": value}, plus "mean" and "max"
+    """
+    if not values:
+        return {}
+
+    values = sorted(values)
+    stats = {
+        "mean": sum(values) / len(values),
+        "max": values[-1]
+    }
+    for point in points:
+        index = max(0, int(round(point / 100.0 * len(values))) - 1)
+        stats["p{}".format(point)] = values[index]
+    return stats
+
+
+class Metrics(object):
+    """Aggregated metrics of a batch run.
+
+        Per-file values are aggregated as they are added, only the
+        latencies (for percentiles) and the slowest files are kept.
+    """
+
+    def __init__(self, slowest=10):
+        """
+        Parameters:
+        slowest: int, optional
+            Number of slowest files to keep (default: 10)
+        """
+        self.slowest = slowest
+
+        self._lock = threading.Lock()
+        self.start_time = None
+        self.end_time = None
+
+        self.files = 0
+        self.errors = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.cpu_time = 0.0
+        self.walls = array("d")
+        self.queue_waits = array("d")
+        # Worker => [files, busy time]
+        self.workers = {}
+        # Min heap of (wall, file)
+        self._slowest = []
+
+
+    def start(self):
+        self.start_time = time.time()
+        self.end_time = None
+
+
+    def stop(self):
+        self.end_time = time.time()
+
+
+    def add(self, result, file_metrics):
+        """Add the metrics of a processed file.
+
+        Parameters:
+        result: tuple
+            (file_in, file_out, error)
+        file_metrics: FileMetrics
+            Metrics of the file
+        """
+        with self._lock:
+            self.files += 1
+            if result[2]:
+                self.errors += 1
+
+            self.walls.append(file_metrics.wall)
+            self.queue_waits.append(file_metrics.queue_wait)
+            if file_metrics.cpu is not None:
+                self.cpu_time += file_metrics.cpu
+            if file_metrics.input_bytes:
+                self.input_bytes += file_metrics.input_bytes
+            if file_metrics.output_bytes:
+                self.output_bytes += file_metrics.output_bytes
+
+            worker = self.workers.setdefault(file_metrics.worker, [0, 0.0])
+            worker[0] += 1
+            worker[1] += file_metrics.wall
+
+            if self.slowest:
+                entry = (file_metrics.wall, result[0])
+                if len(self._slowest) < self.slowest:
+                    heapq.heappush(self._slowest, entry)
+                elif entry > self._slowest[0]:
+                    heapq.heapreplace(self._slowest, entry)
+
+
+    def summary(self):
+        """Get the summary of the run.
+
+        Returns:
+        dict: Summary (times in seconds, sizes in bytes)
+        """
+        with self._lock:
+            end_time = self.end_time or time.time()
+            elapsed = (end_time - self.start_time) if self.start_time else 0.0
+
+            workers = {}
+            for worker, (files, busy) in self.workers.items():
+                workers[str(worker)] = {
+                    "files": files,
+                    "busy": busy,
+                    "utilization": busy / elapsed if elapsed else 0.0
+                }
+
+            return {
+                "files": self.files,
+                "errors": self.errors,
+                "elapsed": elapsed,
+                "throughput": self.files / elapsed if elapsed else 0.0,
+                "input_bytes": self.input_bytes,
+                "output_bytes": self.output_bytes,
+                "input_bytes_per_second": (
+                    self.input_bytes / elapsed if elapsed else 0.0
+                ),
+                "cpu_time": self.cpu_time,
+                "latency": percentiles(self.walls),
+                "queue_wait": percentiles(self.queue_waits),
+                "workers": workers,
+                "slowest": [
+                    {"file": file_path, "wall": wall}
+                    for wall, file_path in sorted(self._slowest, reverse=True)
+                ]
+            }
+
+
+    def tojson(self):
+        """Get the summary as a JSON string."""
+        return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+
+    def toprometheus(self, prefix="file_batch"):
+        """Get the summary in the Prometheus text format.
+
+        Parameters:
+        prefix: str, optional
+            Prefix of the metric names (default: 'file_batch')
+        """
+        summary = self.summary()
+        lines = []
+
+        def metric(name, value, labels=None, help_text=None):
+            name = "{}_{}".format(prefix, name)
+            if help_text:
+                lines.append("# HELP {} {}".format(name, help_text))
+                lines.append("# TYPE {} gauge".format(name))
+            if labels:
+                name += "{" + ",".join(
+                    '{}="{}"'.format(key, str(value).replace('"', '\\"'))
+                    for key, value in sorted(labels.items())
+                ) + "}"
+            lines.append("{} {}".format(name, value))
+
+        metric("files", summary["files"], help_text="Processed files")
+        metric("errors", summary["errors"], help_text="Failed files")
+        metric("elapsed_seconds", summary["elapsed"], help_text="Run time")
+        metric(
+            "throughput_files_per_second",
+            summary["throughput"],
+            help_text="Processed files per second"
+        )
+        metric(
+            "input_bytes",
+            summary["input_bytes"],
+            help_text="Size of processed input files"
+        )
+        metric(
+            "output_bytes",
+            summary["output_bytes"],
+            help_text="Size of generated output files"
+        )
+        metric(
+            "cpu_seconds",
+            summary["cpu_time"],
+            help_text="CPU time spent in processing"
+        )
+
+        for name, help_text in (
+            ("latency", "Processing time per file"),
+            ("queue_wait", "Time between dispatch and processing per file")
+        ):
+            first = True
+            for stat, value in sorted(summary[name].items()):
+                metric(
+                    name + "_seconds",
+                    value,
+                    labels={"stat": stat},
+                    help_text=help_text if first else None
+                )
+                first = False
+
+        first = True
+        for worker, stats in sorted(summary["workers"].items()):
+            metric(
+                "worker_utilization",
+                stats["utilization"],
+                labels={"worker": worker},
+                help_text="Fraction of the run time spent processing"
+                if first else None
+            )
+            first = False
+
+        return "\n".join(lines) + "\n"
+
+
+    def export(self, path, export_format="json"):
+        """Write the summary to a file.
+
+        Written to a temporary file first, then renamed
+        (as expected by the Prometheus textfile collector).
+
+        Parameters:
+        path: str
+            Path of the file
+        export_format: str, optional
+            'json' or 'prometheus' (default: 'json')
+        """
+        if export_format == "prometheus":
+            content = self.toprometheus()
+        else:
+            content = self.tojson()
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(content)
+        if os.path.exists(path) and os.name == "nt":
+            os.remove(path)
+        os.rename(temp_path, path)
@@ -0,0 +1,61 @@
+"""plan.py
+
+    Serialization of output path plans.
+"""
+
+import json
+
+
+# Version of the plan file format
+PLAN_FORMAT = 1
+
+
+def saveplan(path, config, plan):
+    """Save a plan to a file.
+
+    The file is in JSON lines format: the first line holds the
+    configuration the plan was computed with, followed by one
+    [input file, output file] line per file.
+
+    Parameters:
+    path: str
+        Path of the plan file
+    config: dict
+        Configuration of the plan (to validate it when loading)
+    plan: iterable
+        (input file, output file) pairs
+    """
+    with open(path, "w") as f:
+        f.write(json.dumps({"format": PLAN_FORMAT, "config": config}))
+        f.write("\n")
+        for pair in plan:
+            f.write(json.dumps(pair))
+            f.write("\n")
+
+
+def loadplan(path, config):
+    """Load a plan from a file.
+
+    Parameters:
+    path: str
+        Path of the plan file
+    config: dict
+        Expected configuration
+
+    Returns:
+    list: (input file, output file) pairs,
+        or None if the plan was computed with another configuration
+
+    Raises:
+    ValueError
+        If the file is not a valid plan file
+    """
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if (
+            header.get("format") != PLAN_FORMAT
+            or header.get("config") != config
+        ):
+            return None
+
+        return [tuple(json.loads(line)) for line in f if line.strip()]
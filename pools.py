@@ -0,0 +1,233 @@
+"""pools.py
+
+    Pools of workers of the 'thread' and 'process' executors, reusable
+    for several runs (see 'AbstractFileBatch.open').
+"""
+
+import sys
+import threading
+import multiprocessing
+
+if sys.version_info.major == 3:
+    import queue
+else:
+    import Queue as queue
+
+import convert_process
+
+
+class ThreadPool(object):
+    """Conversion threads fed by a shared queue.
+
+        Threads of a shrunk pool stop before taking their next job
+        ('size' counts them until they exit). Threads of a stopped pool
+        ('resize(0)') stop once the jobs already queued are processed.
+        Threads processing a file for too long are abandoned (see
+        'timeouts.Tracker') and replaced.
+    """
+
+    def __init__(self, thread_class, tracker=None):
+        """Create an empty pool (see 'resize').
+
+        Parameters:
+        thread_class: type
+            'ConvertThread' or 'BatchConvertThread'
+        tracker: Tracker, optional
+            Files being processed, for timeouts and speculative execution
+            (default: None)
+        """
+        self.thread_class = thread_class
+        self.tracker = tracker
+        self.in_queue = queue.Queue()
+        self.out_queue = queue.Queue()
+        self.threads = []
+        # Number of threads requested
+        self.target = 0
+
+        self._lock = threading.Lock()
+        # Number of threads to stop before their next job
+        self._stops = 0
+
+
+    @property
+    def size(self):
+        """Number of running threads (including the stopping ones)."""
+        return len([
+            thread
+            for thread in self.threads
+            if thread.is_alive() and not thread.abandoned
+        ])
+
+
+    def resize(self, number):
+        """Start or stop threads.
+
+        Parameters:
+        number: int
+            Number of threads of the pool
+        """
+        with self._lock:
+            # Threads stopped or abandoned since the last resize
+            self.threads = [
+                thread
+                for thread in self.threads
+                if thread.is_alive() and not thread.abandoned
+            ]
+            running = len([
+                thread for thread in self.threads if not thread.stopped
+            ]) - self._stops
+
+            if number == 0:
+                # Stop requests queued after the jobs
+                for i in range(running + self._stops):
+                    self.in_queue.put(None)
+                self._stops = 0
+            elif number < running:
+                self._stops += running - number
+            else:
+                # Pending stops cancelled first
+                cancelled = min(self._stops, number - running)
+                self._stops -= cancelled
+                for i in range(number - running - cancelled):
+                    self._start()
+            self.target = number
+
+
+    def _stopping(self, thread):
+        # Called by the threads before taking a job
+        with self._lock:
+            if not self._stops:
+                return False
+            self._stops -= 1
+            thread.stopped = True
+            return True
+
+
+    def replace(self, thread):
+        """Replace an abandoned thread.
+
+        Parameters:
+        thread: ConvertThread
+            Thread abandoned by the tracker
+        """
+        if thread in self.threads:
+            self.threads.remove(thread)
+        self._start()
+
+
+    def _start(self):
+        thread = self.thread_class(
+            self.in_queue,
+            self.out_queue,
+            self.tracker,
+            self._stopping
+        )
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+
+    def join(self, tick=None):
+        """Wait for the threads stopped by 'resize' (not the abandoned ones).
+
+        Parameters:
+        tick: callable, optional
+            Called every second while waiting (default: None)
+        """
+        while True:
+            running = [
+                thread
+                for thread in self.threads
+                if thread.is_alive() and not thread.abandoned
+            ]
+            if not running:
+                break
+            running[0].join(1.0)
+            if tick is not None:
+                tick()
+        self.threads = []
+
+
+    def close(self):
+        """Stop the threads once the queued jobs are processed."""
+        self.resize(0)
+        self.join()
+
+
+class ProcessPool(object):
+    """Worker processes, with the timed out files of the workers.
+
+        The batch instance is shipped to the workers once, when the pool
+        is created: later changes of its options are not seen by the
+        workers. Results of the timed out files are passed to
+        'onexpired', set by the run using the pool.
+    """
+
+    def __init__(self, number, class_instance, timeout=False):
+        """Start the worker processes.
+
+        Parameters:
+        number: int
+            Number of worker processes
+        class_instance: AbstractFileBatch
+            Batch instance whose 'processfile' is called
+        timeout: bool, optional
+            Report the files timed out in the workers (default: False)
+        """
+        # Set if a worker exited (its tasks never complete)
+        self.exited = False
+        # Called with the results of the timed out files
+        self.onexpired = None
+
+        # Results of the files timed out in the workers
+        # (workers exit after putting them)
+        self._expired = multiprocessing.Queue() if timeout else None
+
+        # The instance is pickled once per worker process,
+        # not once per file
+        self.pool = multiprocessing.Pool(
+            number,
+            initializer=convert_process.initworker,
+            initargs=(class_instance, self._expired)
+        )
+
+        self._forwarder = None
+        if self._expired is not None:
+            self._forwarder = threading.Thread(target=self._forward)
+            self._forwarder.daemon = True
+            self._forwarder.start()
+
+
+    def _forward(self):
+        while True:
+            item = self._expired.get()
+            if item is None:
+                break
+            self.exited = True
+            if self.onexpired is not None:
+                self.onexpired(item)
+
+
+    def apply_async(self, function, args, **kwargs):
+        """Submit a task (see 'multiprocessing.Pool.apply_async')."""
+        return self.pool.apply_async(function, args, **kwargs)
+
+
+    def close(self, terminate=False):
+        """Stop the worker processes.
+
+        Parameters:
+        terminate: bool, optional
+            Do not wait for the submitted tasks (default: False)
+        """
+        if terminate or self.exited:
+            # Tasks of exited workers never complete:
+            # the pool could not be joined
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+
+        if self._forwarder is not None:
+            self._expired.put(None)
+            self._forwarder.join()
@@ -0,0 +1,104 @@
+"""retry.py
+
+    Retries of failed files, with exponential backoff.
+"""
+
+import os
+import time
+import errno
+import random
+import socket
+
+
+# Errors of transient conditions
+# (EACCES: file locked by another process on Windows, else a permanent
+# permission error)
+RETRYABLE_ERRNOS = frozenset(
+    getattr(errno, name)
+    for name in (
+        "EAGAIN", "EBUSY", "EINTR", "ETIMEDOUT",
+        "ECONNREFUSED", "ECONNRESET", "ECONNABORTED", "EPIPE"
+    ) + (("EACCES",) if os.name == "nt" else ())
+    if hasattr(errno, name)
+)
+
+
+class RetryableError(Exception):
+    """Error of a file that can succeed if processed again.
+
+        Can be raised by 'processfile' to request a retry of the file,
+        regardless of the retry classification.
+    """
+    pass
+
+
+def isretryable(error):
+    """Default classification of retryable errors.
+
+    Parameters:
+    error: Exception
+        Error raised while processing a file
+
+    Returns:
+    bool: True for 'RetryableError', timeouts, and 'OSError' of
+        transient conditions ('RETRYABLE_ERRNOS')
+    """
+    if isinstance(error, (RetryableError, socket.timeout)):
+        return True
+    return (
+        isinstance(error, EnvironmentError)
+        and error.errno in RETRYABLE_ERRNOS
+    )
+
+
+def backoffdelay(attempt, delay, max_delay):
+    """Get the delay before a retry.
+
+    Exponential backoff, with jitter (so that files failing together
+    are not retried together).
+
+    Parameters:
+    attempt: int
+        Number of the retry (from 1)
+    delay: float
+        Delay before the first retry (s)
+    max_delay: float
+        Maximum delay (s)
+
+    Returns:
+    float: Delay (s), between half and all of the exponential delay
+    """
+    delay = min(max_delay, delay * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def withretry(process, retries, delay, classify=isretryable, max_delay=60.0):
+    """Retry a process function failing with a retryable error.
+
+    Parameters:
+    process: callable
+        Function to retry (any arguments)
+    retries: int
+        Maximum number of retries
+    delay: float
+        Delay before the first retry (s), doubled for each retry
+    classify: callable, optional
+        Called as 'classify(error)', returning True if the error is
+        retryable (default: 'isretryable')
+    max_delay: float, optional
+        Maximum delay between retries (s) (default: 60)
+
+    Returns:
+    callable: Function called as 'process'
+    """
+    def processretried(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return process(*args, **kwargs)
+            except Exception as e:
+                if attempt >= retries or not classify(e):
+                    raise
+                attempt += 1
+                time.sleep(backoffdelay(attempt, delay, max_delay))
+    return processretried
@@ -0,0 +1,123 @@
+"""shard.py
+
+    Deterministic sharding of batches, and merging of shard reports.
+"""
+
+import os
+import json
+import heapq
+import hashlib
+
+
+def parseshard(value):
+    """Parse a shard specification.
+
+    Parameters:
+    value: str
+        'INDEX/COUNT', 'INDEX' from 1 to 'COUNT'
+
+    Returns:
+    tuple: (index, count)
+
+    Raises:
+    ValueError
+        If the specification is invalid
+    """
+    try:
+        index, count = [int(part) for part in value.split("/")]
+    except ValueError:
+        raise ValueError(
+            "Invalid shard '{}' (expected 'INDEX/COUNT')".format(value)
+        )
+
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError((
+            "Invalid shard '{}' (index must be between 1 and {})"
+        ).format(value, count))
+
+    return (index, count)
+
+
+def shardof(relative_path, count):
+    """Get the shard of a file.
+
+    The shard only depends on the path (the same on all nodes and
+    platforms, unlike 'hash').
+
+    Parameters:
+    relative_path: str
+        Path of the file, relative to the input directory
+    count: int
+        Number of shards
+
+    Returns:
+    int: Shard of the file, from 1 to 'count'
+    """
+    key = relative_path.replace(os.sep, "/").encode("utf-8")
+    digest = hashlib.md5(key).hexdigest()
+    return int(digest[:16], 16) % count + 1
+
+
+def mergesummaries(summaries, names=None, slowest=10):
+    """Merge the metrics summaries of the shards of a batch.
+
+    Shards are assumed to run in parallel: the elapsed time is the one
+    of the longest shard. Latency and queue wait means are exact, other
+    statistics (percentiles) are the maximum of the shards.
+
+    Parameters:
+    summaries: list of dict
+        Summaries, as exported by 'Metrics.tojson'
+    names: list of str, optional
+        Names of the shards, prefixed to worker names
+        (default: None, shard numbers)
+    slowest: int, optional
+        Number of slowest files to keep (default: 10)
+
+    Returns:
+    dict: Merged summary
+    """
+    if names is None:
+        names = [str(index + 1) for index in range(len(summaries))]
+
+    merged = {"shards": len(summaries)}
+    for key in ("files", "errors", "input_bytes", "output_bytes", "cpu_time"):
+        merged[key] = sum(summary[key] for summary in summaries)
+
+    elapsed = max([summary["elapsed"] for summary in summaries] or [0.0])
+    merged["elapsed"] = elapsed
+    merged["throughput"] = merged["files"] / elapsed if elapsed else 0.0
+    merged["input_bytes_per_second"] = (
+        merged["input_bytes"] / elapsed if elapsed else 0.0
+    )
+
+    for key in ("latency", "queue_wait"):
+        stats = {}
+        for summary in summaries:
+            for stat, value in summary[key].items():
+                if stat == "mean":
+                    value *= summary["files"]
+                    stats[stat] = stats.get(stat, 0.0) + value
+                else:
+                    stats[stat] = max(stats.get(stat, value), value)
+        if "mean" in stats and merged["files"]:
+            stats["mean"] /= merged["files"]
+        merged[key] = stats
+
+    merged["workers"] = {}
+    for name, summary in zip(names, summaries):
+        for worker, stats in summary["workers"].items():
+            merged["workers"]["{}/{}".format(name, worker)] = stats
+
+    merged["slowest"] = heapq.nlargest(
+        slowest,
+        [entry for summary in summaries for entry in summary["slowest"]],
+        key=lambda entry: entry["wall"]
+    )
+    return merged
+
+
+def loadsummary(path):
+    """Load a metrics summary exported in JSON format."""
+    with open(path) as f:
+        return json.load(f)
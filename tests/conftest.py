@@ -0,0 +1,37 @@
+"""conftest.py
+
+    Fixtures shared by the tests of the Abstract File Batch.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Modules of the repository are not packaged
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+@pytest.fixture
+def maketree(tmp_path):
+    """Create input files.
+
+    Returns:
+    callable: Called as 'maketree(names, directory="in")', 'names' being
+        relative paths (or a number of 'fN.txt' files), returning the
+        path of the directory
+    """
+    def make(names=5, directory="in"):
+        root = tmp_path / directory
+        root.mkdir(exist_ok=True)
+        if isinstance(names, int):
+            names = ["f{}.txt".format(index) for index in range(names)]
+        for name in names:
+            path = root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(u"data of {}\n".format(name))
+        return str(root)
+    return make
@@ -0,0 +1,106 @@
+"""Tests of the batches of jobs ('processbatch', 'batchSize', 'batchWait')."""
+
+import os
+import time
+import threading
+
+import pytest
+
+import batching
+from batching import iterbatches
+from abstract_file_batch import AbstractFileBatch
+
+
+class BatchCopy(AbstractFileBatch):
+    """Copy files by batches, failing on 'bad.txt'."""
+
+    HANDLE_SIGNALS = False
+
+    def processbatch(self, pairs):
+        self.sizes.append(len(pairs))
+        errors = []
+        for file_in, file_out in pairs:
+            if os.path.basename(file_in) == "bad.txt":
+                errors.append("invalid file")
+                continue
+            with open(file_in) as f_in, open(file_out, "w") as f_out:
+                f_out.write(f_in.read())
+            errors.append(None)
+        return errors
+
+
+def source(pulled, closed, number=100, delay=0.0):
+    try:
+        for index in range(number):
+            time.sleep(delay)
+            pulled.append(threading.current_thread().name)
+            yield index
+    finally:
+        closed.append(True)
+
+
+def test_batches():
+    assert list(iterbatches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_partial_batches_after_wait():
+    pulled, closed = [], []
+    batches = list(iterbatches(source(pulled, closed, 3, 0.2), 10, 0.05))
+    assert sorted(sum(batches, [])) == [0, 1, 2]
+    assert len(batches) == 3
+    assert closed
+
+
+def test_feeder_stopped_when_closed():
+    pulled, closed = [], []
+    batches = iterbatches(source(pulled, closed), 2, wait=0.5)
+    assert next(batches) == [0, 1]
+
+    batches.close()
+    # Feeder joined, jobs closed
+    assert closed
+    number = len(pulled)
+    time.sleep(2 * batching.STOP_POLL_INTERVAL)
+    assert len(pulled) == number < 10
+
+
+def test_feeder_errors_raised():
+    def failing():
+        yield 1
+        raise ValueError("invalid job")
+
+    with pytest.raises(ValueError):
+        list(iterbatches(failing(), 2, wait=0.1))
+
+
+@pytest.mark.parametrize("wait", [None, "0.05"])
+def test_batch_results(maketree, tmp_path, wait):
+    input_dir = maketree(["a.txt", "b.txt", "bad.txt", "c.txt", "d.txt"])
+    args = [
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out"),
+        "--batchSize", "2",
+        "--numberThreads", "1"
+    ]
+    if wait:
+        args += ["--batchWait", wait]
+    batch = BatchCopy(args)
+    batch.sizes = []
+
+    assert not batch.run()
+    assert sum(batch.sizes) == 5
+    assert max(batch.sizes) <= 2
+    errors = dict(
+        (os.path.basename(file_in), error)
+        for file_in, file_out, error in batch.results
+    )
+    assert errors == {
+        "a.txt": None,
+        "b.txt": None,
+        "bad.txt": "invalid file",
+        "c.txt": None,
+        "d.txt": None
+    }
+    assert sorted(os.listdir(str(tmp_path / "out"))) == [
+        "a.txt", "b.txt", "c.txt", "d.txt"
+    ]
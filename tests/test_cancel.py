@@ -0,0 +1,125 @@
+"""Tests of the cancellation of runs ('cancel', 'maxErrors', signals)."""
+
+import os
+import signal
+
+import pytest
+
+from abstract_file_batch import AbstractFileBatch
+
+
+class FailingBatch(AbstractFileBatch):
+    """Copy files, failing on the files named in 'failing'."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        name = os.path.basename(srcFilePath)
+        if name in self.failing:
+            raise ValueError("invalid file")
+        with open(srcFilePath) as f_in, open(destFilePath, "w") as f_out:
+            f_out.write(f_in.read())
+        if name == self.last:
+            self.stop()
+
+    def stop(self):
+        self.cancel("test")
+
+
+def makebatch(input_dir, output_dir, options=(), failing=(), last=None):
+    batch = FailingBatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--numberThreads", "1"
+    ] + list(options))
+    batch.failing = set(failing)
+    batch.last = last
+    return batch
+
+
+def test_cancel_completes_files_in_flight(maketree, tmp_path):
+    input_dir = maketree(20)
+    output_dir = str(tmp_path / "out")
+    batch = makebatch(input_dir, output_dir, last="f2.txt")
+
+    assert not batch.run()
+    assert batch.iscancelled()
+    assert 3 <= len(batch.results) < 20
+    for file_in, file_out, error in batch.results:
+        assert error is None
+        assert os.path.isfile(file_out)
+    assert len(os.listdir(output_dir)) == len(batch.results)
+
+    # Not cancelled anymore on the next run
+    batch.last = None
+    batch.run()
+    assert not batch.iscancelled()
+
+
+def test_max_errors(maketree, tmp_path):
+    input_dir = maketree(20)
+    batch = makebatch(
+        input_dir,
+        str(tmp_path / "out"),
+        ["--maxErrors", "2"],
+        failing=["f{}.txt".format(index) for index in range(20)]
+    )
+
+    assert not batch.run()
+    assert batch.iscancelled()
+    assert 2 <= batch.metrics.errors < 20
+
+
+def test_max_error_rate(maketree, tmp_path, monkeypatch):
+    monkeypatch.setattr(FailingBatch, "ERROR_RATE_MIN_FILES", 4)
+    input_dir = maketree(20)
+    failing = ["f{}.txt".format(index) for index in range(0, 20, 2)]
+
+    batch = makebatch(
+        input_dir,
+        str(tmp_path / "out"),
+        ["--maxErrorRate", "0.25"],
+        failing=failing
+    )
+    assert not batch.run()
+    assert batch.iscancelled()
+    assert len(batch.results) < 20
+
+    # Under the error budget: all the files processed
+    batch = makebatch(
+        input_dir,
+        str(tmp_path / "out2"),
+        ["--maxErrorRate", "0.6"],
+        failing=failing
+    )
+    assert not batch.run()
+    assert not batch.iscancelled()
+    assert len(batch.results) == 20
+
+
+@pytest.mark.parametrize("option", [
+    ["--maxErrors", "0"],
+    ["--maxErrorRate", "1"]
+])
+def test_invalid_error_budget(maketree, tmp_path, option):
+    with pytest.raises(ValueError):
+        makebatch(maketree(), str(tmp_path / "out"), option)
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGTERM"), reason="requires SIGTERM")
+def test_signal_cancels_run(maketree, tmp_path, monkeypatch):
+    monkeypatch.setattr(FailingBatch, "HANDLE_SIGNALS", True)
+    monkeypatch.setattr(
+        FailingBatch,
+        "stop",
+        lambda self: os.kill(os.getpid(), signal.SIGTERM)
+    )
+    previous = signal.getsignal(signal.SIGTERM)
+    input_dir = maketree(20)
+    batch = makebatch(input_dir, str(tmp_path / "out"), last="f2.txt")
+
+    assert not batch.run()
+    assert batch.iscancelled()
+    assert len(batch.results) < 20
+    # Handler restored
+    assert signal.getsignal(signal.SIGTERM) == previous
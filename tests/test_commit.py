@@ -0,0 +1,167 @@
+"""Tests of the commit of outputs ('atomicOutput', 'backupStrategy')."""
+
+import os
+
+import pytest
+
+import commit
+from abstract_file_batch import AbstractFileBatch
+
+
+class UpperBatch(AbstractFileBatch):
+    """Write the contents of the files in upper case, failing on 'bad.txt'.
+
+    Outputs are temporary files ending with the output name.
+    """
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        with open(srcFilePath) as f_in:
+            data = f_in.read()
+        with open(destFilePath, "w") as f_out:
+            # Partial output
+            f_out.write(data.upper())
+            if destFilePath.endswith("bad.txt"):
+                raise ValueError("invalid file")
+
+
+class UpperBatchByBatch(AbstractFileBatch):
+    """Write the files in upper case by batches of files."""
+
+    HANDLE_SIGNALS = False
+
+    # Number of errors returned for the batches (all if None)
+    ERRORS = None
+
+    def processbatch(self, pairs):
+        errors = []
+        for file_in, file_out in pairs:
+            with open(file_in) as f_in, open(file_out, "w") as f_out:
+                f_out.write(f_in.read().upper())
+            if file_out.endswith("bad.txt"):
+                errors.append("invalid file")
+            else:
+                errors.append(None)
+        return errors[:self.ERRORS]
+
+
+def geterrors(batch):
+    # By output (inputs are backups when processed in place)
+    return dict(
+        (os.path.basename(file_out), error)
+        for file_in, file_out, error in batch.results
+    )
+
+
+def listfiles(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_atomic_output(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "bad.txt"])
+    output_dir = str(tmp_path / "out")
+    batch = UpperBatch(["--inputDir", input_dir, "--outputDir", output_dir])
+
+    assert not batch.run()
+    assert geterrors(batch) == {"a.txt": None, "bad.txt": "invalid file"}
+    # No partial output nor temporary file left
+    assert listfiles(output_dir) == ["a.txt"]
+    with open(os.path.join(output_dir, "a.txt")) as f:
+        assert f.read() == "DATA OF A.TXT\n"
+
+
+def test_non_atomic_output(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "bad.txt"])
+    output_dir = str(tmp_path / "out")
+    batch = UpperBatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--atomicOutput"
+    ])
+
+    assert not batch.run()
+    assert geterrors(batch) == {"a.txt": None, "bad.txt": "invalid file"}
+    # Partial output written in place
+    assert listfiles(output_dir) == ["a.txt", "bad.txt"]
+
+
+@pytest.mark.parametrize("strategy", ["rename", "hardlink", "copy", "none"])
+@pytest.mark.parametrize("no_backup", [False, True])
+def test_backup_strategies(maketree, strategy, no_backup):
+    input_dir = maketree(["a.txt", "b.txt", "bad.txt"])
+    args = ["--inputDir", input_dir, "--backupStrategy", strategy]
+    if no_backup:
+        args.append("--noBackup")
+    batch = UpperBatch(args)
+
+    assert not batch.run()
+    assert geterrors(batch) == {
+        "a.txt": None,
+        "b.txt": None,
+        "bad.txt": "invalid file"
+    }
+    for name in ("a.txt", "b.txt"):
+        with open(os.path.join(input_dir, name)) as f:
+            assert f.read() == "DATA OF {}\n".format(name.upper())
+
+    files = listfiles(input_dir)
+    assert not [name for name in files if commit.istemp(name)]
+    backups = dict(
+        (name.split(".bak-")[0], name) for name in files if ".bak-" in name
+    )
+    # Backups of failed files kept (original contents), even if 'noBackup'
+    if strategy == "none":
+        expected = []
+    elif no_backup:
+        expected = ["bad.txt"]
+    else:
+        expected = ["a.txt", "b.txt", "bad.txt"]
+    assert sorted(backups) == sorted(expected)
+    for name, backup in backups.items():
+        with open(os.path.join(input_dir, backup)) as f:
+            assert f.read() == "data of {}\n".format(name)
+
+    # Failed output discarded: input kept in place unless renamed
+    if strategy == "rename":
+        assert "bad.txt" not in files
+    else:
+        with open(os.path.join(input_dir, "bad.txt")) as f:
+            assert f.read() == "data of bad.txt\n"
+
+
+def test_no_backup_strategy_requires_atomic_output(maketree):
+    with pytest.raises(ValueError):
+        UpperBatch([
+            "--inputDir", maketree(),
+            "--backupStrategy", "none",
+            "--atomicOutput"
+        ])
+
+
+@pytest.mark.parametrize("errors", [None, 1])
+def test_atomic_batches(maketree, tmp_path, errors):
+    input_dir = maketree(["a.txt", "b.txt", "bad.txt"])
+    output_dir = str(tmp_path / "out")
+
+    class Batch(UpperBatchByBatch):
+        ERRORS = errors
+
+    batch = Batch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--batchSize", "3",
+        "--numberThreads", "1"
+    ])
+
+    assert not batch.run()
+    results = geterrors(batch)
+    if errors is None:
+        assert results == {"a.txt": None, "b.txt": None, "bad.txt": "invalid file"}
+        assert listfiles(output_dir) == ["a.txt", "b.txt"]
+    else:
+        # Wrong number of errors => error for every file, nothing committed
+        assert sorted(results) == ["a.txt", "b.txt", "bad.txt"]
+        assert all(results.values())
+        assert len(set(results.values())) == 1
+        assert listfiles(output_dir) == []
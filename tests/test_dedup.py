@@ -0,0 +1,156 @@
+"""Tests of the deduplication of identical input files ('dedup')."""
+
+import os
+import threading
+
+import pytest
+
+import commit
+import dedup
+from abstract_file_batch import AbstractFileBatch
+
+
+class UpperBatch(AbstractFileBatch):
+    """Convert files to upper case, recording the processed files."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        with self.lock:
+            self.processed.append(srcFilePath)
+            if self.backups is None:
+                # Backups made when the first file is processed
+                self.backups = len([
+                    name
+                    for name in os.listdir(os.path.dirname(srcFilePath))
+                    if ".bak-" in name
+                ])
+        with open(srcFilePath) as f:
+            data = f.read()
+        if data.startswith("fail"):
+            raise ValueError("invalid file")
+        with open(destFilePath, "w") as f:
+            f.write(data.upper())
+
+
+def makebatch(args):
+    batch = UpperBatch(args + ["--dedup", "--numberThreads", "1"])
+    batch.lock = threading.Lock()
+    batch.processed = []
+    batch.backups = None
+    return batch
+
+
+@pytest.fixture
+def input_dir(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "c.txt"])
+    for name in ("b.txt", os.path.join("sub", "d.txt")):
+        path = os.path.join(input_dir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write("data of a.txt\n")
+    return input_dir
+
+
+def outputs(batch):
+    contents = {}
+    for file_in, file_out, error in batch.results:
+        assert error is None
+        with open(file_out) as f:
+            contents[os.path.basename(file_out)] = f.read()
+    return contents
+
+
+@pytest.mark.parametrize("policy", ["copy", "hardlink"])
+def test_duplicates_processed_once(input_dir, tmp_path, policy):
+    output_dir = str(tmp_path / "out")
+    batch = makebatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--dedupPolicy", policy
+    ])
+
+    assert batch.run()
+    # A single file of the group processed (in the order of the listing)
+    processed = set(os.path.basename(path) for path in batch.processed)
+    assert len(batch.processed) == 2
+    assert "c.txt" in processed
+    assert outputs(batch) == {
+        "a.txt": "DATA OF A.TXT\n",
+        "b.txt": "DATA OF A.TXT\n",
+        "c.txt": "DATA OF C.TXT\n",
+        "d.txt": "DATA OF A.TXT\n"
+    }
+    assert os.path.samefile(
+        os.path.join(output_dir, "a.txt"),
+        os.path.join(output_dir, "sub", "d.txt")
+    ) == (policy == "hardlink")
+    # Outputs committed atomically
+    assert not [
+        name for name in os.listdir(output_dir) if commit.istemp(name)
+    ]
+
+
+def test_failed_duplicates(input_dir, tmp_path):
+    with open(os.path.join(input_dir, "a.txt"), "w") as f:
+        f.write("fail\n")
+    with open(os.path.join(input_dir, "b.txt"), "w") as f:
+        f.write("fail\n")
+    batch = makebatch([
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out")
+    ])
+
+    assert not batch.run()
+    errors = dict(
+        (os.path.basename(file_in), error)
+        for file_in, file_out, error in batch.results
+    )
+    assert sorted([errors["a.txt"][:13], errors["b.txt"][:13]]) == [
+        "Duplicate of ",
+        "invalid file"
+    ]
+    assert errors["c.txt"] is None
+    assert errors["d.txt"] is None
+
+
+def test_in_place(maketree, tmp_path):
+    input_dir = maketree(["f{}.txt".format(index) for index in range(10)])
+    for index in range(10):
+        with open(os.path.join(input_dir, "f{}.txt".format(index)), "w") as f:
+            f.write("data {}\n".format(index % 2))
+    batch = makebatch([
+        "--inputDir", input_dir,
+        "--noBackup",
+        "--maxPending", "1"
+    ])
+
+    assert batch.run()
+    assert len(batch.processed) == 2
+    assert len(batch.results) == 10
+    # Backups made as the jobs are dispatched
+    assert batch.backups < 10
+    assert sorted(os.listdir(input_dir)) == sorted(
+        "f{}.txt".format(index) for index in range(10)
+    )
+    for index in range(10):
+        with open(os.path.join(input_dir, "f{}.txt".format(index))) as f:
+            assert f.read() == "DATA {}\n".format(index % 2)
+
+
+def test_link_atomic(tmp_path, monkeypatch):
+    source = str(tmp_path / "source.txt")
+    target = str(tmp_path / "target.txt")
+    with open(source, "w") as f:
+        f.write("data")
+
+    def interrupted(source, target):
+        with open(target, "w") as f:
+            f.write("da")
+        raise IOError("No space left on device")
+
+    monkeypatch.setattr(dedup.shutil, "copyfile", interrupted)
+    with pytest.raises(IOError):
+        dedup.linkfile(source, target, "copy", atomic=True)
+    assert os.listdir(str(tmp_path)) == ["source.txt"]
@@ -0,0 +1,108 @@
+"""Tests of the selection of input files ('filters')."""
+
+import os
+import time
+
+import pytest
+
+from filters import FileFilter, parsesize, parsetime
+from abstract_file_batch import AbstractFileBatch
+
+
+class NullBatch(AbstractFileBatch):
+    """Process nothing."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        pass
+
+
+def test_extensions():
+    file_filter = FileFilter(extensions=["txt", ".MD"])
+    assert file_filter.matchname("a.TXT")
+    assert file_filter.matchname("sub/b.md")
+    assert not file_filter.matchname("c.txt.gz")
+
+
+def test_globs_and_regexes():
+    file_filter = FileFilter(
+        include=["*.txt", "docs/**"],
+        exclude=["**/tmp/*"],
+        exclude_regex=[r"_draft\b"]
+    )
+    assert file_filter.matchname("a.txt")
+    assert file_filter.matchname("sub/b.txt")
+    assert file_filter.matchname("docs/x/y.md")
+    assert not file_filter.matchname("c.md")
+    assert not file_filter.matchname("sub/tmp/d.txt")
+    assert not file_filter.matchname("e_draft.txt")
+
+
+def test_ignored_dirs():
+    file_filter = FileFilter(ignored_dirs=[".git", "build/cache"])
+    assert not file_filter.matchdir(".git")
+    assert not file_filter.matchdir("sub/.git")
+    assert not file_filter.matchdir("build/cache")
+    assert file_filter.matchdir("sub/build/cache")
+    assert not file_filter.matchparents("sub/.git/config")
+    assert file_filter.matchparents("sub/config")
+
+
+def test_invalid_regex():
+    with pytest.raises(ValueError):
+        FileFilter(include_regex=["("])
+
+
+def test_parse_bounds():
+    assert parsesize("512") == 512
+    assert parsesize("10K") == 10240
+    assert parsesize("1.5GB") == int(1.5 * 1024 ** 3)
+    with pytest.raises(ValueError):
+        parsesize("ten")
+    assert parsetime("1000.5") == 1000.5
+    assert parsetime("2020-01-02") == time.mktime((2020, 1, 2, 0, 0, 0, 0, 0, -1))
+    with pytest.raises(ValueError):
+        parsetime("yesterday")
+
+
+def test_batch_selection(maketree, tmp_path):
+    input_dir = maketree([
+        "a.txt",
+        "big.txt",
+        "skip/b.txt",
+        "sub/c.txt",
+        "sub/d.md"
+    ])
+    with open(os.path.join(input_dir, "big.txt"), "w") as f:
+        f.write("x" * 2048)
+
+    batch = NullBatch([
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out"),
+        "--extensions", "txt",
+        "--ignoreDirs", "skip",
+        "--maxFileSize", "1K"
+    ])
+    assert sorted(batch.inputFiles) == [
+        os.path.join(input_dir, "a.txt"),
+        os.path.join(input_dir, "sub", "c.txt")
+    ]
+
+
+def test_regex_inline_flags():
+    file_filter = FileFilter(include_regex=["(?i)readme", r"\.txt$"])
+    assert file_filter.matchname("sub/README.md")
+    assert file_filter.matchname("a.txt")
+    assert not file_filter.matchname("a.md")
+
+
+def test_regex_backreferences():
+    file_filter = FileFilter(
+        include=["*.md"],
+        include_regex=[r"(a)x", r"(b)\1", r"(?P<x>[0-9])(?P=x)"]
+    )
+    assert file_filter.matchname("abb.txt")
+    assert file_filter.matchname("a11.txt")
+    assert not file_filter.matchname("ab.txt")
+    assert file_filter.matchname("ab.md")
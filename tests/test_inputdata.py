@@ -0,0 +1,99 @@
+"""Tests of the contents of input files passed to 'processfile' ('mapInput')."""
+
+import os
+import shutil
+
+import pytest
+
+from abstract_file_batch import AbstractFileBatch
+from inputdata import openinput
+
+
+class MappedBatch(AbstractFileBatch):
+    """Write the contents of the files passed as 'data', reversed."""
+
+    HANDLE_SIGNALS = False
+    MAP_THRESHOLD = 1024
+
+    def processfile(self, srcFilePath, destFilePath, data=None):
+        self.types[os.path.basename(srcFilePath)] = type(data)
+        if bytes(data[:4]) == b"fail":
+            raise ValueError("invalid file")
+        with open(destFilePath, "wb") as f:
+            f.write(bytes(data)[::-1])
+
+
+@pytest.fixture
+def input_dir(maketree):
+    input_dir = maketree(["small.txt"])
+    for name, data in (
+        ("large.txt", b"x" * 4095 + b"y"),
+        ("empty.txt", b""),
+        ("failing.txt", b"fail" + b"x" * 2048)
+    ):
+        with open(os.path.join(input_dir, name), "wb") as f:
+            f.write(data)
+    return input_dir
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_map_input(input_dir, tmp_path, executor):
+    output_dir = str(tmp_path / "out")
+    batch = MappedBatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--executor", executor,
+        "--mapInput"
+    ])
+    batch.types = {}
+
+    assert not batch.run()
+    errors = dict(
+        (os.path.basename(file_in), error)
+        for file_in, file_out, error in batch.results
+    )
+    assert errors == {
+        "small.txt": None,
+        "large.txt": None,
+        "empty.txt": None,
+        "failing.txt": "invalid file"
+    }
+    for name in ("small.txt", "large.txt", "empty.txt"):
+        with open(os.path.join(input_dir, name), "rb") as f_in:
+            with open(os.path.join(output_dir, name), "rb") as f_out:
+                assert f_out.read() == f_in.read()[::-1]
+    assert not os.path.exists(os.path.join(output_dir, "failing.txt"))
+
+    if executor == "thread":
+        # Mapped from the threshold, read below (and empty files)
+        assert batch.types == {
+            "small.txt": bytes,
+            "large.txt": memoryview,
+            "empty.txt": bytes,
+            "failing.txt": memoryview
+        }
+
+
+def test_open_input(input_dir):
+    path = os.path.join(input_dir, "large.txt")
+    with openinput(path, 1024) as data:
+        assert isinstance(data, memoryview)
+        assert len(data) == 4096
+        assert bytes(data[-1:]) == b"y"
+    # Released once closed
+    with pytest.raises(ValueError):
+        data[0]
+
+    with openinput(path, 8192) as data:
+        assert isinstance(data, bytes)
+
+
+def test_map_input_requires_data_argument(maketree):
+    class PlainBatch(AbstractFileBatch):
+        HANDLE_SIGNALS = False
+
+        def processfile(self, srcFilePath, destFilePath):
+            shutil.copyfile(srcFilePath, destFilePath)
+
+    with pytest.raises(ValueError):
+        PlainBatch(["--inputDir", maketree(), "--mapInput"])
@@ -0,0 +1,123 @@
+"""Tests of the lists of input files ('inputList')."""
+
+import os
+import sys
+import gzip
+import zlib
+import shutil
+import threading
+
+import pytest
+
+import inputlist
+from inputlist import iterpaths
+from abstract_file_batch import AbstractFileBatch
+
+
+class CopyBatch(AbstractFileBatch):
+    """Copy files."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        shutil.copyfile(srcFilePath, destFilePath)
+
+
+def test_newline_separated(tmp_path):
+    path = tmp_path / "list.txt"
+    path.write_bytes(b"a.txt\r\n\nsub/b c.txt\nlast.txt")
+    assert list(iterpaths(str(path))) == ["a.txt", "sub/b c.txt", "last.txt"]
+
+
+def test_nul_separated_across_blocks(tmp_path, monkeypatch):
+    # Separator detected in the first block
+    monkeypatch.setattr(inputlist, "BLOCK_SIZE", 16)
+    path = tmp_path / "list.txt"
+    path.write_bytes(b"first.txt\0with\nnewline.txt\0\0last.txt\0")
+    assert list(iterpaths(str(path))) == [
+        "first.txt",
+        "with\nnewline.txt",
+        "last.txt"
+    ]
+
+
+def test_gzip_compressed(tmp_path):
+    path = str(tmp_path / "list.txt.gz")
+    with gzip.open(path, "wb") as f:
+        f.write(b"a.txt\nb.txt\n")
+    # Concatenated members
+    with gzip.open(path, "ab") as f:
+        f.write(b"c.txt\n")
+    assert list(iterpaths(path)) == ["a.txt", "b.txt", "c.txt"]
+
+
+class Stdin(object):
+    """Standard input reading from a file descriptor."""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_streamed_from_pipe(monkeypatch, compressed):
+    read_fd, write_fd = os.pipe()
+    monkeypatch.setattr(sys, "stdin", Stdin(read_fd))
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    received = threading.Event()
+    closed = []
+
+    def produce():
+        # Second path written once the first one is received
+        with os.fdopen(write_fd, "wb") as pipe:
+            for path in (b"a.txt\n", b"b.txt\n"):
+                if compressed:
+                    path = (
+                        compressor.compress(path)
+                        + compressor.flush(zlib.Z_SYNC_FLUSH)
+                    )
+                pipe.write(path)
+                pipe.flush()
+                received.wait(5)
+            if compressed:
+                pipe.write(compressor.flush())
+            # (before closing)
+            closed.append(True)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    try:
+        paths = iterpaths("-")
+        assert next(paths) == "a.txt"
+        assert not closed
+        received.set()
+        assert list(paths) == ["b.txt"]
+    finally:
+        received.set()
+        producer.join()
+
+
+def test_batch_from_list(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "b.txt", "c.md", "sub/d.txt"])
+    path = tmp_path / "list.txt"
+    path.write_text(u"\n".join([
+        "a.txt",
+        "c.md",
+        "missing.txt",
+        os.path.join(input_dir, "sub", "d.txt")
+    ]))
+
+    batch = CopyBatch([
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out"),
+        "--inputList", str(path),
+        "--extensions", "txt"
+    ])
+    assert batch.inputFiles is None
+    assert batch.run()
+    assert sorted(file_in for file_in, file_out, error in batch.results) == [
+        os.path.join(input_dir, "a.txt"),
+        os.path.join(input_dir, "sub", "d.txt")
+    ]
@@ -0,0 +1,160 @@
+"""Tests of the checkpoint journal and '--resume'."""
+
+import os
+
+import pytest
+
+import commit
+from journal import Journal
+from abstract_file_batch import AbstractFileBatch
+
+
+class UpperBatch(AbstractFileBatch):
+    """Convert files to upper case (in place by default)."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        with open(srcFilePath) as f:
+            data = f.read()
+        with open(destFilePath, "w") as f:
+            f.write(data.upper())
+
+
+def test_resume_after_interrupted_backup(maketree, tmp_path, monkeypatch):
+    input_dir = maketree(3)
+    args = [
+        "--inputDir", input_dir,
+        "--journal", str(tmp_path / "journal.jsonl"),
+        "--numberThreads", "1",
+        "--noBackup"
+    ]
+
+    makebackup = commit.makebackup
+
+    def interrupted(*args, **kwargs):
+        # Killed once the input is renamed to its backup
+        makebackup(*args, **kwargs)
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(commit, "makebackup", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        UpperBatch(args).run()
+    monkeypatch.undo()
+    assert len(os.listdir(input_dir)) == 3
+
+    batch = UpperBatch(args + ["--resume"])
+    assert batch.run()
+    assert sorted(os.listdir(input_dir)) == ["f0.txt", "f1.txt", "f2.txt"]
+    for name in os.listdir(input_dir):
+        with open(os.path.join(input_dir, name)) as f:
+            assert f.read() == "DATA OF {}\n".format(name.upper())
+
+
+def test_resume_skips_completed(maketree, tmp_path):
+    input_dir = maketree(3)
+    output_dir = str(tmp_path / "out")
+    args = [
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--journal", str(tmp_path / "journal.jsonl")
+    ]
+    assert UpperBatch(args).run()
+
+    batch = UpperBatch(args + ["--resume"])
+    assert batch.run()
+    assert batch.results == []
+    assert batch.skipped == 3
+
+
+def test_resume_after_interrupted_copy(maketree, tmp_path, monkeypatch):
+    input_dir = maketree(["a.txt"])
+    args = [
+        "--inputDir", input_dir,
+        "--journal", str(tmp_path / "journal.jsonl"),
+        "--backupStrategy", "copy"
+    ]
+
+    def interrupted(source, target, *args):
+        # Killed in the middle of the copy
+        target.write(source.read(4))
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(commit.shutil, "copyfileobj", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        UpperBatch(args).run()
+    monkeypatch.undo()
+    # No (incomplete) backup
+    assert [
+        name for name in os.listdir(input_dir) if not commit.istemp(name)
+    ] == ["a.txt"]
+
+    batch = UpperBatch(args + ["--resume"])
+    assert batch.run()
+    with open(os.path.join(input_dir, "a.txt")) as f:
+        assert f.read() == "DATA OF A.TXT\n"
+
+
+@pytest.mark.parametrize("strategy", ["rename", "copy"])
+def test_resume_after_interrupted_journal(
+    maketree,
+    tmp_path,
+    monkeypatch,
+    strategy
+):
+    # Interrupted between the journal record and the backup
+    input_dir = maketree(["a.txt"])
+    args = [
+        "--inputDir", input_dir,
+        "--journal", str(tmp_path / "journal.jsonl"),
+        "--backupStrategy", strategy
+    ]
+
+    def interrupted(file_path, backup_path, *args, **kwargs):
+        # Incomplete backup
+        with open(backup_path, "w") as f:
+            f.write("ORIG")
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(commit, "makebackup", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        UpperBatch(args).run()
+    monkeypatch.undo()
+
+    batch = UpperBatch(args + ["--resume"])
+    assert batch.run()
+    assert len(batch.results) == 1
+    with open(os.path.join(input_dir, "a.txt")) as f:
+        assert f.read() == "DATA OF A.TXT\n"
+    # Incomplete backup deleted, backup of the resumed run kept
+    backups = [name for name in os.listdir(input_dir) if name != "a.txt"]
+    assert len(backups) == 1
+    with open(os.path.join(input_dir, backups[0])) as f:
+        assert f.read() == "data of a.txt\n"
+
+
+def test_resume_keeps_unprocessed_copy(maketree, tmp_path, monkeypatch):
+    # Interrupted once backed up (input kept in place), before processing
+    input_dir = maketree(["a.txt"])
+    args = [
+        "--inputDir", input_dir,
+        "--journal", str(tmp_path / "journal.jsonl"),
+        "--backupStrategy", "copy",
+        "--noBackup"
+    ]
+
+    def interrupted(self, file_in):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(Journal, "completed", interrupted)
+    monkeypatch.setattr(UpperBatch, "processfile", lambda *args: None)
+    with pytest.raises(KeyboardInterrupt):
+        UpperBatch(args).run()
+    monkeypatch.undo()
+    assert len(os.listdir(input_dir)) == 2
+
+    batch = UpperBatch(args + ["--resume"])
+    assert batch.run()
+    assert os.listdir(input_dir) == ["a.txt"]
+    with open(os.path.join(input_dir, "a.txt")) as f:
+        assert f.read() == "DATA OF A.TXT\n"
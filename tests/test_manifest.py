@@ -0,0 +1,119 @@
+"""Tests of the incremental mode ('manifest', 'hashContent')."""
+
+import os
+import sqlite3
+
+import pytest
+
+from abstract_file_batch import AbstractFileBatch
+
+
+class UpperBatch(AbstractFileBatch):
+    """Convert files to upper case, appending to 'changed.txt' once read."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        with open(srcFilePath) as f:
+            data = f.read()
+        if os.path.basename(srcFilePath) == "changed.txt":
+            # Modified while processed
+            with open(srcFilePath, "a") as f:
+                f.write("more\n")
+        with open(destFilePath, "w") as f:
+            f.write(data.upper())
+
+
+@pytest.fixture
+def args(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "b.txt", "sub/c.txt"])
+    return [
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out"),
+        "--manifest", str(tmp_path / "manifest.db")
+    ]
+
+
+def converted(batch):
+    return sorted(
+        os.path.basename(file_in)
+        for file_in, file_out, error in batch.results
+        if error is None
+    )
+
+
+def test_unchanged_files_skipped(args):
+    batch = UpperBatch(args)
+    assert batch.run()
+    assert converted(batch) == ["a.txt", "b.txt", "c.txt"]
+
+    batch = UpperBatch(args)
+    assert batch.run()
+    assert batch.results == []
+    assert batch.skipped == 3
+
+
+def test_changed_files_outdated(args, tmp_path, monkeypatch):
+    assert UpperBatch(args).run()
+    path = tmp_path / "in" / "a.txt"
+    path.write_text(u"new data of a.txt\n")
+
+    batch = UpperBatch(args)
+    assert batch.run()
+    assert converted(batch) == ["a.txt"]
+    assert batch.skipped == 2
+    assert (tmp_path / "out" / "a.txt").read_text() == u"NEW DATA OF A.TXT\n"
+
+    # Other version of the process
+    monkeypatch.setattr(UpperBatch, "PROCESS_VERSION", "2")
+    batch = UpperBatch(args)
+    assert batch.run()
+    assert converted(batch) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_file_changed_while_processed(maketree, args):
+    maketree(["changed.txt"])
+    assert UpperBatch(args).run()
+
+    # Recorded as processed before the change
+    batch = UpperBatch(args)
+    batch.run()
+    assert converted(batch) == ["changed.txt"]
+
+
+def test_content_hashes(args, tmp_path):
+    args = args + ["--hashContent"]
+    assert UpperBatch(args).run()
+    with sqlite3.connect(str(tmp_path / "manifest.db")) as connection:
+        hashes = connection.execute("SELECT hash FROM files").fetchall()
+    assert len(hashes) == 3
+    assert all(content_hash for content_hash, in hashes)
+
+    # Touched only: unchanged
+    path = str(tmp_path / "in" / "a.txt")
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    # Same size, other contents
+    (tmp_path / "in" / "b.txt").write_text(u"DATA OF B.TXT\n")
+
+    batch = UpperBatch(args)
+    assert batch.run()
+    assert converted(batch) == ["b.txt"]
+    assert batch.skipped == 2
+
+
+def test_in_place(maketree, tmp_path):
+    input_dir = maketree(["a.txt"])
+    args = [
+        "--inputDir", input_dir,
+        "--manifest", str(tmp_path / "manifest.db"),
+        "--noBackup"
+    ]
+    assert UpperBatch(args).run()
+
+    # Output recorded in place of the input
+    batch = UpperBatch(args)
+    assert batch.run()
+    assert batch.results == []
+    with open(os.path.join(input_dir, "a.txt")) as f:
+        assert f.read() == "DATA OF A.TXT\n"
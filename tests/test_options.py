@@ -0,0 +1,127 @@
+"""Tests of the options of the batches (command line and library)."""
+
+import os
+import sys
+import argparse
+
+import shutil
+import threading
+
+import pytest
+
+from abstract_file_batch import AbstractFileBatch
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "extras"
+    )
+)
+from usage import FileBatchExample
+
+
+class CopyBatch(AbstractFileBatch):
+    """Copy files, counting the initialized workers."""
+
+    HANDLE_SIGNALS = False
+
+    def initworker(self):
+        with self.lock:
+            self.workers += 1
+
+    def processfile(self, srcFilePath, destFilePath):
+        shutil.copyfile(srcFilePath, destFilePath)
+
+
+def test_example_options_do_not_conflict(maketree):
+    input_dir = maketree(["a.txt", "b.md"])
+    batch = FileBatchExample([
+        "--inputDir", input_dir,
+        "--maxSize", "100",
+        "--maxFileSize", "1K"
+    ])
+    assert batch.maxSize == 100
+    assert batch.maxFileSize == "1K"
+    assert batch.inputFiles == [os.path.join(input_dir, "a.txt")]
+
+
+def test_subclass_option_conflict_raises(maketree):
+    class ConflictBatch(AbstractFileBatch):
+        """Redefine an option of the batches."""
+
+        HANDLE_SIGNALS = False
+
+        def add_arguments(self, optional_arguments, required_arguments):
+            optional_arguments.add_argument("--timeout", type=int)
+
+        def processfile(self, srcFilePath, destFilePath):
+            pass
+
+    input_dir = maketree()
+    with pytest.raises(argparse.ArgumentError):
+        ConflictBatch(["--inputDir", input_dir])
+    with pytest.raises(argparse.ArgumentError):
+        ConflictBatch.fromoptions(inputDir=input_dir)
+
+
+def test_fromoptions_single_value(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "b.md", "c.txt"])
+    batch = CopyBatch.fromoptions(
+        inputDir=input_dir,
+        outputDir=str(tmp_path / "out"),
+        extensions="txt",
+        inputFiles="a.txt"
+    )
+    assert batch.extensions == ["txt"]
+    assert batch.inputFiles == [os.path.join(input_dir, "a.txt")]
+
+
+def test_fromoptions_values_as_given(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "b.md", "c.txt"])
+    batch = CopyBatch.fromoptions(
+        inputDir=input_dir,
+        outputDir=str(tmp_path / "out"),
+        extensions=["txt", "md"],
+        numberThreads=3
+    )
+    assert batch.numberThreads == 3
+    assert len(batch.inputFiles) == 3
+
+
+@pytest.mark.parametrize("option", [
+    "unknown",
+    "results",
+    "logger",
+    "_AbstractFileBatch__threadpool",
+    "processfile"
+])
+def test_fromoptions_unknown_option(maketree, option):
+    with pytest.raises(TypeError, match=option):
+        CopyBatch.fromoptions(inputDir=maketree(), **{option: None})
+
+
+def test_workers_reused_between_runs(maketree, tmp_path):
+    input_dir = maketree(6)
+    output_dir = str(tmp_path / "out")
+    batch = CopyBatch.fromoptions(
+        inputDir=input_dir,
+        outputDir=output_dir,
+        numberThreads=2
+    )
+    batch.lock = threading.Lock()
+    batch.workers = 0
+
+    with batch:
+        assert batch.submit(["f0.txt", "f1.txt"])
+        assert len(batch.results) == 2
+        results = list(batch.iterresults(["f2.txt", "f3.txt", "f4.txt"]))
+        assert sorted(
+            os.path.basename(file_in)
+            for file_in, file_out, error in results
+            if error is None
+        ) == ["f2.txt", "f3.txt", "f4.txt"]
+    assert batch.workers <= 2
+    assert sorted(os.listdir(output_dir)) == [
+        "f{}.txt".format(index) for index in range(5)
+    ]
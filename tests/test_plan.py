@@ -0,0 +1,68 @@
+"""Tests of the plan of output paths ('planFile', 'planOnly', 'reusePlan')."""
+
+import os
+import logging
+import shutil
+
+import pytest
+
+from abstract_file_batch import AbstractFileBatch
+
+
+class CopyBatch(AbstractFileBatch):
+    """Copy files."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        shutil.copyfile(srcFilePath, destFilePath)
+
+
+@pytest.fixture
+def args(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "sub/b.txt"])
+    return [
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out"),
+        "--planFile", str(tmp_path / "plan.jsonl")
+    ]
+
+
+def test_plan_only_creates_no_directory(args, tmp_path):
+    assert CopyBatch(args + ["--planOnly"]).run()
+    assert os.path.isfile(str(tmp_path / "plan.jsonl"))
+    assert not os.path.exists(str(tmp_path / "out"))
+
+    batch = CopyBatch(args + ["--reusePlan"])
+    assert batch.run()
+    assert os.path.isfile(str(tmp_path / "out" / "sub" / "b.txt"))
+
+
+def test_plan_file_does_not_skip_discovery(args, tmp_path):
+    assert CopyBatch(args).run()
+    (tmp_path / "in" / "new.txt").write_text(u"new")
+
+    # (existing outputs are not overwritten)
+    batch = CopyBatch(args)
+    batch.run()
+    converted = [
+        file_in
+        for file_in, file_out, error in batch.results
+        if error is None
+    ]
+    assert converted == [str(tmp_path / "in" / "new.txt")]
+
+
+def test_reused_plan_warns_of_new_files(args, tmp_path, caplog):
+    assert CopyBatch(args).run()
+    (tmp_path / "in" / "new.txt").write_text(u"new")
+
+    with caplog.at_level(logging.WARNING):
+        batch = CopyBatch(args + ["--reusePlan"])
+    assert "new files are not processed" in caplog.text
+    assert len(batch.plan) == 2
+
+
+def test_reuse_plan_requires_plan_file(maketree):
+    with pytest.raises(ValueError):
+        CopyBatch(["--inputDir", maketree(), "--reusePlan"])
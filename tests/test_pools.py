@@ -0,0 +1,127 @@
+"""Tests of the pools of worker threads (resizing, 'adaptive' mode)."""
+
+import os
+import time
+import threading
+
+from abstract_file_batch import AbstractFileBatch
+from convert_thread import ConvertThread
+from pools import ThreadPool
+
+
+class BlockingBatch(AbstractFileBatch):
+    """Record the threads processing files, once 'released' is set."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        with self.lock:
+            self.started += 1
+        self.released.wait(5)
+        with self.lock:
+            self.threads[os.path.basename(srcFilePath)] = (
+                threading.current_thread().name
+            )
+
+
+def makepool(maketree, tmp_path, number):
+    input_dir = maketree(number)
+    batch = BlockingBatch([
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out")
+    ])
+    batch.lock = threading.Lock()
+    batch.started = 0
+    batch.released = threading.Event()
+    batch.threads = {}
+
+    pool = ThreadPool(ConvertThread)
+    for index in range(number):
+        name = "f{}.txt".format(index)
+        pool.in_queue.put((
+            batch,
+            batch.processfile,
+            os.path.join(input_dir, name),
+            str(tmp_path / "out" / name),
+            True,
+            time.time()
+        ))
+    return batch, pool
+
+
+def wait(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def getresults(pool, number):
+    return [pool.out_queue.get(timeout=5) for index in range(number)]
+
+
+def test_shrunk_threads_stop_before_queued_jobs(maketree, tmp_path):
+    batch, pool = makepool(maketree, tmp_path, 8)
+    pool.resize(4)
+    assert wait(lambda: batch.started == 4)
+
+    pool.resize(1)
+    assert pool.target == 1
+    # Running until their current jobs complete
+    assert pool.size == 4
+
+    batch.released.set()
+    getresults(pool, 8)
+    assert wait(lambda: pool.size == 1)
+    # Queued jobs processed by the remaining thread
+    assert len(set(
+        batch.threads["f{}.txt".format(index)] for index in range(4, 8)
+    )) == 1
+
+    pool.close()
+    assert pool.size == 0
+
+
+def test_grown_pool_cancels_stops(maketree, tmp_path):
+    batch, pool = makepool(maketree, tmp_path, 4)
+    pool.resize(4)
+    assert wait(lambda: batch.started == 4)
+
+    pool.resize(1)
+    pool.resize(3)
+    assert len(pool.threads) == 4
+    batch.released.set()
+    getresults(pool, 4)
+    assert wait(lambda: pool.size == 3)
+    pool.close()
+
+
+def test_stopped_pool_processes_queued_jobs(maketree, tmp_path):
+    batch, pool = makepool(maketree, tmp_path, 6)
+    pool.resize(2)
+    pool.resize(0)
+    batch.released.set()
+    pool.join()
+
+    assert pool.size == 0
+    assert len(getresults(pool, 6)) == 6
+
+
+def test_adaptive_run(maketree, tmp_path):
+    input_dir = maketree(20)
+    batch = BlockingBatch([
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out"),
+        "--adaptive",
+        "--minThreads", "1",
+        "--maxThreads", "4"
+    ])
+    batch.lock = threading.Lock()
+    batch.started = 0
+    batch.released = threading.Event()
+    batch.released.set()
+    batch.threads = {}
+
+    assert batch.run()
+    assert len(batch.results) == 20
+    assert 1 <= batch.numberThreads <= 4
@@ -0,0 +1,51 @@
+"""Tests of the 'process' executor."""
+
+import os
+import pickle
+import shutil
+
+from abstract_file_batch import AbstractFileBatch
+
+
+class CopyBatch(AbstractFileBatch):
+    """Copy files."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        shutil.copyfile(srcFilePath, destFilePath)
+
+
+def test_state_excludes_files(maketree, tmp_path):
+    input_dir = maketree(200)
+    batch = CopyBatch([
+        "--inputDir", input_dir,
+        "--outputDir", str(tmp_path / "out")
+    ])
+    batch.results = [(path, path, None) for path in batch.inputFiles]
+
+    state = pickle.dumps(batch)
+    copy = pickle.loads(state)
+    assert copy.inputFiles is None
+    assert copy.results is None
+    # Paths of the files are passed with the jobs
+    assert b"f199.txt" not in state
+
+
+def test_process_executor(maketree, tmp_path):
+    input_dir = maketree(10)
+    output_dir = str(tmp_path / "out")
+    batch = CopyBatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--executor", "process",
+        "--numberThreads", "2"
+    ])
+
+    assert batch.run()
+    assert len(batch.results) == 10
+    for file_in, file_out, error in batch.results:
+        assert error is None
+        with open(file_in) as f_in, open(file_out) as f_out:
+            assert f_in.read() == f_out.read()
+    assert sorted(os.listdir(output_dir)) == sorted(os.listdir(input_dir))
@@ -0,0 +1,68 @@
+"""Tests of the retries of failed files ('retries', 'retryDelay')."""
+
+import os
+import errno
+import threading
+
+import pytest
+
+from abstract_file_batch import AbstractFileBatch
+from retry import RetryableError, isretryable
+
+
+class FlakyBatch(AbstractFileBatch):
+    """Copy files, raising the errors of 'errors' first."""
+
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        with self.lock:
+            self.attempts += 1
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        with open(srcFilePath) as f_in, open(destFilePath, "w") as f_out:
+            f_out.write(f_in.read())
+
+
+def makebatch(input_dir, output_dir, errors):
+    batch = FlakyBatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--retries", "2",
+        "--retryDelay", "0"
+    ])
+    batch.lock = threading.Lock()
+    batch.attempts = 0
+    batch.errors = list(errors)
+    return batch
+
+
+def test_classification():
+    assert isretryable(RetryableError())
+    assert isretryable(OSError(errno.EBUSY, "Device or resource busy"))
+    assert not isretryable(ValueError())
+    assert not isretryable(OSError(errno.ENOENT, "No such file"))
+    # Permanent permission error, except on Windows (locked file)
+    assert isretryable(
+        OSError(errno.EACCES, "Permission denied")
+    ) == (os.name == "nt")
+
+
+def test_transient_error_retried(maketree, tmp_path):
+    batch = makebatch(
+        maketree(["a.txt"]),
+        str(tmp_path / "out"),
+        [RetryableError("busy"), OSError(errno.EAGAIN, "Try again")]
+    )
+    assert batch.run()
+    assert batch.attempts == 3
+
+
+@pytest.mark.skipif(os.name == "nt", reason="EACCES retried on Windows")
+def test_permission_error_not_retried(maketree, tmp_path):
+    error = OSError(errno.EACCES, "Permission denied")
+    batch = makebatch(maketree(["a.txt"]), str(tmp_path / "out"), [error])
+    assert not batch.run()
+    assert batch.attempts == 1
+    assert "Permission denied" in batch.results[0][2]
@@ -0,0 +1,84 @@
+"""Tests of the staged execution ('readfile', 'transform', 'writefile')."""
+
+import os
+import threading
+
+import pytest
+
+from abstract_file_batch import AbstractFileBatch
+
+
+class UpperBatch(AbstractFileBatch):
+    """Convert files to upper case, failing on 'bad.txt'."""
+
+    HANDLE_SIGNALS = False
+
+    def readfile(self, srcFilePath):
+        self.stages.add(("read", threading.current_thread().name))
+        return AbstractFileBatch.readfile(self, srcFilePath)
+
+    def transform(self, data, srcFilePath):
+        if os.path.basename(srcFilePath) == "bad.txt":
+            raise ValueError("invalid file")
+        return data.upper()
+
+    def writefile(self, data, destFilePath):
+        self.stages.add(("write", threading.current_thread().name))
+        AbstractFileBatch.writefile(self, data, destFilePath)
+
+
+def makebatch(args):
+    batch = UpperBatch(args)
+    batch.stages = set()
+    return batch
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_staged_run(maketree, tmp_path, executor):
+    input_dir = maketree(10)
+    output_dir = str(tmp_path / "out")
+    batch = makebatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--executor", executor,
+        "--readThreads", "2",
+        "--writeThreads", "1"
+    ])
+
+    assert batch.run()
+    assert len(batch.results) == 10
+    for file_in, file_out, error in batch.results:
+        assert error is None
+        with open(file_out) as f:
+            assert f.read() == "DATA OF {}\n".format(
+                os.path.basename(file_in).upper()
+            )
+
+    # Files read and written by separate threads
+    readers = set(name for stage, name in batch.stages if stage == "read")
+    writers = set(name for stage, name in batch.stages if stage == "write")
+    assert len(writers) == 1
+    assert not readers & writers
+
+
+def test_staged_errors(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "bad.txt"])
+    output_dir = str(tmp_path / "out")
+    batch = makebatch(["--inputDir", input_dir, "--outputDir", output_dir])
+
+    assert not batch.run()
+    errors = dict(
+        (os.path.basename(file_in), error)
+        for file_in, file_out, error in batch.results
+    )
+    assert errors == {"a.txt": None, "bad.txt": "invalid file"}
+    assert os.listdir(output_dir) == ["a.txt"]
+
+
+@pytest.mark.parametrize("option", [
+    ["--readThreads", "0"],
+    ["--writeThreads", "0"]
+])
+def test_invalid_stage_threads(maketree, option):
+    with pytest.raises(ValueError):
+        makebatch(["--inputDir", maketree()] + option)
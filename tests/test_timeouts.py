@@ -0,0 +1,83 @@
+"""Tests of the timeouts and speculative execution ('thread' executor)."""
+
+import os
+import time
+import threading
+
+from abstract_file_batch import AbstractFileBatch
+
+
+class SlowBatch(AbstractFileBatch):
+    """Copy files, 'slow.txt' slowly on its first attempt."""
+
+    HANDLE_SIGNALS = False
+    SPECULATE_MIN_FILES = 3
+    # Duration of the first attempt of 'slow.txt' (s)
+    DELAY = 1.5
+
+    def processfile(self, srcFilePath, destFilePath):
+        delay = 0.0
+        if os.path.basename(srcFilePath) == "slow.txt":
+            with self.lock:
+                self.attempts += 1
+                if self.attempts == 1:
+                    delay = self.DELAY
+        time.sleep(delay)
+        with open(destFilePath, "w") as f:
+            f.write("attempt after {}s".format(delay))
+
+
+def makebatch(args):
+    batch = SlowBatch(args)
+    batch.lock = threading.Lock()
+    batch.attempts = 0
+    return batch
+
+
+def listoutputs(output_dir):
+    return sorted(os.listdir(output_dir))
+
+
+def test_timed_out_attempt_not_committed(maketree, tmp_path):
+    input_dir = maketree(["a.txt", "slow.txt"])
+    output_dir = str(tmp_path / "out")
+    batch = makebatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--numberThreads", "2",
+        "--timeout", "0.3"
+    ])
+
+    assert not batch.run()
+    errors = dict(
+        (os.path.basename(file_in), error)
+        for file_in, file_out, error in batch.results
+    )
+    assert errors["a.txt"] is None
+    assert errors["slow.txt"].startswith("Timed out")
+
+    # Abandoned thread finishing after the run
+    time.sleep(2 * SlowBatch.DELAY)
+    assert listoutputs(output_dir) == ["a.txt"]
+
+
+def test_released_copy_not_committed(maketree, tmp_path):
+    input_dir = maketree(["f{}.txt".format(index) for index in range(5)])
+    with open(os.path.join(input_dir, "slow.txt"), "w") as f:
+        f.write("slow")
+    output_dir = str(tmp_path / "out")
+    batch = makebatch([
+        "--inputDir", input_dir,
+        "--outputDir", output_dir,
+        "--numberThreads", "2",
+        "--speculate"
+    ])
+
+    assert batch.run()
+    assert batch.attempts == 2
+
+    # Slower first attempt finishing after the run
+    time.sleep(2 * SlowBatch.DELAY)
+    assert len(listoutputs(output_dir)) == 6
+    with open(os.path.join(output_dir, "slow.txt")) as f:
+        assert f.read() == "attempt after 0.0s"
@@ -0,0 +1,151 @@
+"""Tests of the shared work queue ('workQueue', 'queueMode')."""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+import commit
+from abstract_file_batch import AbstractFileBatch
+from workqueue import WorkQueue
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Worker killed (SIGKILL) while processing 'f2.txt'
+# ('after': once its output is committed)
+WORKER = """
+import os
+import sys
+import signal
+
+import commit
+from workqueue import WorkQueue
+from abstract_file_batch import AbstractFileBatch
+
+WorkQueue.LEASE_DURATION = 1.0
+kill = sys.argv[1]
+
+
+def die():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+class AppendBatch(AbstractFileBatch):
+    HANDLE_SIGNALS = False
+
+    def processfile(self, srcFilePath, destFilePath):
+        with open(srcFilePath) as f:
+            data = f.read()
+        with open(destFilePath, "w") as f:
+            f.write(data + "converted\\n")
+        if kill == "before" and srcFilePath.startswith(self.target):
+            die()
+
+
+replacefile = commit.replacefile
+
+
+def replaced(source, target):
+    replacefile(source, target)
+    if kill == "after" and target == AppendBatch.target:
+        die()
+
+
+commit.replacefile = replaced
+
+AppendBatch.target = os.path.join(sys.argv[3], "f2.txt")
+AppendBatch(sys.argv[2:]).run()
+"""
+
+
+class AppendBatch(AbstractFileBatch):
+    """Append a line to files (not idempotent: converted once only)."""
+
+    HANDLE_SIGNALS = False
+    QUEUE_POLL_INTERVAL = 0.1
+
+    def processfile(self, srcFilePath, destFilePath):
+        with open(srcFilePath) as f:
+            data = f.read()
+        with open(destFilePath, "w") as f:
+            f.write(data + "converted\n")
+
+
+def killworker(tmp_path, kill, args):
+    script = tmp_path / "worker.py"
+    script.write_text(WORKER)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.run(
+        [sys.executable, str(script), kill] + args,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    assert process.returncode == -9
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "link") or sys.platform == "win32",
+    reason="requires SIGKILL and hard links"
+)
+@pytest.mark.parametrize("kill", ["before", "after"])
+def test_dead_worker_in_place(maketree, tmp_path, monkeypatch, kill):
+    monkeypatch.setattr(WorkQueue, "LEASE_DURATION", 1.0)
+    input_dir = maketree(10)
+    queue_args = [
+        "--workQueue", str(tmp_path / "queue.db"),
+        "--numberThreads", "1",
+        "--noBackup"
+    ]
+    assert AppendBatch(
+        ["--inputDir", input_dir, "--queueMode", "coordinator"] + queue_args
+    ).run()
+
+    killworker(tmp_path, kill, ["--inputDir", input_dir] + queue_args)
+
+    batch = AppendBatch(["--inputDir", input_dir] + queue_args)
+    assert batch.run()
+
+    queue = WorkQueue(str(tmp_path / "queue.db"))
+    try:
+        assert queue.counts() == {WorkQueue.COMPLETED: 10}
+    finally:
+        queue.close()
+
+    # Each file converted exactly once (the dead worker leaves its
+    # temporary output, and the backups of its completed files)
+    names = ["f{}.txt".format(index) for index in range(10)]
+    assert sorted(
+        name
+        for name in os.listdir(input_dir)
+        if not commit.istemp(name) and ".bak-" not in name
+    ) == sorted(names)
+    for name in names:
+        with open(os.path.join(input_dir, name)) as f:
+            assert f.read() == "data of {}\nconverted\n".format(name)
+
+
+def test_dead_worker_output_committed(maketree, tmp_path, monkeypatch):
+    # Output committed (not atomically) before the file is completed:
+    # overwritten by the worker leasing the file again
+    monkeypatch.setattr(WorkQueue, "LEASE_DURATION", 1.0)
+    input_dir = maketree(5)
+    queue_args = [
+        "--workQueue", str(tmp_path / "queue.db"),
+        "--outputDir", str(tmp_path / "out"),
+        "--numberThreads", "1",
+        "--atomicOutput"
+    ]
+    assert AppendBatch(
+        ["--inputDir", input_dir, "--queueMode", "coordinator"] + queue_args
+    ).run()
+
+    killworker(tmp_path, "before", ["--inputDir", input_dir] + queue_args)
+
+    batch = AppendBatch(["--inputDir", input_dir] + queue_args)
+    assert batch.run()
+    assert batch.results
+    for file_in, file_out, error in batch.results:
+        assert error is None
@@ -0,0 +1,257 @@
+"""timeouts.py
+
+    Timeouts of files, and speculative re-execution of stragglers.
+"""
+
+import time
+import threading
+from collections import deque
+
+
+# Error of the files processed for too long
+TIMEOUT_ERROR = "Timed out after {:g}s"
+
+# Number of recent durations the median of stragglers is computed on
+RECENT_FILES = 1000
+
+
+class Watchdog(object):
+    """Calls a function when a task runs for longer than a timeout.
+
+        Used in the worker processes of the 'process' executor, whose
+        hung files cannot be interrupted from the dispatching process.
+        'expire' is called from the watchdog thread while holding the
+        lock of the watchdog: the task cannot finish in the meantime.
+    """
+
+    def __init__(self, timeout, expire):
+        """Start the watchdog thread.
+
+        Parameters:
+        timeout: float
+            Maximum duration of a task (s)
+        expire: callable
+            Called as 'expire(task)' when a task times out
+        """
+        self.timeout = timeout
+        self.expire = expire
+
+        self._lock = threading.Lock()
+        self._task = None
+        self._deadline = None
+
+        thread = threading.Thread(target=self._watch)
+        thread.daemon = True
+        thread.start()
+
+
+    def start(self, task, timeout=None):
+        """Start watching a task.
+
+        Parameters:
+        task: object
+            Task, passed to 'expire'
+        timeout: float, optional
+            Timeout of the task (default: None, 'timeout')
+        """
+        with self._lock:
+            self._task = task
+            self._deadline = time.time() + (timeout or self.timeout)
+
+
+    def finish(self):
+        """Stop watching the current task."""
+        with self._lock:
+            self._task = None
+            self._deadline = None
+
+
+    def _watch(self):
+        interval = min(1.0, self.timeout / 10.0)
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if self._task is not None and time.time() > self._deadline:
+                    task = self._task
+                    self._task = None
+                    self.expire(task)
+
+
+class Tracker(object):
+    """Files being processed by worker threads.
+
+        Used by the 'thread' executor to fail the files processed for
+        too long (their threads are abandoned, as threads cannot be
+        killed), and to process the slowest files a second time
+        (speculative execution, the first result being kept).
+        Workers are expected to have an 'abandoned' attribute.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Worker => (job, key, start)
+        self._running = {}
+        # Key of speculated file => result reported
+        self._speculated = {}
+        # Keys of speculated files whose output is committed
+        self._committed = set()
+        # Wall times of the last reported files
+        self._walls = deque(maxlen=RECENT_FILES)
+
+
+    def start(self, worker, job, key):
+        """Record the start of a job.
+
+        Returns:
+        bool: False if the job is a copy of a file already reported
+            (not to process)
+        """
+        with self._lock:
+            if self._speculated.get(key):
+                return False
+            self._running[worker] = (job, key, time.time())
+            return True
+
+
+    def finish(self, worker):
+        """Record the end of the job of a worker.
+
+        Returns:
+        bool: True if its result is to report, False if the worker
+            was abandoned, or if the file was already reported
+            (by a copy of the job)
+        """
+        with self._lock:
+            if worker.abandoned:
+                return False
+            job, key, start = self._running.pop(worker)
+            return self._report(key, time.time() - start)
+
+
+    def commit(self, worker, function):
+        """Commit the output of the job of a worker.
+
+        Outputs of abandoned workers (timed out, or released copies)
+        are not committed, nor the outputs of copies of a file whose
+        output is already committed.
+
+        Parameters:
+        worker: object
+            Worker committing its output
+        function: callable
+            Called without arguments to commit the output
+
+        Returns:
+        bool: True if the output was committed
+        """
+        with self._lock:
+            if worker.abandoned:
+                return False
+            job, key, start = self._running[worker]
+            if key in self._speculated:
+                if key in self._committed:
+                    return False
+                self._committed.add(key)
+            function()
+            return True
+
+
+    def _report(self, key, wall=None):
+        if key in self._speculated:
+            if self._speculated[key]:
+                return False
+            self._speculated[key] = True
+        if wall is not None:
+            self._walls.append(wall)
+        return True
+
+
+    def expire(self, timeout):
+        """Abandon the workers processing a job for too long.
+
+        Parameters:
+        timeout: float
+            Maximum duration of a job (s)
+
+        Returns:
+        list of tuple: (worker, job, start, report) of the abandoned
+            workers, 'report' being False if the file was already reported
+        """
+        now = time.time()
+        expired = []
+        with self._lock:
+            for worker, (job, key, start) in list(self._running.items()):
+                if now - start <= timeout:
+                    continue
+                del self._running[worker]
+                worker.abandoned = True
+                expired.append((worker, job, start, self._report(key)))
+        return expired
+
+
+    def release(self):
+        """Abandon the workers processing copies of files already reported.
+
+        Returns:
+        list: Abandoned workers
+        """
+        released = []
+        with self._lock:
+            for worker, (job, key, start) in list(self._running.items()):
+                if not self._speculated.get(key):
+                    continue
+                del self._running[worker]
+                worker.abandoned = True
+                released.append(worker)
+        return released
+
+
+    def reset(self):
+        """Forget the files speculated by a previous run.
+
+        Used when the workers are reused for another run (durations
+        are kept for the median of stragglers).
+        """
+        with self._lock:
+            self._speculated = {}
+            self._committed = set()
+
+
+    def stragglers(self, factor, min_files, workers):
+        """Get the jobs to process a second time.
+
+        Jobs are stragglers if running for longer than 'factor' times
+        the median duration of the reported files. Each file is
+        processed a second time at most once, by an idle worker.
+
+        Parameters:
+        factor: float
+            Threshold, relative to the median duration
+        min_files: int
+            Minimum number of reported files (for a meaningful median)
+        workers: int
+            Number of workers (running jobs or idle)
+
+        Returns:
+        list: Straggling jobs, slowest first
+        """
+        now = time.time()
+        with self._lock:
+            idle = workers - len(self._running)
+            if idle <= 0 or len(self._walls) < min_files:
+                return []
+
+            walls = sorted(self._walls)
+            threshold = factor * walls[len(walls) // 2]
+            stragglers = sorted(
+                (
+                    (start, key, job)
+                    for job, key, start in self._running.values()
+                    if key not in self._speculated
+                    and now - start > threshold
+                ),
+                key=lambda straggler: straggler[0]
+            )[:idle]
+            for start, key, job in stragglers:
+                self._speculated[key] = False
+        return [job for start, key, job in stragglers]
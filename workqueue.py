@@ -0,0 +1,332 @@
+"""workqueue.py
+
+    Shared queue of files to process, used by several batch processes.
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+
+class WorkQueue(object):
+    """Queue of files to process, stored in a SQLite database.
+
+        Files are leased to workers for a limited time. Workers renew the
+        leases of the files they are processing (heartbeats), so the files
+        of a worker that died are leased again once their leases expire.
+        A file is only completed by the worker holding its lease.
+        Files are identified by their input path. The backup of a file
+        processed in place is recorded with its lease, for the worker
+        leasing it again to process the original contents.
+    """
+
+    # File states
+    PENDING = "pending"
+    LEASED = "leased"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    # Duration of a lease (s)
+    LEASE_DURATION = 60.0
+    # Number of expired leases after which a file is failed
+    # (eg: file crashing its workers)
+    MAX_ATTEMPTS = 3
+    # Time (s) to wait for a locked database
+    TIMEOUT = 60.0
+
+
+    def __init__(self, path, owner=None):
+        """Open (or create) a work queue.
+
+        Parameters:
+        path: str
+            Path of the queue file
+        owner: str, optional
+            Identifier of the worker (default: host, process and
+            random identifier)
+        """
+        self.path = path
+        self.owner = owner or "{}-{}-{}".format(
+            socket.gethostname(),
+            os.getpid(),
+            uuid.uuid4().hex[:8]
+        )
+
+        # Accessed from the dispatching and heartbeat threads
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+        # Transactions are explicit
+        self._connection = sqlite3.connect(
+            path,
+            timeout=self.TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " input TEXT PRIMARY KEY,"
+            " output TEXT,"
+            " position INTEGER,"
+            " state TEXT,"
+            " owner TEXT,"
+            " expiry REAL,"
+            " attempts INTEGER,"
+            " error TEXT,"
+            " backup TEXT"
+            ")"
+        )
+        columns = [
+            row[1]
+            for row in self._connection.execute("PRAGMA table_info(jobs)")
+        ]
+        if "backup" not in columns:
+            # Queue created by a previous version
+            self._connection.execute("ALTER TABLE jobs ADD COLUMN backup TEXT")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, position)"
+        )
+
+
+    def close(self):
+        """Stop the heartbeats and close the queue."""
+        self.stopheartbeat()
+        with self._lock:
+            if self._connection is None:
+                return
+            self._connection.close()
+            self._connection = None
+
+
+    def populate(self, pairs, chunk_size=1000):
+        """Add files to the queue.
+
+        Files already in the queue are not added again.
+        Files are leased in the order they are added.
+
+        Parameters:
+        pairs: iterable
+            (input file, output file) pairs
+        chunk_size: int, optional
+            Number of files added per transaction (default: 1000)
+
+        Returns:
+        int: Number of added files
+        """
+        added = 0
+        chunk = []
+        for pair in pairs:
+            chunk.append(pair)
+            if len(chunk) >= chunk_size:
+                added += self._insert(chunk)
+                chunk = []
+        if chunk:
+            added += self._insert(chunk)
+        return added
+
+
+    def _insert(self, pairs):
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                position = connection.execute(
+                    "SELECT COALESCE(MAX(position), 0) FROM jobs"
+                ).fetchone()[0]
+                before = connection.total_changes
+                connection.executemany(
+                    "INSERT OR IGNORE INTO jobs"
+                    " (input, output, position, state, attempts)"
+                    " VALUES (?, ?, ?, ?, 0)",
+                    [
+                        (
+                            input_file,
+                            output_file,
+                            position + index + 1,
+                            self.PENDING
+                        )
+                        for index, (input_file, output_file)
+                        in enumerate(pairs)
+                    ]
+                )
+                added = connection.total_changes - before
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return added
+
+
+    def lease(self, count):
+        """Lease files to process.
+
+        Pending files are leased first, then files whose lease expired.
+
+        Parameters:
+        count: int
+            Maximum number of files to lease
+
+        Returns:
+        list of tuple: Leased (input file, output file, backup, attempts),
+            'backup' being the backup recorded by a previous attempt
+            (see 'setbackup'), and 'attempts' the number of leases
+            of the file (including this one)
+        """
+        now = time.time()
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Files failing repeatedly
+                connection.execute(
+                    "UPDATE jobs SET state = ?, owner = NULL,"
+                    " error = 'Lease expired ' || attempts || ' times'"
+                    " WHERE state = ? AND expiry < ? AND attempts >= ?",
+                    (self.FAILED, self.LEASED, now, self.MAX_ATTEMPTS)
+                )
+                rows = connection.execute(
+                    "SELECT input, output, backup, attempts + 1 FROM jobs"
+                    " WHERE state = ? OR (state = ? AND expiry < ?)"
+                    " ORDER BY state = ?, position LIMIT ?",
+                    (self.PENDING, self.LEASED, now, self.LEASED, count)
+                ).fetchall()
+                connection.executemany(
+                    "UPDATE jobs SET state = ?, owner = ?, expiry = ?,"
+                    " attempts = attempts + 1 WHERE input = ?",
+                    [
+                        (
+                            self.LEASED,
+                            self.owner,
+                            now + self.LEASE_DURATION,
+                            input_file
+                        )
+                        for input_file, output_file, backup, attempts in rows
+                    ]
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return [tuple(row) for row in rows]
+
+
+    def renew(self):
+        """Renew the leases of the worker."""
+        with self._lock:
+            if self._connection is None:
+                return
+            self._connection.execute(
+                "UPDATE jobs SET expiry = ? WHERE state = ? AND owner = ?",
+                (time.time() + self.LEASE_DURATION, self.LEASED, self.owner)
+            )
+
+
+    def setbackup(self, input_file, backup):
+        """Record the backup of a file processed in place.
+
+        To record before making the backup: a worker leasing the file
+        again processes the backup if it exists (the file might have
+        been replaced by its output already).
+
+        Parameters:
+        input_file: str
+            Path of the input file (leased by the worker)
+        backup: str
+            Path of the backup
+
+        Returns:
+        bool: True if recorded (lease held by the worker)
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET backup = ?"
+                " WHERE input = ? AND state = ? AND owner = ?",
+                (backup, input_file, self.LEASED, self.owner)
+            )
+            return cursor.rowcount > 0
+
+
+    def complete(self, input_file, error=None):
+        """Record a processed file.
+
+        Ignored if the lease of the file is not held by the worker anymore
+        (the file was leased to another worker).
+
+        Parameters:
+        input_file: str
+            Path of the input file (identifier of the file in the queue,
+            unlike output paths, which can be shared)
+        error: str, optional
+            Error, if the file failed (default: None)
+
+        Returns:
+        bool: True if recorded
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET state = ?, owner = NULL, error = ?"
+                " WHERE input = ? AND state = ? AND owner = ?",
+                (
+                    self.FAILED if error else self.COMPLETED,
+                    error,
+                    input_file,
+                    self.LEASED,
+                    self.owner
+                )
+            )
+            return cursor.rowcount > 0
+
+
+    def remaining(self):
+        """Get the number of files not processed yet.
+
+        Returns:
+        int: Number of pending or leased files
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)",
+                (self.PENDING, self.LEASED)
+            ).fetchone()[0]
+
+
+    def counts(self):
+        """Get the number of files in each state.
+
+        Returns:
+        dict: {state: number of files}
+        """
+        with self._lock:
+            return dict(self._connection.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall())
+
+
+    def startheartbeat(self):
+        """Renew the leases of the worker regularly, from a thread."""
+        if self._heartbeat is not None:
+            return
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.LEASE_DURATION / 3.0):
+                self.renew()
+
+        thread = threading.Thread(target=beat)
+        thread.daemon = True
+        thread.start()
+        self._heartbeat = (thread, stop)
+
+
+    def stopheartbeat(self):
+        """Stop renewing the leases of the worker."""
+        if self._heartbeat is None:
+            return
+        thread, stop = self._heartbeat
+        stop.set()
+        thread.join()
+        self._heartbeat = None